@@ -0,0 +1,90 @@
+"""
+Compare decoding in the event loop with handing frames to FrameDecoder
+workers, for several receivers fed at once.
+
+    python benchmarks/bench_decode.py --receivers 3 --workers 2
+
+Every receiver is fed the same capture, a synthetic one of raw measurements
+for 32 signals at 20 Hz without one, a read's worth at a time. The event
+loop's CPU time is what matters, the workers' is not counted in it.
+"""
+
+import argparse
+import asyncio
+import time
+
+from bench_rinex import synthetic_capture
+
+from NavSpark_console.offload import FrameDecoder
+from NavSpark_console.protocol import NavSparkRawProtocol
+
+READ_SIZE = 4096
+
+
+async def feed(data, receivers, decoder=None):
+    """The messages decoded, the event loop's CPU time and the wall time taken"""
+    protocols = [
+        NavSparkRawProtocol(source=f"rx{n}", decoder=decoder) for n in range(receivers)
+    ]
+    # the first read, once decoded, has the workers started
+    for protocol in protocols:
+        protocol.data_received(data[:READ_SIZE])
+        while protocol.message_queue.empty():
+            await asyncio.sleep(0.01)
+        while not protocol.message_queue.empty():
+            protocol.message_queue.get_nowait()
+
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    decoded = 0
+    for start in range(READ_SIZE, len(data), READ_SIZE):
+        for protocol in protocols:
+            protocol.data_received(data[start : start + READ_SIZE])
+            while not protocol.message_queue.empty():
+                protocol.message_queue.get_nowait()
+                decoded += 1
+        await asyncio.sleep(0)
+
+    while decoder is not None and decoder.backlog:
+        await asyncio.sleep(0.001)
+    for protocol in protocols:
+        decoded += protocol.message_queue.qsize()
+    return decoded, time.process_time() - cpu, time.perf_counter() - wall
+
+
+async def run(args, data):
+    decoded, cpu, wall = await feed(data, args.receivers)
+    print(f"in the event loop: {decoded} messages, {cpu:.2f} s CPU, {wall:.2f} s")
+
+    decoder = FrameDecoder(workers=args.workers)
+    decoder.start()
+    try:
+        decoded, cpu, wall = await feed(data, args.receivers, decoder)
+    finally:
+        await decoder.close()
+    print(
+        f"{args.workers} workers: {decoded} messages, {cpu:.2f} s event loop CPU,"
+        f" {wall:.2f} s in {decoder.batches} batches"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("capture", nargs="?")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--rate", type=int, default=20)
+    parser.add_argument("--receivers", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, "rb") as fp:
+            data = fp.read()
+    else:
+        data = synthetic_capture(args.seconds, args.rate)
+
+    asyncio.run(run(args, data))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Time the single point positioning solver over a recorded session.
+
+    python benchmarks/bench_positioning.py capture.bin
+
+The capture is the raw serial output of the receiver with ephemerides and raw
+measurements enabled. Without a capture a synthetic session is generated from
+a simulated 24 satellite constellation.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from NavSpark_console.capture import replay
+from NavSpark_console.coordinates import geodetic_to_ecef
+from NavSpark_console.positioning import PointPositionSolver, simulate_pseudoranges
+from NavSpark_console.protocol import (
+    ExtendedRawMeasurements,
+    RawMeasurementsArray,
+)
+
+MEASUREMENT_MESSAGES = (ExtendedRawMeasurements, RawMeasurementsArray)
+
+# sqrt(A), e and the angles of a typical GPS orbit
+SYNTHETIC_ORBIT = {
+    "t_oe": 367200.0,
+    "t_oc": 367200.0,
+    "root_a": 5153.6,
+    "e": 0.01,
+    "M_0": 0.0,
+    "delta_n": 4.5e-9,
+    "omega": 1.0,
+    "Omega_0": 0.0,
+    "Omega_dot": -8.0e-9,
+    "I_0": 0.96,
+    "IDOT": 0.0,
+    "C_uc": 0.0,
+    "C_us": 0.0,
+    "C_rc": 0.0,
+    "C_rs": 0.0,
+    "C_ic": 0.0,
+    "C_is": 0.0,
+    "a_f0": 1e-5,
+    "a_f1": 0.0,
+    "a_f2": 0.0,
+    "t_gd": 0.0,
+}
+
+
+def recorded_epochs(path):
+    """Feed every message to the solver, timing only the measurement epochs"""
+    solver = PointPositionSolver()
+    timings = []
+    with open(path, "rb") as fp:
+        for msg in replay(fp):
+            start = time.perf_counter()
+            solution = solver.update(msg)
+            elapsed = time.perf_counter() - start
+            if isinstance(msg, MEASUREMENT_MESSAGES) and solution is not None:
+                timings.append(elapsed)
+    return timings
+
+
+def synthetic_epochs(seconds, rate):
+    solver = PointPositionSolver()
+    for plane in range(6):
+        for slot in range(4):
+            eph = dict(SYNTHETIC_ORBIT)
+            eph["Omega_0"] += plane * np.pi / 3
+            eph["M_0"] += slot * np.pi / 2 + plane * np.pi / 12
+            solver.gps.add(1 + plane * 4 + slot, eph)
+
+    truth = np.array(geodetic_to_ecef(np.radians(39.0), np.radians(-77.0), 120.0))
+    svid = np.array(sorted(solver.gps.ephemerides))
+    gnss_type = np.zeros(len(svid), dtype=np.uint8)
+    rng = np.random.default_rng(1)
+
+    timings = []
+    for tow in SYNTHETIC_ORBIT["t_oe"] + np.arange(0.0, seconds, 1.0 / rate):
+        pseudorange, elevation = simulate_pseudoranges(
+            solver, tow, gnss_type, svid, truth, 1e-4
+        )
+        visible = elevation > np.radians(5)
+        pseudorange += rng.normal(0.0, 1.0, len(pseudorange))
+
+        start = time.perf_counter()
+        solver.solve(tow, gnss_type[visible], svid[visible], pseudorange[visible])
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("capture", nargs="?", help="raw serial capture to replay")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--rate", type=float, default=20.0)
+    args = parser.parse_args()
+
+    if args.capture:
+        timings = recorded_epochs(args.capture)
+    else:
+        timings = synthetic_epochs(args.seconds, args.rate)
+
+    if not timings:
+        print("no epochs solved")
+        return
+
+    timings = np.array(timings) * 1e3
+    budget = 1e3 / args.rate
+    print(f"{len(timings)} epochs")
+    print(
+        f"mean {timings.mean():.3f} ms, median {np.median(timings):.3f} ms, "
+        f"p99 {np.percentile(timings, 99):.3f} ms, max {timings.max():.3f} ms"
+    )
+    print(
+        f"{timings.mean() / budget:.1%} of the {budget:.0f} ms epoch at {args.rate:g} Hz"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Compare serial_asyncio with ReaderThreadTransport, by how often each wakes
+the event loop and how much of its CPU time goes on the serial port.
+
+    python benchmarks/bench_reader.py --chunk 64 --busy 0.02
+
+A capture, a synthetic one of raw measurements for 32 signals at 20 Hz
+without one, is written to a pty a chunk at a time as a USB serial adapter
+would hand it over. Meanwhile the loop is kept busy for a while every 100 ms
+as if redrawing the console.
+"""
+
+import argparse
+import asyncio
+import os
+import threading
+import time
+
+import serial_asyncio
+
+from bench_rinex import synthetic_capture
+
+from NavSpark_console.protocol import NavSparkRawProtocol
+from NavSpark_console.reader_thread import create_reader_thread_connection
+
+REDRAW_INTERVAL = 0.1
+
+
+class CountingProtocol(NavSparkRawProtocol):
+    calls = 0
+
+    def data_received(self, data):
+        self.calls += 1
+        super().data_received(data)
+
+    def frames_received(self, frames):
+        self.calls += 1
+        super().frames_received(frames)
+
+
+async def redraw(busy):
+    while True:
+        end = time.perf_counter() + busy
+        while time.perf_counter() < end:
+            pass
+        await asyncio.sleep(REDRAW_INTERVAL)
+
+
+def write(master, data, chunk, seconds):
+    delay = seconds * chunk / len(data)
+    for start in range(0, len(data), chunk):
+        os.write(master, data[start : start + chunk])
+        time.sleep(delay)
+
+
+async def measure(create, data, args):
+    master, slave = os.openpty()
+    loop = asyncio.get_running_loop()
+    protocol = CountingProtocol()
+    transport, _ = await create(
+        loop, lambda: protocol, os.ttyname(slave), baudrate=921600
+    )
+    redrawing = asyncio.create_task(redraw(args.busy))
+    writer = threading.Thread(
+        target=write, args=(master, data, args.chunk, args.seconds)
+    )
+
+    cpu = time.thread_time()
+    writer.start()
+    while writer.is_alive() or protocol.bytes_received < len(data):
+        await asyncio.sleep(0.05)
+    cpu = time.thread_time() - cpu
+
+    redrawing.cancel()
+    transport.close()
+    await asyncio.sleep(0.1)
+    os.close(master)
+    os.close(slave)
+    return protocol.calls, protocol.message_queue.qsize(), cpu
+
+
+async def run(args, data):
+    for name, create in (
+        ("serial_asyncio", serial_asyncio.create_serial_connection),
+        ("reader thread", create_reader_thread_connection),
+    ):
+        calls, messages, cpu = await measure(create, data, args)
+        print(
+            f"{name}: {calls} wakeups for {messages} messages,"
+            f" {cpu:.2f} s event loop CPU"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("capture", nargs="?")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rate", type=int, default=20)
+    parser.add_argument("--chunk", type=int, default=64)
+    parser.add_argument("--busy", type=float, default=0.02)
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, "rb") as fp:
+            data = fp.read()
+    else:
+        data = synthetic_capture(args.seconds, args.rate)
+
+    asyncio.run(run(args, data))
+
+
+if __name__ == "__main__":
+    main()
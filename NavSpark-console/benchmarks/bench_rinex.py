@@ -0,0 +1,97 @@
+"""
+Time converting a capture to RINEX observation and navigation files.
+
+    python benchmarks/bench_rinex.py capture.bin
+
+Without a capture a synthetic one is generated with ExtendedRawMeasurements
+for 32 signals at the given rate.
+"""
+
+import argparse
+import io
+import os
+import struct
+import tempfile
+import time
+from functools import reduce
+from operator import xor
+
+from NavSpark_console.protocol import ExtendedRawChannelIndicator, GNSSType
+from NavSpark_console.rinex import convert_capture
+
+ALL = (
+    ExtendedRawChannelIndicator.pseudorange_available
+    | ExtendedRawChannelIndicator.doppler_frequency
+    | ExtendedRawChannelIndicator.carrier_phase_available
+)
+
+
+def frame(payload):
+    lrc = reduce(xor, payload, 0)
+    return (
+        b"\xA0\xA1" + len(payload).to_bytes(2, "big") + payload + bytes([lrc]) + b"\r\n"
+    )
+
+
+def synthetic_capture(seconds, rate):
+    signals = [(GNSSType.GPS, sv, st) for sv in range(1, 9) for st in (0, 2)]
+    signals += [(GNSSType.BEIDOU, sv, 0) for sv in range(1, 9)]
+    signals += [(GNSSType.GLONASS, sv, 0) for sv in range(1, 9)]
+
+    out = io.BytesIO()
+    for i in range(int(seconds * rate)):
+        t = i / rate
+        payload = struct.pack(
+            ">BBBHIHBxB",
+            0xE5,
+            1,
+            i & 0xFF,
+            2200,
+            345600000 + i * 1000 // rate,
+            1000 // rate,
+            0,
+            len(signals),
+        )
+        for gnss_type, svid, signal_type in signals:
+            rng = 2.0e7 + 1000.0 * svid + 300.0 * t
+            payload += struct.pack(
+                ">BBBBddfBBBHxx",
+                (signal_type << 4) | gnss_type, svid, 7 << 4 | 5, 40,
+                rng, -rng / 0.19029367, -300.0 / 0.19029367, 1, 1, 1, ALL,
+            )  # fmt: skip
+        out.write(frame(payload))
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("capture", nargs="?")
+    parser.add_argument("--seconds", type=float, default=600.0)
+    parser.add_argument("--rate", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, "rb") as fp:
+            data = fp.read()
+        duration = None
+    else:
+        data = synthetic_capture(args.seconds, args.rate)
+        duration = args.seconds
+
+    with tempfile.TemporaryDirectory() as tmp:
+        obs_path = os.path.join(tmp, "capture.obs")
+        nav_path = os.path.join(tmp, "capture.nav")
+        with open(obs_path, "w") as obs_fp, open(nav_path, "w") as nav_fp:
+            start = time.perf_counter()
+            obs, _ = convert_capture(io.BytesIO(data), obs_fp, nav_fp)
+            elapsed = time.perf_counter() - start
+        size = os.path.getsize(obs_path)
+
+    print(f"{obs.epochs} epochs, {size / 1e6:.1f} MB written in {elapsed:.2f} s")
+    if duration is None and args.rate:
+        duration = obs.epochs / args.rate
+    print(f"{duration / elapsed:.0f}x real time at {args.rate} Hz")
+
+
+if __name__ == "__main__":
+    main()
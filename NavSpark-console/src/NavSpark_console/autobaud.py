@@ -0,0 +1,77 @@
+import asyncio
+
+import serial_asyncio
+
+from NavSpark_console.protocol import QueryPositionUpdateRate, find_frame, packet
+
+# most likely first, 115200 for raw output and the 9600 SkyTraq ships at, then
+# the rates negotiate_baud may have left the receiver at
+BAUD_RATES = (115200, 9600, 38400, 57600, 19200, 4800, 230400, 460800, 921600)
+
+# how long to listen at each rate, on top of the time the reply takes to send
+DETECT_WINDOW = 0.1
+# any reply to it is a valid frame, and asking doesn't change anything
+PROBE = packet(QueryPositionUpdateRate())
+# the probe, an ACK and the reply, 10 bits a byte on the wire
+PROBE_BITS = 10 * 32
+
+# no need to keep more than a frame's worth of noise
+MAX_SNIFF_BUFFER = 4096
+
+
+def candidate_rates(preferred=None, baud_rates=BAUD_RATES):
+    """baud_rates in the order to try them, preferred, the last one used say, first"""
+    if preferred is None:
+        return tuple(baud_rates)
+    return (preferred,) + tuple(b for b in baud_rates if b != preferred)
+
+
+class BaudSniffer(asyncio.Protocol):
+    def __init__(self):
+        self.buffer = bytearray()
+        self.found = asyncio.Event()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def reset(self):
+        self.buffer.clear()
+        self.found.clear()
+
+    def data_received(self, data):
+        self.buffer.extend(data)
+        if find_frame(self.buffer):
+            self.found.set()
+        elif len(self.buffer) > MAX_SNIFF_BUFFER:
+            del self.buffer[:-MAX_SNIFF_BUFFER]
+
+
+async def detect_baud(
+    port, baud_rates=BAUD_RATES, preferred=None, window=DETECT_WINDOW, **settings
+):
+    """
+    Find the baud rate the receiver on port is talking at. The port is opened
+    once and its rate switched between candidates. At each one a query is sent
+    and the first valid frame, the reply or anything else the receiver
+    outputs, settles it. Returns the settings for serial.Serial, or None if
+    nothing answered.
+    """
+    rates = candidate_rates(preferred, baud_rates)
+    loop = asyncio.get_running_loop()
+    transport, sniffer = await serial_asyncio.create_serial_connection(
+        loop, BaudSniffer, port, baudrate=rates[0], **settings
+    )
+    try:
+        for baud in rates:
+            transport.serial.baudrate = baud
+            transport.serial.reset_input_buffer()
+            sniffer.reset()
+            transport.write(PROBE)
+            try:
+                await asyncio.wait_for(sniffer.found.wait(), window + PROBE_BITS / baud)
+            except asyncio.TimeoutError:
+                continue
+            return dict(settings, baudrate=baud)
+        return None
+    finally:
+        transport.close()
@@ -0,0 +1,244 @@
+import attr
+
+from NavSpark_console.protocol import Beidou2D1Subframe, Beidou2D2Subframe
+from NavSpark_console.ephemeris import KeplerianEphemerisCache, GPS_PI
+
+# CGCS2000 constants from the BeiDou ICD
+BDS_GM = 3.986004418e14
+BDS_OMEGA_E_DOT = 7.2921150e-5
+BDS_F = -4.442807309e-10
+
+# BDT is a constant 14 seconds behind GPS time
+BDT_GPS_OFFSET = 14.0
+
+# An ephemeris is broadcast for an hour, after this long it is dropped
+EPHEMERIS_MAX_AGE = 2 * 3600.0
+
+# The subframe words arrive with the parity stripped, 26 information bits from
+# the first word followed by 22 from each of the other nine. Field positions are
+# given as (subframe or page, word, bit offset in the word, width) following the
+# layout tables in the ICD, fields split across words list every part MSB first.
+D1_FIELDS = {
+    "sat_h1": (False, ((1, 2, 12, 1),)),
+    "aodc": (False, ((1, 2, 13, 5),)),
+    "urai": (False, ((1, 2, 18, 4),)),
+    "week_number": (False, ((1, 3, 0, 13),)),
+    "t_oc": (False, ((1, 3, 13, 9), (1, 4, 0, 8))),
+    "t_gd1": (True, ((1, 4, 8, 10),)),
+    "t_gd2": (True, ((1, 4, 18, 4), (1, 5, 0, 6))),
+    "a_f2": (True, ((1, 8, 4, 11),)),
+    "a_f0": (True, ((1, 8, 15, 7), (1, 9, 0, 17))),
+    "a_f1": (True, ((1, 9, 17, 5), (1, 10, 0, 17))),
+    "aode": (False, ((1, 10, 17, 5),)),
+    "delta_n": (True, ((2, 2, 12, 10), (2, 3, 0, 6))),
+    "C_uc": (True, ((2, 3, 6, 16), (2, 4, 0, 2))),
+    "M_0": (True, ((2, 4, 2, 20), (2, 5, 0, 12))),
+    "e": (False, ((2, 5, 12, 10), (2, 6, 0, 22))),
+    "C_us": (True, ((2, 7, 0, 18),)),
+    "C_rc": (True, ((2, 7, 18, 4), (2, 8, 0, 14))),
+    "C_rs": (True, ((2, 8, 14, 8), (2, 9, 0, 10))),
+    "root_a": (False, ((2, 9, 10, 12), (2, 10, 0, 20))),
+    "t_oe": (False, ((2, 10, 20, 2), (3, 2, 12, 10), (3, 3, 0, 5))),
+    "I_0": (True, ((3, 3, 5, 17), (3, 4, 0, 15))),
+    "C_ic": (True, ((3, 4, 15, 7), (3, 5, 0, 11))),
+    "Omega_dot": (True, ((3, 5, 11, 11), (3, 6, 0, 13))),
+    "C_is": (True, ((3, 6, 13, 9), (3, 7, 0, 9))),
+    "IDOT": (True, ((3, 7, 9, 13), (3, 8, 0, 1))),
+    "Omega_0": (True, ((3, 8, 1, 21), (3, 9, 0, 11))),
+    "omega": (True, ((3, 9, 11, 11), (3, 10, 0, 21))),
+}
+
+# D2 (GEO) ephemerides are spread over pages 1 and 3 to 10 of subframe 1
+D2_FIELDS = {
+    "sat_h1": (False, ((1, 2, 16, 1),)),
+    "aodc": (False, ((1, 2, 17, 5),)),
+    "urai": (False, ((1, 3, 0, 4),)),
+    "week_number": (False, ((1, 3, 4, 13),)),
+    "t_oc": (False, ((1, 3, 17, 5), (1, 4, 0, 12))),
+    "t_gd1": (True, ((1, 4, 12, 10),)),
+    "t_gd2": (True, ((1, 5, 0, 10),)),
+    "a_f0": (True, ((3, 4, 10, 12), (3, 5, 0, 12))),
+    "a_f1": (True, ((3, 5, 12, 4), (4, 2, 16, 6), (4, 3, 0, 12))),
+    "a_f2": (True, ((4, 3, 12, 10), (4, 4, 0, 1))),
+    "aode": (False, ((4, 4, 1, 5),)),
+    "delta_n": (True, ((4, 4, 6, 16),)),
+    "C_uc": (True, ((4, 5, 0, 14), (5, 2, 16, 4))),
+    "M_0": (True, ((5, 2, 20, 2), (5, 3, 0, 22), (5, 4, 0, 8))),
+    "C_us": (True, ((5, 4, 8, 14), (5, 5, 0, 4))),
+    "e": (False, ((5, 5, 4, 10), (6, 2, 16, 6), (6, 3, 0, 16))),
+    "root_a": (False, ((6, 3, 16, 6), (6, 4, 0, 22), (6, 5, 0, 4))),
+    "C_ic": (True, ((6, 5, 4, 10), (7, 2, 16, 6), (7, 3, 0, 2))),
+    "C_is": (True, ((7, 3, 2, 18),)),
+    "t_oe": (False, ((7, 3, 20, 2), (7, 4, 0, 15))),
+    "I_0": (True, ((7, 4, 15, 7), (7, 5, 0, 14), (8, 2, 16, 6), (8, 3, 0, 5))),
+    "C_rc": (True, ((8, 3, 5, 17), (8, 4, 0, 1))),
+    "C_rs": (True, ((8, 4, 1, 18),)),
+    "Omega_dot": (True, ((8, 4, 19, 3), (8, 5, 0, 16), (9, 2, 16, 5))),
+    "Omega_0": (True, ((9, 2, 21, 1), (9, 3, 0, 22), (9, 4, 0, 9))),
+    "omega": (True, ((9, 4, 9, 13), (9, 5, 0, 14), (10, 2, 16, 5))),
+    "IDOT": (True, ((10, 2, 21, 1), (10, 3, 0, 13))),
+}
+
+D1_PAGES = frozenset({1, 2, 3})
+D2_PAGES = frozenset({1, 3, 4, 5, 6, 7, 8, 9, 10})
+
+# all the pages of an ephemeris have to come from one broadcast cycle
+D1_CYCLE = 30
+D2_CYCLE = 30
+
+SCALES = {
+    "t_oc": 2.0**3,
+    "t_oe": 2.0**3,
+    "t_gd1": 1e-10,
+    "t_gd2": 1e-10,
+    "a_f0": 2.0**-33,
+    "a_f1": 2.0**-50,
+    "a_f2": 2.0**-66,
+    "delta_n": 2.0**-43 * GPS_PI,
+    "M_0": 2.0**-31 * GPS_PI,
+    "e": 2.0**-33,
+    "root_a": 2.0**-19,
+    "C_uc": 2.0**-31,
+    "C_us": 2.0**-31,
+    "C_ic": 2.0**-31,
+    "C_is": 2.0**-31,
+    "C_rc": 2.0**-6,
+    "C_rs": 2.0**-6,
+    "I_0": 2.0**-31 * GPS_PI,
+    "Omega_0": 2.0**-31 * GPS_PI,
+    "omega": 2.0**-31 * GPS_PI,
+    "Omega_dot": 2.0**-43 * GPS_PI,
+    "IDOT": 2.0**-43 * GPS_PI,
+}
+
+INFO_BITS = 224
+
+
+def info_bits(words, word, offset, width):
+    """Pick a field out of the 28 bytes of parity stripped information bits"""
+    start = offset if word == 1 else 26 + (word - 2) * 22 + offset
+    value = int.from_bytes(words, "big")
+    return (value >> (INFO_BITS - start - width)) & ((1 << width) - 1)
+
+
+def sow(words):
+    return (info_bits(words, 1, 18, 8) << 12) | info_bits(words, 2, 0, 12)
+
+
+def d2_page_number(words):
+    return info_bits(words, 2, 12, 4)
+
+
+def page_parts(layout, page, words):
+    """Extract every part of every field that lives on one page"""
+    parts = {}
+    for name, (_, field_parts) in layout.items():
+        for i, (p, word, offset, width) in enumerate(field_parts):
+            if p == page:
+                parts[(name, i)] = info_bits(words, word, offset, width)
+    return parts
+
+
+def decode_beidou_ephemeris(layout, parts):
+    """
+    Combine the parts collected from all the pages and scale them into
+    engineering units, angles in radians.
+    """
+    raw = {}
+    for name, (signed, field_parts) in layout.items():
+        value = 0
+        bits = 0
+        for i, (_, _, _, width) in enumerate(field_parts):
+            value = (value << width) | parts[(name, i)]
+            bits += width
+        if signed and value & (1 << (bits - 1)):
+            value -= 1 << bits
+        raw[name] = value
+
+    eph = {name: value * SCALES.get(name, 1) for name, value in raw.items()}
+    # single frequency B1I users correct with TGD1
+    eph["t_gd"] = eph["t_gd1"]
+    return eph
+
+
+@attr.s(auto_attribs=True)
+class _PageSet:
+    raw: dict = attr.ib(factory=dict)
+    parts: dict = attr.ib(factory=dict)
+    sow: dict = attr.ib(factory=dict)
+
+
+@attr.s(auto_attribs=True)
+class BeidouEphemerisCache(KeplerianEphemerisCache):
+    """
+    Reassembles D1 subframes and D2 pages per PRN into ephemerides. Each page
+    is only picked apart when its contents change, and decoded ephemerides are
+    kept until they are EPHEMERIS_MAX_AGE older than the latest time of week.
+
+    Times are BDT seconds of week.
+    """
+
+    max_age: float = EPHEMERIS_MAX_AGE
+    latest_sow: int = None
+    _pages: dict = attr.ib(factory=dict, repr=False)
+
+    gm = BDS_GM
+    omega_e_dot = BDS_OMEGA_E_DOT
+    f = BDS_F
+
+    def is_geo(self, prn):
+        return prn <= 5 or prn >= 59
+
+    def update(self, msg):
+        if isinstance(msg, Beidou2D1Subframe):
+            layout, required, page = D1_FIELDS, D1_PAGES, msg.sfid
+        elif isinstance(msg, Beidou2D2Subframe):
+            if msg.sfid != 1:
+                return
+            layout, required, page = D2_FIELDS, D2_PAGES, d2_page_number(msg.words)
+        else:
+            return
+
+        # subframe messages use the 2xx numbering for BeiDou satellites
+        prn = msg.svid - 200 if msg.svid > 200 else msg.svid
+        current_sow = sow(msg.words)
+        self.latest_sow = current_sow
+        self.expire(current_sow)
+
+        if page not in required:
+            return
+
+        pages = self._pages.setdefault((prn, layout is D2_FIELDS), _PageSet())
+        pages.sow[page] = current_sow
+        if pages.raw.get(page) != msg.words:
+            pages.raw[page] = msg.words
+            pages.parts.update(page_parts(layout, page, msg.words))
+
+        if required.difference(pages.raw):
+            return
+
+        times = pages.sow.values()
+        if max(times) - min(times) >= (D1_CYCLE if layout is D1_FIELDS else D2_CYCLE):
+            # some pages are left over from an earlier cycle
+            return
+
+        current = self.ephemerides.get(prn)
+        if current is not None and current["_raw"] == pages.raw:
+            return
+
+        eph = decode_beidou_ephemeris(layout, pages.parts)
+        eph["_raw"] = dict(pages.raw)
+        if current is None or current["t_oe"] != eph["t_oe"]:
+            self.add(prn, eph)
+        else:
+            # same ephemeris repeated, remember the pages so it isn't decoded again
+            current["_raw"] = eph["_raw"]
+
+    def expire(self, t):
+        for prn, eph in list(self.ephemerides.items()):
+            age = t - eph["t_oe"]
+            # allow for the week rolling over
+            if age < -302400:
+                age += 604800
+            if age > self.max_age:
+                self.remove(prn)
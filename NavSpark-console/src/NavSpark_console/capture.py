@@ -0,0 +1,55 @@
+import threading
+
+import attr
+
+from NavSpark_console.protocol import NavSparkRawProtocol
+
+READ_SIZE = 4096
+
+
+@attr.s(auto_attribs=True)
+class Recorder:
+    """
+    Writes a receiver's raw serial output to fp as it is read, the capture
+    replay decodes. It may be written from a reader thread while the event
+    loop closes it, anything written after the close is dropped.
+    """
+
+    fp: object
+    bytes_written: int = 0
+    closed: bool = False
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, repr=False)
+
+    @classmethod
+    def open(cls, path):
+        return cls(open(path, "ab"))
+
+    def write(self, data):
+        with self._lock:
+            if self.closed:
+                return
+            self.fp.write(data)
+            self.bytes_written += len(data)
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self.fp.close()
+
+
+def replay(fp, read_size=READ_SIZE, source=None):
+    """
+    Decode a raw capture of the receiver's serial output, yielding the messages
+    in the order they were received, tagged with source.
+    """
+    protocol = NavSparkRawProtocol(source=source)
+    protocol.connection_made(None)
+
+    while True:
+        data = fp.read(read_size)
+        if not data:
+            break
+
+        protocol.data_received(data)
+        while not protocol.message_queue.empty():
+            yield protocol.message_queue.get_nowait()
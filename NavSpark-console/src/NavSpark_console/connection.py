@@ -0,0 +1,114 @@
+import asyncio
+
+import attr
+import serial
+import serial_asyncio
+
+from NavSpark_console.protocol import NavSparkRawProtocol
+from NavSpark_console.reader_thread import create_reader_thread_connection
+
+# the first retry after a drop is immediate, then wait this long and double
+INITIAL_BACKOFF = 0.01
+MAX_BACKOFF = 2.0
+BACKOFF_FACTOR = 2.0
+
+
+@attr.s(auto_attribs=True, eq=False)
+class SerialConnection:
+    """
+    Keeps one NavSparkRawProtocol attached to a serial port. When the port
+    drops it's reopened straight away and then with exponential backoff
+    until it comes back. The same protocol is attached every time, so its
+    message queue, buffer and counters carry on across reconnects.
+    """
+
+    port: str
+    # passed on to serial.Serial, baudrate, bytesize, parity and stopbits
+    settings: dict = attr.ib(factory=dict)
+    protocol: NavSparkRawProtocol = attr.ib(factory=NavSparkRawProtocol)
+    initial_backoff: float = INITIAL_BACKOFF
+    max_backoff: float = MAX_BACKOFF
+    backoff_factor: float = BACKOFF_FACTOR
+    # read and frame in a thread, a ReaderThreadTransport, rather than the loop
+    reader_thread: bool = False
+    # failed opens since the port was last up
+    attempts: int = 0
+    last_error: Exception = None
+    transport: asyncio.Transport = attr.ib(default=None, repr=False)
+    _task: asyncio.Task = attr.ib(default=None, repr=False)
+    _lost: asyncio.Event = attr.ib(factory=asyncio.Event, repr=False)
+    _connected: asyncio.Event = attr.ib(factory=asyncio.Event, repr=False)
+
+    def __attrs_post_init__(self):
+        self.protocol.on_connection_lost = self._connection_lost
+
+    @property
+    def connected(self):
+        return self.transport is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def wait_connected(self):
+        await self._connected.wait()
+
+    def set_baudrate(self, baudrate):
+        """Switch the host end of the link, reconnects keep the new rate"""
+        self.settings["baudrate"] = baudrate
+        if self.transport is not None:
+            self.transport.serial.baudrate = baudrate
+
+    def _connection_lost(self, exc):
+        if exc is not None:
+            self.last_error = exc
+        self.transport = None
+        self._connected.clear()
+        self._lost.set()
+
+    async def _open(self):
+        loop = asyncio.get_running_loop()
+        create = serial_asyncio.create_serial_connection
+        if self.reader_thread:
+            create = create_reader_thread_connection
+        transport, _ = await create(
+            loop, lambda: self.protocol, self.port, **self.settings
+        )
+        return transport
+
+    async def _run(self):
+        backoff = 0.0
+        while True:
+            self._lost.clear()
+            try:
+                transport = await self._open()
+            except (serial.SerialException, OSError) as ex:
+                self.last_error = ex
+                self.attempts += 1
+                await asyncio.sleep(backoff)
+                backoff = min(
+                    max(backoff * self.backoff_factor, self.initial_backoff),
+                    self.max_backoff,
+                )
+                continue
+
+            self.transport = transport
+            self.attempts = 0
+            backoff = 0.0
+            self._connected.set()
+            await self._lost.wait()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        self._connected.clear()
@@ -0,0 +1,158 @@
+import math
+
+import attr
+import numpy as np
+
+# WGS-84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_EP2 = WGS84_E2 / (1 - WGS84_E2)
+
+
+def ecef_to_geodetic(x, y, z):
+    """
+    Latitude and longitude in radians and ellipsoidal height in metres, using
+    Bowring's closed form which is good to well under a millimetre for points
+    near the surface of the earth.
+    """
+    if isinstance(x, float) or np.ndim(x) == 0:
+        return _ecef_to_geodetic_scalar(float(x), float(y), float(z))
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    z = np.asarray(z, dtype=float)
+
+    p = np.hypot(x, y)
+    theta = np.arctan2(z * WGS84_A, p * WGS84_B)
+    sin_t = np.sin(theta)
+    cos_t = np.cos(theta)
+
+    lat = np.arctan2(
+        z + WGS84_EP2 * WGS84_B * sin_t**3, p - WGS84_E2 * WGS84_A * cos_t**3
+    )
+    lon = np.arctan2(y, x)
+
+    sin_lat = np.sin(lat)
+    N = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    # the p / cos(lat) form loses precision near the poles
+    with np.errstate(divide="ignore", invalid="ignore"):
+        height = np.where(
+            np.abs(sin_lat) < 0.7,
+            p / np.cos(lat) - N,
+            z / sin_lat - N * (1 - WGS84_E2),
+        )
+    return lat, lon, height
+
+
+def _ecef_to_geodetic_scalar(x, y, z):
+    # the same as above with plain floats, numpy is slow for single points
+    p = math.hypot(x, y)
+    theta = math.atan2(z * WGS84_A, p * WGS84_B)
+    sin_t = math.sin(theta)
+    cos_t = math.cos(theta)
+
+    lat = math.atan2(
+        z + WGS84_EP2 * WGS84_B * sin_t**3, p - WGS84_E2 * WGS84_A * cos_t**3
+    )
+    lon = math.atan2(y, x)
+
+    sin_lat = math.sin(lat)
+    N = WGS84_A / math.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    if abs(sin_lat) < 0.7:
+        height = p / math.cos(lat) - N
+    else:
+        height = z / sin_lat - N * (1 - WGS84_E2)
+    return lat, lon, height
+
+
+def geodetic_to_ecef(lat, lon, height):
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    N = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    x = (N + height) * cos_lat * np.cos(lon)
+    y = (N + height) * cos_lat * np.sin(lon)
+    z = (N * (1 - WGS84_E2) + height) * sin_lat
+    return x, y, z
+
+
+def enu_rotation(lat, lon, out=None):
+    """
+    Rotation from ECEF to east/north/up at a point, the rows are the east, north
+    and up unit vectors.
+    """
+    if out is None:
+        out = np.empty((3, 3))
+
+    sin_lat, cos_lat = math.sin(lat), math.cos(lat)
+    sin_lon, cos_lon = math.sin(lon), math.cos(lon)
+    out[0] = (-sin_lon, cos_lon, 0.0)
+    out[1] = (-sin_lat * cos_lon, -sin_lat * sin_lon, cos_lat)
+    out[2] = (cos_lat * cos_lon, cos_lat * sin_lon, sin_lat)
+    return out
+
+
+@attr.s(frozen=True)
+class LocalFrame:
+    """
+    East/north/up frame with its origin at a reference point. The rotation is
+    worked out once, the conversions take scalars or arrays of any shape.
+    """
+
+    origin = attr.ib(converter=lambda o: tuple(float(v) for v in o))
+    latitude = attr.ib(init=False)
+    longitude = attr.ib(init=False)
+    height = attr.ib(init=False)
+    rotation = attr.ib(init=False, repr=False, eq=False)
+    # the rotation as plain floats, row by row
+    _r = attr.ib(init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self):
+        lat, lon, height = ecef_to_geodetic(*self.origin)
+        rotation = enu_rotation(lat, lon)
+        rotation.flags.writeable = False
+
+        object.__setattr__(self, "latitude", lat)
+        object.__setattr__(self, "longitude", lon)
+        object.__setattr__(self, "height", height)
+        object.__setattr__(self, "rotation", rotation)
+        object.__setattr__(self, "_r", tuple(rotation.ravel().tolist()))
+
+    @classmethod
+    def from_geodetic(cls, lat, lon, height):
+        return cls(geodetic_to_ecef(lat, lon, height))
+
+    @classmethod
+    def from_base_position(cls, msg):
+        """From a ConfigureBasePositionInput/Output, which is in degrees"""
+        return cls.from_geodetic(
+            math.radians(msg.latitude),
+            math.radians(msg.longitude),
+            msg.ellipsoidal_height,
+        )
+
+    def ecef_to_enu(self, x, y, z):
+        ox, oy, oz = self.origin
+        return self.rotate_velocity(x - ox, y - oy, z - oz)
+
+    def enu_to_ecef(self, e, n, u):
+        r = self._r
+        ox, oy, oz = self.origin
+        # the transpose of the rotation
+        return (
+            ox + r[0] * e + r[3] * n + r[6] * u,
+            oy + r[1] * e + r[4] * n + r[7] * u,
+            oz + r[2] * e + r[5] * n + r[8] * u,
+        )
+
+    def rotate_velocity(self, vx, vy, vz):
+        """ECEF vectors, velocities or offsets, into east/north/up"""
+        r = self._r
+        return (
+            r[0] * vx + r[1] * vy,
+            r[3] * vx + r[4] * vy + r[5] * vz,
+            r[6] * vx + r[7] * vy + r[8] * vz,
+        )
@@ -0,0 +1,267 @@
+from enum import IntFlag
+
+import attr
+import numpy as np
+
+from NavSpark_console.protocol import (
+    ExtendedRawMeasurements,
+    ExtendedRawChannelIndicator,
+    GNSSType,
+)
+from NavSpark_console.signal_quality import SignalIndex, MAX_SIGNALS
+from NavSpark_console.positioning import SPEED_OF_LIGHT
+
+# carrier frequencies by (gnss_type, signal_type) in Hz, GLONASS is FDMA and
+# handled on its own
+CARRIER_FREQUENCIES = {
+    (GNSSType.GPS, 0): 1575.42e6,
+    (GNSSType.GPS, 1): 1575.42e6,
+    (GNSSType.GPS, 2): 1227.60e6,
+    (GNSSType.GPS, 4): 1176.45e6,
+    (GNSSType.SBAS, 0): 1575.42e6,
+    (GNSSType.GALILEO, 0): 1575.42e6,
+    (GNSSType.GALILEO, 4): 1176.45e6,
+    (GNSSType.GALILEO, 5): 1207.14e6,
+    (GNSSType.GALILEO, 6): 1278.75e6,
+    (GNSSType.QZSS, 0): 1575.42e6,
+    (GNSSType.QZSS, 1): 1575.42e6,
+    (GNSSType.QZSS, 2): 1227.60e6,
+    (GNSSType.QZSS, 4): 1176.45e6,
+    (GNSSType.BEIDOU, 0): 1561.098e6,
+    (GNSSType.BEIDOU, 1): 1575.42e6,
+    (GNSSType.BEIDOU, 4): 1176.45e6,
+    (GNSSType.BEIDOU, 5): 1207.14e6,
+    (GNSSType.BEIDOU, 7): 1268.52e6,
+    (GNSSType.IRNSS, 4): 1176.45e6,
+}
+
+# GLONASS frequency_id is the channel number offset by 7
+GLONASS_CHANNEL_OFFSET = 7
+GLONASS_L1 = (1602.0e6, 0.5625e6)
+GLONASS_L2 = (1246.0e6, 0.4375e6)
+
+# RINEX convention, the phase falls as an approaching satellite's Doppler rises
+DOPPLER_SIGN = -1.0
+
+# cycles between the measured phase and the one integrated from the Doppler
+DOPPLER_THRESHOLD = 1.0
+# metres of change in the geometry-free combination between epochs
+GEOMETRY_FREE_THRESHOLD = 0.05
+# longer gaps than this start a new arc
+MAX_GAP = 1.0
+
+
+class SlipReason(IntFlag):
+    NEW_ARC = 0b1
+    RECEIVER_FLAG = 0b10
+    LOCK_TIME = 0b100
+    DOPPLER = 0b1000
+    GEOMETRY_FREE = 0b10000
+
+
+def wavelengths(gnss_type, signal_type, frequency_id):
+    """Carrier wavelength of each signal in metres, NaN when it's not known"""
+    frequency = np.array(
+        [
+            CARRIER_FREQUENCIES.get((int(g), int(s)), np.nan)
+            for g, s in zip(gnss_type, signal_type)
+        ]
+    )
+
+    glonass = np.asarray(gnss_type) == GNSSType.GLONASS
+    k = np.asarray(frequency_id) - GLONASS_CHANNEL_OFFSET
+    signal_type = np.asarray(signal_type)
+    for band, (base, step) in ((0, GLONASS_L1), (2, GLONASS_L2)):
+        sel = glonass & (signal_type == band)
+        frequency[sel] = base + step * k[sel]
+
+    return SPEED_OF_LIGHT / frequency
+
+
+def geometry_free_phase(gnss_type, svid, signal_type, frequency_id, phase):
+    """
+    The geometry-free phase in metres of every signal against signal type 0 of
+    the same satellite, NaN without one, and the index of that signal in the
+    epoch, -1 without one.
+    """
+    n = len(svid)
+    satellite = np.asarray(gnss_type) * 1024 + np.asarray(svid)
+    is_primary = np.asarray(signal_type) == 0
+
+    primary_idx = np.flatnonzero(is_primary)
+    order = np.argsort(satellite[primary_idx])
+    primary_idx = primary_idx[order]
+    primary_keys = satellite[primary_idx]
+
+    primary = np.full(n, -1, dtype=np.int64)
+    if len(primary_keys):
+        pos = np.minimum(
+            np.searchsorted(primary_keys, satellite), len(primary_keys) - 1
+        )
+        found = (primary_keys[pos] == satellite) & ~is_primary
+        primary[found] = primary_idx[pos[found]]
+
+    found = primary >= 0
+    metres = wavelengths(gnss_type, signal_type, frequency_id) * phase
+    geometry_free = np.full(n, np.nan)
+    geometry_free[found] = metres[primary[found]] - metres[found]
+    return geometry_free, primary
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class CycleSlip:
+    tow: float
+    gnss_type: GNSSType
+    svid: int
+    signal_type: int
+    arc_id: int
+    reason: SlipReason
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class PhaseEpoch:
+    """The carrier phase arcs of every signal in one epoch"""
+
+    tow: float
+    gnss_type: np.ndarray
+    svid: np.ndarray
+    signal_type: np.ndarray
+    arc_id: np.ndarray
+    slip: np.ndarray
+
+    def events(self):
+        return [
+            CycleSlip(
+                self.tow,
+                GNSSType(self.gnss_type[i]),
+                int(self.svid[i]),
+                int(self.signal_type[i]),
+                int(self.arc_id[i]),
+                SlipReason(int(self.slip[i])),
+            )
+            for i in np.flatnonzero(self.slip)
+        ]
+
+
+@attr.s(auto_attribs=True)
+class CycleSlipDetector:
+    """
+    Follows the carrier phase of every signal and starts a new arc whenever it
+    might have slipped. Every epoch is checked against the receiver's slip flag
+    and lock time, the phase integrated from the Doppler, and where a satellite
+    has a second frequency the geometry-free combination.
+    """
+
+    doppler_threshold: float = DOPPLER_THRESHOLD
+    geometry_free_threshold: float = GEOMETRY_FREE_THRESHOLD
+    max_gap: float = MAX_GAP
+    max_signals: int = MAX_SIGNALS
+    next_arc: int = 0
+    latest: PhaseEpoch = None
+
+    def __attrs_post_init__(self):
+        n = self.max_signals
+        self.index = SignalIndex(n)
+        self.time = np.full(n, np.nan)
+        self.phase = np.zeros(n)
+        self.doppler = np.zeros(n)
+        self.lock_time = np.zeros(n, dtype=np.int64)
+        self.geometry_free = np.full(n, np.nan)
+        self.arc_id = np.full(n, -1, dtype=np.int64)
+
+    def update(self, msg):
+        if not isinstance(msg, ExtendedRawMeasurements):
+            return None
+
+        subs = [
+            m
+            for m in msg.sub_messages
+            if m.channel_indicator & ExtendedRawChannelIndicator.carrier_phase_available
+        ]
+        return self.add_epoch(
+            msg.tow / 1000.0,
+            np.array([m.gnss_type for m in subs], dtype=np.int64),
+            np.array([m.svid for m in subs], dtype=np.int64),
+            np.array([m.signal_type for m in subs], dtype=np.int64),
+            np.array([m.frequency_id for m in subs], dtype=np.int64),
+            np.array([m.lock_time_indicator for m in subs], dtype=np.int64),
+            np.array([m.accumulated_carrier_cycle for m in subs]),
+            np.array([m.doppler_frequency for m in subs]),
+            np.array(
+                [
+                    bool(
+                        m.channel_indicator
+                        & ExtendedRawChannelIndicator.cycle_slip_possible
+                    )
+                    for m in subs
+                ],
+                dtype=bool,
+            ),
+        )
+
+    def add_epoch(
+        self,
+        tow,
+        gnss_type,
+        svid,
+        signal_type,
+        frequency_id,
+        lock_time,
+        phase,
+        doppler,
+        slip_flag,
+    ):
+        rows, reset = self.index.lookup(gnss_type, svid, signal_type)
+        self.time[reset] = np.nan
+        self.geometry_free[reset] = np.nan
+
+        dt = tow - self.time[rows]
+        continuing = np.isfinite(dt) & (dt > 0) & (dt <= self.max_gap)
+        dt = np.where(continuing, dt, 0.0)
+
+        slip = np.zeros(len(rows), dtype=np.int64)
+        slip[~continuing] |= SlipReason.NEW_ARC
+        slip[slip_flag] |= SlipReason.RECEIVER_FLAG
+        slip[continuing & (lock_time < self.lock_time[rows])] |= SlipReason.LOCK_TIME
+
+        predicted = (
+            self.phase[rows] + DOPPLER_SIGN * 0.5 * (self.doppler[rows] + doppler) * dt
+        )
+        jump = np.abs(phase - predicted) > self.doppler_threshold
+        slip[continuing & jump] |= SlipReason.DOPPLER
+
+        geometry_free, primary = geometry_free_phase(
+            gnss_type, svid, signal_type, frequency_id, phase
+        )
+        # both signals have to carry on from the last epoch
+        has_primary = primary >= 0
+        both = continuing & has_primary
+        both[has_primary] &= continuing[primary[has_primary]]
+
+        change = np.abs(geometry_free - self.geometry_free[rows])
+        with np.errstate(invalid="ignore"):
+            gf_slip = both & (change > self.geometry_free_threshold)
+        # there's no telling which of the two slipped
+        slip[gf_slip] |= SlipReason.GEOMETRY_FREE
+        slip[primary[gf_slip]] |= SlipReason.GEOMETRY_FREE
+
+        # every slip starts a new arc
+        slipped = rows[slip != 0]
+        self.arc_id[slipped] = self.next_arc + np.arange(len(slipped))
+        self.next_arc += len(slipped)
+
+        self.time[rows] = tow
+        self.phase[rows] = phase
+        self.doppler[rows] = doppler
+        self.lock_time[rows] = lock_time
+        self.geometry_free[rows] = geometry_free
+
+        self.latest = PhaseEpoch(
+            tow=tow,
+            gnss_type=np.asarray(gnss_type),
+            svid=np.asarray(svid),
+            signal_type=np.asarray(signal_type),
+            arc_id=self.arc_id[rows].copy(),
+            slip=slip,
+        )
+        return self.latest
@@ -0,0 +1,437 @@
+import math
+from itertools import groupby
+
+import attr
+import numpy as np
+from prompt_toolkit.application import get_app_or_none
+from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.layout.containers import Window
+from prompt_toolkit.layout.controls import UIContent, UIControl
+from prompt_toolkit.layout.dimension import LayoutDimension
+from prompt_toolkit.mouse_events import MouseEventType
+
+from NavSpark_console.geometry import IN_FIX
+from NavSpark_console.positioning import raw_measurement_system
+from NavSpark_console.protocol import (
+    GNSSSatelliteStatuses,
+    GNSSType,
+    SattelliteChannelStatuses,
+    SattelliteChannelStatusIndicator,
+    SattelliteStatusIndicator,
+)
+from NavSpark_console.rinex import OBSERVATION_CODES, satellite_id
+
+SV_FLAGS = (
+    (SattelliteStatusIndicator.almanac_received, "A"),
+    (SattelliteStatusIndicator.ephemeris_received, "E"),
+    (SattelliteStatusIndicator.healthy_sattellite, "H"),
+)
+CHANNEL_FLAGS = (
+    (SattelliteChannelStatusIndicator.pull_in_done, "P"),
+    (SattelliteChannelStatusIndicator.bit_synchronized, "B"),
+    (SattelliteChannelStatusIndicator.frame_synchronized, "F"),
+    (SattelliteChannelStatusIndicator.ephemeris_received, "E"),
+    (SattelliteChannelStatusIndicator.normal_fix_mode, "N"),
+    (SattelliteChannelStatusIndicator.differential_fix_mode, "D"),
+)
+
+TABLE_HEADER = (
+    f"{'sat':<5}{'system':<9}{'cn0':>4}{'el':>4}{'az':>5}  {'flags':<11}signals"
+)
+
+SKY_PLOT_RADIUS = 10
+# elevations drawn as rings
+SKY_PLOT_RINGS = (0, 45)
+LABEL_WIDTH = 3
+
+
+def _flags(value, letters):
+    return "".join(letter if value & flag else "-" for flag, letter in letters)
+
+
+def _number(value, width):
+    return f"{'':>{width}}" if value is None else f"{value:>{width}}"
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class SatelliteRow:
+    """One satellite, channel status numbering already split into gnss_type"""
+
+    gnss_type: GNSSType
+    svid: int
+    cn0: int = None
+    elevation: int = None
+    azimuth: int = None
+    sv_status: int = 0
+    channel_status: int = 0
+    # (observation code, cn0) of every tracked signal
+    signals: tuple = ()
+
+    @property
+    def in_fix(self):
+        return bool(self.channel_status & IN_FIX)
+
+    def format(self):
+        signals = " ".join(f"{code}:{cn0}" for code, cn0 in self.signals)
+        return (
+            f"{satellite_id(self.gnss_type, self.svid):<5}"
+            f"{self.gnss_type.name:<9}"
+            f"{_number(self.cn0, 4)}"
+            f"{_number(self.elevation, 4)}"
+            f"{_number(self.azimuth, 5)}  "
+            f"{_flags(self.sv_status, SV_FLAGS)} "
+            f"{_flags(self.channel_status, CHANNEL_FLAGS)}  "
+            f"{signals}"
+        )
+
+
+@attr.s(auto_attribs=True, eq=False)
+class Satellites:
+    """
+    The latest SattelliteChannelStatuses and GNSSSatelliteStatuses merged into
+    a SatelliteRow per satellite. The panels showing them are marked dirty only
+    when a row actually changed.
+    """
+
+    scheduler: object = attr.ib(default=None, repr=False)
+    # (gnss_type, svid) to SatelliteRow
+    rows: dict = attr.ib(factory=dict, repr=False)
+    # bumped whenever rows changes
+    version: int = 0
+    panels: list = attr.ib(factory=list, repr=False)
+    _channels: dict = attr.ib(factory=dict, repr=False)
+    _signals: dict = attr.ib(factory=dict, repr=False)
+
+    def update(self, msg):
+        """Take in a status message, True if any row changed"""
+        if isinstance(msg, SattelliteChannelStatuses):
+            subs = msg.sub_messages
+            gnss_type, svid = raw_measurement_system(
+                np.array([m.svid for m in subs], dtype=np.int64)
+            )
+            self._channels = {
+                (GNSSType(g), int(s)): m for g, s, m in zip(gnss_type, svid, subs)
+            }
+        elif isinstance(msg, GNSSSatelliteStatuses):
+            signals = {}
+            for m in msg.sub_messages:
+                signals.setdefault((GNSSType(m.gnss_type), m.svid), []).append(m)
+            self._signals = signals
+        else:
+            return False
+        return self._merge()
+
+    def _merge(self):
+        rows = {}
+        for key in self._channels.keys() | self._signals.keys():
+            channel = self._channels.get(key)
+            signals = self._signals.get(key, ())
+            sv_status = channel_status = 0
+            for m in signals:
+                sv_status |= m.sv_status_indicator
+                channel_status |= m.channel_status_indicator
+
+            codes = tuple(
+                sorted(
+                    (OBSERVATION_CODES.get((key[0], m.signal_type), "?"), m.cn0)
+                    for m in signals
+                )
+            )
+            if channel is not None:
+                rows[key] = SatelliteRow(
+                    *key,
+                    channel.cn0,
+                    channel.elevation,
+                    channel.azimuth,
+                    int(sv_status | channel.sv_status_indicator),
+                    int(channel_status | channel.channel_status_indicator),
+                    codes,
+                )
+            else:
+                rows[key] = SatelliteRow(
+                    *key,
+                    max(m.cn0 for m in signals),
+                    sv_status=int(sv_status),
+                    channel_status=int(channel_status),
+                    signals=codes,
+                )
+
+        if rows == self.rows:
+            return False
+        self.rows = rows
+        self.changed()
+        return True
+
+    def changed(self):
+        self.version += 1
+        if self.scheduler is not None:
+            for panel in self.panels:
+                self.scheduler.mark_dirty(panel)
+            return
+        app = get_app_or_none()
+        if app is not None:
+            app.invalidate()
+
+
+class SatelliteTableControl(UIControl):
+    """
+    One line per satellite under a header that stays put while the rows
+    scroll. Lines are kept from frame to frame and only the rows that differ
+    from the last frame drawn are formatted again.
+    """
+
+    def __init__(self, satellites):
+        self.satellites = satellites
+        self.formatted = 0
+        # the first row in view
+        self.top = 0
+        self._rows = {}
+        self._lines = {}
+        self._order = []
+        self._bindings = self._key_bindings()
+        self._content = None
+        self._version = None
+
+    def is_focusable(self):
+        return True
+
+    def scroll(self, rows):
+        self.top = max(self.top + rows, 0)
+        self.satellites.changed()
+
+    def create_content(self, width, height):
+        satellites = self.satellites
+        if self._content is not None and self._version == (
+            satellites.version,
+            self.top,
+            height,
+        ):
+            return self._content
+
+        rows = satellites.rows
+        resort = False
+        for key in self._rows.keys() - rows.keys():
+            del self._rows[key]
+            del self._lines[key]
+            resort = True
+        for key, row in rows.items():
+            old = self._rows.get(key)
+            if old == row:
+                continue
+            resort = resort or old is None
+            self._rows[key] = row
+            style = "class:satellite.in-fix" if row.in_fix else ""
+            self._lines[key] = [(style, row.format())]
+            self.formatted += 1
+        if resort:
+            self._order = sorted(rows)
+
+        shown = max(height - 1, 1)
+        self.top = min(self.top, max(len(self._order) - shown, 0))
+        order = self._order[self.top : self.top + shown]
+        self._version = (satellites.version, self.top, height)
+
+        header = [("class:satellite.header", TABLE_HEADER)]
+        if len(order) < len(self._order):
+            header.append(
+                (
+                    "class:satellite.position",
+                    f"  {self.top + 1}-{self.top + len(order)} of {len(self._order)}",
+                )
+            )
+        lines = [header]
+        lines.extend(self._lines[key] for key in order)
+        self._content = UIContent(
+            get_line=lines.__getitem__, line_count=len(lines), show_cursor=False
+        )
+        return self._content
+
+    def mouse_handler(self, mouse_event):
+        if mouse_event.event_type == MouseEventType.SCROLL_UP:
+            self.scroll(-3)
+        elif mouse_event.event_type == MouseEventType.SCROLL_DOWN:
+            self.scroll(3)
+        else:
+            return NotImplemented
+        return None
+
+    def get_key_bindings(self):
+        return self._bindings
+
+    def _key_bindings(self):
+        bindings = KeyBindings()
+
+        def page(event):
+            info = event.app.layout.current_window.render_info
+            return info.window_height - 1 if info else 10
+
+        @bindings.add("up")
+        def _(event):
+            self.scroll(-1)
+
+        @bindings.add("down")
+        def _(event):
+            self.scroll(1)
+
+        @bindings.add("pageup")
+        def _(event):
+            self.scroll(-page(event))
+
+        @bindings.add("pagedown")
+        def _(event):
+            self.scroll(page(event))
+
+        @bindings.add("home")
+        def _(event):
+            self.top = 0
+            self.satellites.changed()
+
+        @bindings.add("end")
+        def _(event):
+            self.scroll(len(self._order))
+
+        return bindings
+
+
+class SkyPlotControl(UIControl):
+    """
+    Satellites placed by azimuth and elevation on a character canvas, north
+    up. Only the canvas lines a satellite moved on, or off, are redrawn.
+    """
+
+    def __init__(self, satellites, radius=SKY_PLOT_RADIUS):
+        self.satellites = satellites
+        self.radius = radius
+        self.formatted = 0
+        self._size = None
+        self._version = None
+        self._content = None
+
+    def _reset(self, width, height):
+        self._size = (width, height)
+        ry = max(min((height - 1) // 2, (width - LABEL_WIDTH) // 4, self.radius), 1)
+        rx = 2 * ry
+        self._scale = (rx, ry)
+
+        chars = [[" "] * (2 * rx + LABEL_WIDTH) for _ in range(2 * ry + 1)]
+        for elevation in SKY_PLOT_RINGS:
+            r = (90 - elevation) / 90
+            for degrees in range(0, 360, 2):
+                a = math.radians(degrees)
+                chars[ry - round(ry * r * math.cos(a))][
+                    rx + round(rx * r * math.sin(a))
+                ] = "."
+        chars[ry][rx] = "+"
+        chars[0][rx] = "N"
+        chars[2 * ry][rx] = "S"
+        chars[ry][0] = "W"
+        chars[ry][2 * rx] = "E"
+
+        self._base = chars
+        self._chars = [list(line) for line in chars]
+        self._styles = [["class:sky.grid"] * len(line) for line in chars]
+        self._lines = [None] * len(chars)
+        self._placed = {}
+
+    def _place(self, row):
+        rx, ry = self._scale
+        r = (90 - min(max(row.elevation, 0), 90)) / 90
+        a = math.radians(row.azimuth)
+        style = "class:sky.in-fix" if row.in_fix else "class:sky.satellite"
+        return (
+            ry - round(ry * r * math.cos(a)),
+            rx + round(rx * r * math.sin(a)),
+            satellite_id(row.gnss_type, row.svid)[:LABEL_WIDTH],
+            style,
+        )
+
+    def _erase(self, line, col, label, style):
+        chars = self._chars[line]
+        width = min(len(label), len(chars) - col)
+        chars[col : col + width] = self._base[line][col : col + width]
+        self._styles[line][col : col + width] = ["class:sky.grid"] * width
+
+    def _draw(self, line, col, label, style):
+        chars = self._chars[line]
+        width = min(len(label), len(chars) - col)
+        chars[col : col + width] = label[:width]
+        self._styles[line][col : col + width] = [style] * width
+
+    def create_content(self, width, height):
+        satellites = self.satellites
+        if (
+            self._content is not None
+            and self._version == satellites.version
+            and self._size == (width, height)
+        ):
+            return self._content
+        if self._size != (width, height):
+            self._reset(width, height)
+        self._version = satellites.version
+
+        placed = {
+            key: self._place(row)
+            for key, row in satellites.rows.items()
+            if row.elevation is not None and row.azimuth is not None
+        }
+        dirty = {i for i, line in enumerate(self._lines) if line is None}
+        for key, old in self._placed.items():
+            if placed.get(key) != old:
+                self._erase(*old)
+                dirty.add(old[0])
+        for key, new in placed.items():
+            if self._placed.get(key) != new:
+                dirty.add(new[0])
+        self._placed = placed
+
+        if dirty:
+            # whatever else is on a redrawn line may have been partly erased
+            for key in sorted(placed):
+                if placed[key][0] in dirty:
+                    self._draw(*placed[key])
+            for i in dirty:
+                self._lines[i] = [
+                    (style, "".join(c for _, c in cells))
+                    for style, cells in groupby(
+                        zip(self._styles[i], self._chars[i]), key=lambda c: c[0]
+                    )
+                ]
+            self.formatted += len(dirty)
+
+        lines = self._lines
+        self._content = UIContent(
+            get_line=lines.__getitem__, line_count=len(lines), show_cursor=False
+        )
+        return self._content
+
+
+@attr.s(auto_attribs=True, eq=False)
+class SatelliteTable:
+    satellites: Satellites
+
+    def __attrs_post_init__(self):
+        self.satellites.panels.append(self)
+        self.control = SatelliteTableControl(self.satellites)
+        self.window = Window(content=self.control, wrap_lines=False)
+
+    def __pt_container__(self):
+        return self.window
+
+
+@attr.s(auto_attribs=True, eq=False)
+class SkyPlot:
+    satellites: Satellites
+    radius: int = SKY_PLOT_RADIUS
+
+    def __attrs_post_init__(self):
+        self.satellites.panels.append(self)
+        self.control = SkyPlotControl(self.satellites, self.radius)
+        self.window = Window(
+            content=self.control,
+            width=LayoutDimension(max=4 * self.radius + LABEL_WIDTH),
+            height=LayoutDimension(max=2 * self.radius + 1),
+            wrap_lines=False,
+        )
+
+    def __pt_container__(self):
+        return self.window
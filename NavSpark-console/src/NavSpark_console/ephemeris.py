@@ -0,0 +1,370 @@
+import attr
+import numpy as np
+
+from NavSpark_console.protocol import GPSEphemeris, GPSSubframe
+
+# WGS-84 values as used by IS-GPS-200
+GPS_GM = 3.986005e14
+GPS_OMEGA_E_DOT = 7.2921151467e-5
+GPS_PI = 3.1415926535898
+# relativistic clock correction constant -2 sqrt(GM) / c^2
+GPS_F = -4.442807633e-10
+
+WEEK = 604800.0
+
+KEPLER_ITERATIONS = 10
+KEPLER_TOLERANCE = 1e-13
+
+# order of the columns in the packed parameter array
+KEPLER_PARAMETERS = (
+    "t_oe",
+    "root_a",
+    "e",
+    "M_0",
+    "delta_n",
+    "omega",
+    "Omega_0",
+    "Omega_dot",
+    "I_0",
+    "IDOT",
+    "C_uc",
+    "C_us",
+    "C_rc",
+    "C_rs",
+    "C_ic",
+    "C_is",
+    "t_oc",
+    "a_f0",
+    "a_f1",
+    "a_f2",
+    "t_gd",
+)
+
+
+def twos_complement(value, bits):
+    if value & (1 << (bits - 1)):
+        return value - (1 << bits)
+    return value
+
+
+def decode_gps_ephemeris(sf1, sf2, sf3):
+    """
+    Scale the raw subframe fields from GPSEphemeris.subframe*_fields into
+    engineering units. Angles are returned in radians.
+    """
+    return {
+        "week_number": sf1["wn"],
+        "sv_health": sf1["sv_health"],
+        "ura_index": sf1["ura_index"],
+        "iodc": sf1["iodc"],
+        "iode": sf2["iode"],
+        "fit_interval_flag": sf2["fit_interval_flag"],
+        "t_gd": sf1["t_gd"] * 2.0**-31,
+        "t_oc": sf1["t_oc"] * 2.0**4,
+        "a_f2": sf1["a_f2"] * 2.0**-55,
+        "a_f1": sf1["a_f1"] * 2.0**-43,
+        "a_f0": sf1["a_f0"] * 2.0**-31,
+        "C_rs": twos_complement(sf2["c_rs"], 16) * 2.0**-5,
+        "delta_n": twos_complement(sf2["delta_n"], 16) * 2.0**-43 * GPS_PI,
+        "M_0": twos_complement(sf2["M_0"], 32) * 2.0**-31 * GPS_PI,
+        "C_uc": twos_complement(sf2["C_UC"], 16) * 2.0**-29,
+        "e": sf2["e"] * 2.0**-33,
+        "C_us": twos_complement(sf2["C_us"], 16) * 2.0**-29,
+        "root_a": sf2["root_a"] * 2.0**-19,
+        "t_oe": sf2["t_oe"] * 2.0**4,
+        "C_ic": twos_complement(sf3["C_ic"], 16) * 2.0**-29,
+        "Omega_0": twos_complement(sf3["Omega_0"], 32) * 2.0**-31 * GPS_PI,
+        "C_is": twos_complement(sf3["C_is"], 16) * 2.0**-29,
+        "I_0": twos_complement(sf3["I_0"], 32) * 2.0**-31 * GPS_PI,
+        "C_rc": twos_complement(sf3["C_rc"], 16) * 2.0**-5,
+        "omega": twos_complement(sf3["omega"], 32) * 2.0**-31 * GPS_PI,
+        "Omega_dot": twos_complement(sf3["Omega_dot"], 24) * 2.0**-43 * GPS_PI,
+        "IDOT": twos_complement(sf3["iodt"], 14) * 2.0**-43 * GPS_PI,
+    }
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class SatelliteStates:
+    svid: np.ndarray
+    position: np.ndarray
+    velocity: np.ndarray
+    clock_bias: np.ndarray
+    clock_drift: np.ndarray
+
+
+def wrap_week_seconds(dt):
+    # a time difference that crossed the week boundary
+    return dt - np.round(dt / WEEK) * WEEK
+
+
+def solve_kepler(M, e):
+    """Newton iteration for the eccentric anomaly E - e sin(E) = M over arrays"""
+    E = np.array(M, dtype=float, copy=True)
+    for _ in range(KEPLER_ITERATIONS):
+        dE = (E - e * np.sin(E) - M) / (1.0 - e * np.cos(E))
+        E -= dE
+        if np.all(np.abs(dE) < KEPLER_TOLERANCE):
+            break
+    return E
+
+
+def keplerian_states(
+    svid,
+    params,
+    t,
+    gm=GPS_GM,
+    omega_e_dot=GPS_OMEGA_E_DOT,
+    f=GPS_F,
+    geo=None,
+):
+    """
+    Compute ECEF position, velocity and clock terms for every satellite at once.
+
+    params is a (n_sv, len(KEPLER_PARAMETERS)) array. t is the transmit time in
+    seconds of week and broadcasts against the satellite axis, so a (n_sv,) array
+    gives one epoch and a (n_epochs, n_sv) or (n_epochs, 1) array gives a batch.
+
+    geo is an optional (n_sv,) mask of BeiDou GEO satellites, whose elements are
+    given in an inertial frame tilted by 5 degrees.
+    """
+    (
+        t_oe,
+        root_a,
+        e,
+        M_0,
+        delta_n,
+        omega,
+        Omega_0,
+        Omega_dot,
+        I_0,
+        IDOT,
+        C_uc,
+        C_us,
+        C_rc,
+        C_rs,
+        C_ic,
+        C_is,
+        t_oc,
+        a_f0,
+        a_f1,
+        a_f2,
+        t_gd,
+    ) = params.T
+
+    t = np.asarray(t, dtype=float)
+    A = root_a * root_a
+    n = np.sqrt(gm / (A * A * A)) + delta_n
+    tk = wrap_week_seconds(t - t_oe)
+
+    E = solve_kepler(M_0 + n * tk, e)
+    sin_E = np.sin(E)
+    cos_E = np.cos(E)
+    one_minus_ecos = 1.0 - e * cos_E
+    E_dot = n / one_minus_ecos
+
+    root_1_e2 = np.sqrt(1.0 - e * e)
+    nu = np.arctan2(root_1_e2 * sin_E, cos_E - e)
+    nu_dot = E_dot * root_1_e2 / one_minus_ecos
+
+    phi = nu + omega
+    sin_2phi = np.sin(2.0 * phi)
+    cos_2phi = np.cos(2.0 * phi)
+
+    u = phi + C_us * sin_2phi + C_uc * cos_2phi
+    r = A * one_minus_ecos + C_rs * sin_2phi + C_rc * cos_2phi
+    i = I_0 + IDOT * tk + C_is * sin_2phi + C_ic * cos_2phi
+
+    u_dot = nu_dot * (1.0 + 2.0 * (C_us * cos_2phi - C_uc * sin_2phi))
+    r_dot = A * e * sin_E * E_dot + 2.0 * nu_dot * (C_rs * cos_2phi - C_rc * sin_2phi)
+    i_dot = IDOT + 2.0 * nu_dot * (C_is * cos_2phi - C_ic * sin_2phi)
+
+    sin_u = np.sin(u)
+    cos_u = np.cos(u)
+    x_orb = r * cos_u
+    y_orb = r * sin_u
+    x_orb_dot = r_dot * cos_u - y_orb * u_dot
+    y_orb_dot = r_dot * sin_u + x_orb * u_dot
+
+    if geo is not None and np.any(geo):
+        Omega_k_dot = Omega_dot - np.where(geo, 0.0, omega_e_dot)
+    else:
+        geo = None
+        Omega_k_dot = Omega_dot - omega_e_dot
+    Omega = Omega_0 + Omega_k_dot * tk - omega_e_dot * t_oe
+    sin_O = np.sin(Omega)
+    cos_O = np.cos(Omega)
+    sin_i = np.sin(i)
+    cos_i = np.cos(i)
+
+    position = np.empty(np.shape(tk) + (3,))
+    position[..., 0] = x_orb * cos_O - y_orb * cos_i * sin_O
+    position[..., 1] = x_orb * sin_O + y_orb * cos_i * cos_O
+    position[..., 2] = y_orb * sin_i
+
+    velocity = np.empty_like(position)
+    velocity[..., 0] = (
+        x_orb_dot * cos_O
+        - y_orb_dot * cos_i * sin_O
+        + y_orb * sin_i * i_dot * sin_O
+        - position[..., 1] * Omega_k_dot
+    )
+    velocity[..., 1] = (
+        x_orb_dot * sin_O
+        + y_orb_dot * cos_i * cos_O
+        - y_orb * sin_i * i_dot * cos_O
+        + position[..., 0] * Omega_k_dot
+    )
+    velocity[..., 2] = y_orb_dot * sin_i + y_orb * cos_i * i_dot
+
+    if geo is not None:
+        position, velocity = _rotate_geo(position, velocity, tk, geo, omega_e_dot)
+
+    # single frequency users apply the group delay to the L1 clock
+    dt_c = wrap_week_seconds(t - t_oc)
+    relativistic = f * e * root_a * sin_E
+    clock_bias = a_f0 + (a_f1 + a_f2 * dt_c) * dt_c + relativistic - t_gd
+    clock_drift = a_f1 + 2.0 * a_f2 * dt_c + f * e * root_a * cos_E * E_dot
+
+    return SatelliteStates(
+        svid=svid,
+        position=position,
+        velocity=velocity,
+        clock_bias=clock_bias,
+        clock_drift=clock_drift,
+    )
+
+
+GEO_SIN_5 = np.sin(np.radians(-5.0))
+GEO_COS_5 = np.cos(np.radians(-5.0))
+
+
+def _rotate_geo(position, velocity, tk, geo, omega_e_dot):
+    # tilt back by 5 degrees about X then rotate into the earth fixed frame
+    x = position[..., 0]
+    y = position[..., 1] * GEO_COS_5 + position[..., 2] * GEO_SIN_5
+    z = -position[..., 1] * GEO_SIN_5 + position[..., 2] * GEO_COS_5
+    vx = velocity[..., 0]
+    vy = velocity[..., 1] * GEO_COS_5 + velocity[..., 2] * GEO_SIN_5
+    vz = -velocity[..., 1] * GEO_SIN_5 + velocity[..., 2] * GEO_COS_5
+
+    sin_t = np.sin(omega_e_dot * tk)
+    cos_t = np.cos(omega_e_dot * tk)
+
+    geo_position = np.empty_like(position)
+    geo_position[..., 0] = x * cos_t + y * sin_t
+    geo_position[..., 1] = -x * sin_t + y * cos_t
+    geo_position[..., 2] = z
+
+    geo_velocity = np.empty_like(velocity)
+    geo_velocity[..., 0] = vx * cos_t + vy * sin_t + omega_e_dot * geo_position[..., 1]
+    geo_velocity[..., 1] = -vx * sin_t + vy * cos_t - omega_e_dot * geo_position[..., 0]
+    geo_velocity[..., 2] = vz
+
+    mask = np.asarray(geo)[..., np.newaxis]
+    return (
+        np.where(mask, geo_position, position),
+        np.where(mask, geo_velocity, velocity),
+    )
+
+
+@attr.s(auto_attribs=True)
+class KeplerianEphemerisCache:
+    """
+    Latest decoded ephemeris for every SV, packed into a parameter array the
+    first time it is needed after a change.
+    """
+
+    ephemerides: dict = attr.ib(factory=dict)
+    _packed: tuple = attr.ib(default=None, repr=False)
+
+    gm = GPS_GM
+    omega_e_dot = GPS_OMEGA_E_DOT
+    f = GPS_F
+
+    def add(self, svid, eph):
+        self.ephemerides[svid] = eph
+        self._packed = None
+
+    def remove(self, svid):
+        if self.ephemerides.pop(svid, None) is not None:
+            self._packed = None
+
+    def is_geo(self, svid):
+        return False
+
+    @property
+    def packed(self):
+        if self._packed is None:
+            svids = np.array(sorted(self.ephemerides), dtype=np.uint8)
+            params = np.array(
+                [[self.ephemerides[sv][p] for p in KEPLER_PARAMETERS] for sv in svids],
+                dtype=float,
+            ).reshape(len(svids), len(KEPLER_PARAMETERS))
+            geo = np.array([self.is_geo(sv) for sv in svids], dtype=bool)
+            self._packed = (svids, params, geo)
+        return self._packed
+
+    def satellite_states(self, t, svids=None):
+        """
+        Positions, velocities and clock corrections at transmit time t for all
+        cached SVs, or only the ones listed in svids.
+        """
+        all_svids, params, geo = self.packed
+        if svids is not None:
+            rows = {sv: i for i, sv in enumerate(all_svids.tolist())}
+            try:
+                idx = [rows[sv] for sv in np.atleast_1d(svids).tolist()]
+            except KeyError as ex:
+                raise KeyError(f"no ephemeris for SV {ex.args[0]}") from None
+            all_svids, params, geo = all_svids[idx], params[idx], geo[idx]
+
+        return keplerian_states(
+            all_svids,
+            params,
+            t,
+            gm=self.gm,
+            omega_e_dot=self.omega_e_dot,
+            f=self.f,
+            geo=geo,
+        )
+
+
+@attr.s(auto_attribs=True)
+class GPSEphemerisCache(KeplerianEphemerisCache):
+    _subframes: dict = attr.ib(factory=dict, repr=False)
+
+    def update(self, msg):
+        if isinstance(msg, GPSEphemeris):
+            self.add(
+                msg.satellite_number,
+                decode_gps_ephemeris(
+                    msg.subframe1_fields, msg.subframe2_fields, msg.subframe3_fields
+                ),
+            )
+        elif isinstance(msg, GPSSubframe):
+            self._update_subframe(msg)
+
+    def _update_subframe(self, msg):
+        if not 1 <= msg.sfid <= 3:
+            return
+
+        # the subframe words include the TLM word that GPSEphemeris leaves out
+        frames = self._subframes.setdefault(msg.svid, {})
+        frames[msg.sfid] = GPSEphemeris(
+            satellite_number=msg.svid,
+            **{f"eph_data_subframe{msg.sfid}": b"\x00" + msg.words[3:]},
+        )
+        if len(frames) < 3:
+            return
+
+        sf1 = frames[1].subframe1_fields
+        sf2 = frames[2].subframe2_fields
+        sf3 = frames[3].subframe3_fields
+        if not (sf2["iode"] == sf3["iode"] == sf1["iodc"] & 0xFF):
+            # a new upload is in progress, wait for the matching subframes
+            return
+
+        eph = decode_gps_ephemeris(sf1, sf2, sf3)
+        current = self.ephemerides.get(msg.svid)
+        if current is None or current["iode"] != eph["iode"]:
+            self.add(msg.svid, eph)
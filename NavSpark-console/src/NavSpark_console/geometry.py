@@ -0,0 +1,170 @@
+import attr
+import numpy as np
+
+from NavSpark_console.protocol import (
+    SattelliteChannelStatuses,
+    SattelliteChannelStatusIndicator,
+)
+from NavSpark_console.positioning import raw_measurement_system
+
+IN_FIX = (
+    SattelliteChannelStatusIndicator.normal_fix_mode
+    | SattelliteChannelStatusIndicator.differential_fix_mode
+)
+
+# the most subset results kept for one geometry
+MAX_CACHED_SUBSETS = 64
+# normal matrices worse conditioned than this are taken as singular, the
+# satellites are too close to one another in the sky for a fix
+MAX_CONDITION = 1e12
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class DOP:
+    """Dilution of precision, NaN when the subset can't give a fix"""
+
+    gdop: float
+    pdop: float
+    hdop: float
+    vdop: float
+    tdop: float
+    count: int
+
+
+def geometry_matrix(elevation, azimuth):
+    """
+    Rows of unit vectors from the receiver to each satellite in east, north,
+    up, negated, with a column of ones for the receiver clock. Angles are in
+    radians.
+    """
+    elevation = np.asarray(elevation, dtype=float)
+    azimuth = np.asarray(azimuth, dtype=float)
+    cos_el = np.cos(elevation)
+
+    H = np.empty((len(elevation), 4))
+    H[:, 0] = -cos_el * np.sin(azimuth)
+    H[:, 1] = -cos_el * np.cos(azimuth)
+    H[:, 2] = -np.sin(elevation)
+    H[:, 3] = 1.0
+    return H
+
+
+def dops(H, masks):
+    """
+    The DOPs of many subsets of the satellites in H at once. masks is a
+    (subsets, satellites) boolean array, the results are (subsets,) arrays in
+    the order gdop, pdop, hdop, vdop, tdop.
+    """
+    masks = np.atleast_2d(np.asarray(masks, dtype=float))
+    # H^T W H for every subset
+    normal = np.einsum("ki,ij,il->kjl", masks, H, H)
+
+    # subsets with too few satellites, or satellites in line with each other,
+    # get NaN rather than a singular matrix
+    enough = masks.sum(axis=1) >= 4
+    normal[~enough] = np.eye(4)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        enough &= np.linalg.cond(normal) < MAX_CONDITION
+    normal[~enough] = np.eye(4)
+    with np.errstate(invalid="ignore"):
+        Q = np.linalg.inv(normal)
+        diagonal = np.diagonal(Q, axis1=1, axis2=2).copy()
+    diagonal[~enough] = np.nan
+
+    e, n, u, t = diagonal.T
+    return (
+        np.sqrt(e + n + u + t),
+        np.sqrt(e + n + u),
+        np.sqrt(e + n),
+        np.sqrt(u),
+        np.sqrt(t),
+    )
+
+
+@attr.s(auto_attribs=True)
+class SatelliteGeometry:
+    """
+    DOPs of the satellites in the latest SattelliteChannelStatuses. The geometry
+    matrix is only rebuilt when the tracked satellites or their angles change,
+    and the DOPs of each subset asked for are kept until then.
+    """
+
+    gnss_type: np.ndarray = None
+    svid: np.ndarray = None
+    elevation: np.ndarray = None
+    azimuth: np.ndarray = None
+    in_fix: np.ndarray = None
+    H: np.ndarray = None
+    _key: bytes = None
+    _subsets: dict = attr.ib(factory=dict, repr=False)
+
+    def update(self, msg):
+        if not isinstance(msg, SattelliteChannelStatuses):
+            return
+
+        subs = msg.sub_messages
+        self.set_satellites(
+            [m.svid for m in subs],
+            [m.elevation for m in subs],
+            [m.azimuth for m in subs],
+            [bool(m.channel_status_indicator & IN_FIX) for m in subs],
+        )
+
+    def set_satellites(self, svid, elevation, azimuth, in_fix=None):
+        """Channel status numbering for svid, angles in degrees"""
+        svid = np.asarray(svid, dtype=np.int64)
+        elevation = np.asarray(elevation, dtype=float)
+        azimuth = np.asarray(azimuth, dtype=float)
+        in_fix = (
+            np.ones(len(svid), dtype=bool)
+            if in_fix is None
+            else np.asarray(in_fix, dtype=bool)
+        )
+
+        key = svid.tobytes() + elevation.tobytes() + azimuth.tobytes()
+        if key == self._key:
+            self.in_fix = in_fix
+            return
+
+        self._key = key
+        self._subsets.clear()
+        self.gnss_type, _ = raw_measurement_system(svid)
+        self.svid = svid
+        self.elevation = elevation
+        self.azimuth = azimuth
+        self.in_fix = in_fix
+        self.H = geometry_matrix(np.radians(elevation), np.radians(azimuth))
+
+    def dop(self, mask=None):
+        """The DOPs of the satellites selected by mask, all of them without one"""
+        if self.H is None:
+            return None
+        if mask is None:
+            mask = np.ones(len(self.svid), dtype=bool)
+        mask = np.asarray(mask, dtype=bool)
+
+        key = mask.tobytes()
+        result = self._subsets.get(key)
+        if result is None:
+            result = DOP(*(float(v[0]) for v in dops(self.H, mask)), int(mask.sum()))
+            if len(self._subsets) >= MAX_CACHED_SUBSETS:
+                self._subsets.clear()
+            self._subsets[key] = result
+        return result
+
+    def in_fix_dop(self):
+        """What the receiver should be reporting, the satellites it says it uses"""
+        return self.dop(self.in_fix)
+
+    def above(self, elevation_mask):
+        """What-if, only the satellites at or above elevation_mask degrees"""
+        return self.dop(self.elevation >= elevation_mask)
+
+    def constellation(self, *gnss_types):
+        return self.dop(np.isin(self.gnss_type, gnss_types))
+
+    def elevation_sweep(self, masks):
+        """DOPs for a list of elevation masks in degrees, in one batch"""
+        masks = np.asarray(masks, dtype=float)
+        subsets = self.elevation[np.newaxis, :] >= masks[:, np.newaxis]
+        return dops(self.H, subsets)
@@ -0,0 +1,220 @@
+import attr
+import numpy as np
+
+from NavSpark_console.protocol import GLONASSEphemeris, GLONASSString
+from NavSpark_console.ephemeris import SatelliteStates
+
+# PZ-90 constants from the GLONASS ICD
+GLONASS_GM = 398600.4418e9
+GLONASS_AE = 6378136.0
+GLONASS_J2 = 1082625.75e-9
+GLONASS_OMEGA_E_DOT = 7.292115e-5
+
+DAY = 86400.0
+MOSCOW_OFFSET = 3 * 3600.0
+
+# the ICD recommends steps of no more than a minute for the RK4 integration
+MAX_STEP = 60.0
+
+
+def sign_magnitude(value, bits):
+    magnitude = value & ((1 << (bits - 1)) - 1)
+    return -magnitude if value >> (bits - 1) else magnitude
+
+
+def decode_glonass_strings(strings):
+    """
+    Scale the fields of immediate strings 1 to 4 (as returned by
+    GLONASSEphemeris.string_fields) into metres, seconds and seconds of the
+    Moscow day.
+    """
+    s1, s2, s3, s4 = (strings[i] for i in (1, 2, 3, 4))
+    return {
+        "t_k": s1["t_k_hours"] * 3600 + s1["t_k_minutes"] * 60 + s1["t_k_30s"] * 30,
+        "t_b": s2["t_b"] * 15 * 60.0,
+        "health": s2["B_n"] >> 2,
+        "position": [
+            sign_magnitude(s[k], 27) * 2.0**-11 * 1e3
+            for s, k in ((s1, "x"), (s2, "y"), (s3, "z"))
+        ],
+        "velocity": [
+            sign_magnitude(s[k], 24) * 2.0**-20 * 1e3
+            for s, k in ((s1, "x_dot"), (s2, "y_dot"), (s3, "z_dot"))
+        ],
+        "acceleration": [
+            sign_magnitude(s[k], 5) * 2.0**-30 * 1e3
+            for s, k in ((s1, "x_dot_dot"), (s2, "y_dot_dot"), (s3, "z_dot_dot"))
+        ],
+        "gamma_n": sign_magnitude(s3["gamma_n"], 11) * 2.0**-40,
+        "tau_n": sign_magnitude(s4["tau_n"], 22) * 2.0**-30,
+        "delta_tau_n": sign_magnitude(s4["delta_tau_n"], 5) * 2.0**-30,
+        "E_n": s4["E_n"],
+        "N_T": s4["N_T"],
+        "M": s4["M"],
+    }
+
+
+def gps_tow_to_glonass_tod(tow, leap_seconds=18):
+    """GLONASS time is UTC(SU), three hours ahead of UTC"""
+    return np.mod(np.asarray(tow) - leap_seconds + MOSCOW_OFFSET, DAY)
+
+
+def wrap_day_seconds(dt):
+    return dt - np.round(dt / DAY) * DAY
+
+
+def glonass_derivatives(state, acceleration):
+    """Equations of motion in the rotating PZ-90 frame for (n, 6) state vectors"""
+    x, y, z = state[:, 0], state[:, 1], state[:, 2]
+    vx, vy = state[:, 3], state[:, 4]
+
+    r2 = x * x + y * y + z * z
+    r = np.sqrt(r2)
+    mu_r3 = GLONASS_GM / (r2 * r)
+    j2 = 1.5 * GLONASS_J2 * GLONASS_GM * GLONASS_AE**2 / (r2 * r2 * r)
+    z2_r2 = 5.0 * z * z / r2
+    w2 = GLONASS_OMEGA_E_DOT**2
+
+    out = np.empty_like(state)
+    out[:, :3] = state[:, 3:]
+    out[:, 3] = (
+        (w2 - mu_r3 - j2 * (1.0 - z2_r2)) * x
+        + 2.0 * GLONASS_OMEGA_E_DOT * vy
+        + acceleration[:, 0]
+    )
+    out[:, 4] = (
+        (w2 - mu_r3 - j2 * (1.0 - z2_r2)) * y
+        - 2.0 * GLONASS_OMEGA_E_DOT * vx
+        + acceleration[:, 1]
+    )
+    out[:, 5] = (-mu_r3 - j2 * (3.0 - z2_r2)) * z + acceleration[:, 2]
+    return out
+
+
+def rk4_propagate(state, acceleration, dt):
+    """
+    Integrate every row of state forward by its own dt (which may be negative),
+    using the same number of sub steps for all rows.
+    """
+    steps = int(np.ceil(np.max(np.abs(dt), initial=0.0) / MAX_STEP))
+    if steps == 0:
+        return state
+
+    h = (dt / steps)[:, np.newaxis]
+    for _ in range(steps):
+        k1 = glonass_derivatives(state, acceleration)
+        k2 = glonass_derivatives(state + 0.5 * h * k1, acceleration)
+        k3 = glonass_derivatives(state + 0.5 * h * k2, acceleration)
+        k4 = glonass_derivatives(state + h * k3, acceleration)
+        state = state + h / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+    return state
+
+
+@attr.s(auto_attribs=True)
+class GLONASSOrbitPropagator:
+    """
+    Latest ephemeris for every GLONASS slot along with the last state each orbit
+    was integrated to. Later epochs step forward from that state instead of
+    integrating all the way from t_b again.
+
+    Times are seconds of the GLONASS (Moscow) day.
+    """
+
+    ephemerides: dict = attr.ib(factory=dict)
+    _strings: dict = attr.ib(factory=dict, repr=False)
+    _rows: dict = attr.ib(factory=dict, repr=False)
+
+    def __attrs_post_init__(self):
+        self.slots = np.empty(0, dtype=np.uint8)
+        self.t_b = np.empty(0)
+        self.initial_state = np.empty((0, 6))
+        self.acceleration = np.empty((0, 3))
+        self.tau_n = np.empty(0)
+        self.gamma_n = np.empty(0)
+
+        # the integration cache
+        self.t_last = np.empty(0)
+        self.state_last = np.empty((0, 6))
+
+    def update(self, msg):
+        if isinstance(msg, GLONASSEphemeris):
+            fields = msg.string_fields
+            if len(fields) == 4:
+                eph = decode_glonass_strings(fields)
+                eph["k"] = msg.k_number
+                self._update_ephemeris(msg.slot_number, eph)
+        elif isinstance(msg, GLONASSString):
+            fields = msg.fields
+            if fields is None:
+                return
+
+            strings = self._strings.setdefault(msg.svid, {})
+            if msg.string_number == 1:
+                # a new frame is starting
+                strings.clear()
+            strings[msg.string_number] = fields
+            if len(strings) == 4:
+                eph = decode_glonass_strings(strings)
+                current = self.ephemerides.get(msg.svid)
+                # the frequency channel isn't part of the immediate strings
+                eph["k"] = current["k"] if current else None
+                self._update_ephemeris(msg.svid, eph)
+                strings.clear()
+
+    def _update_ephemeris(self, slot, eph):
+        # the same ephemeris is repeated every frame, keep the cached state
+        current = self.ephemerides.get(slot)
+        if current is None or current["t_b"] != eph["t_b"]:
+            self.add(slot, eph)
+
+    def add(self, slot, eph):
+        self.ephemerides[slot] = eph
+
+        row = self._rows.get(slot)
+        if row is None:
+            row = self._rows[slot] = len(self.slots)
+            self.slots = np.append(self.slots, np.uint8(slot))
+            self.t_b = np.append(self.t_b, 0.0)
+            self.initial_state = np.vstack([self.initial_state, np.zeros((1, 6))])
+            self.acceleration = np.vstack([self.acceleration, np.zeros((1, 3))])
+            self.tau_n = np.append(self.tau_n, 0.0)
+            self.gamma_n = np.append(self.gamma_n, 0.0)
+            self.t_last = np.append(self.t_last, 0.0)
+            self.state_last = np.vstack([self.state_last, np.zeros((1, 6))])
+
+        self.t_b[row] = eph["t_b"]
+        self.initial_state[row, :3] = eph["position"]
+        self.initial_state[row, 3:] = eph["velocity"]
+        self.acceleration[row] = eph["acceleration"]
+        self.tau_n[row] = eph["tau_n"]
+        self.gamma_n[row] = eph["gamma_n"]
+
+        # a new ephemeris invalidates the integration cache for this slot
+        self.t_last[row] = eph["t_b"]
+        self.state_last[row] = self.initial_state[row]
+
+    def satellite_states(self, t):
+        """
+        Propagate every slot to time t (a scalar or one time per slot) and
+        return positions, velocities and clock corrections.
+        """
+        t = np.broadcast_to(np.asarray(t, dtype=float), self.t_b.shape)
+
+        # restart from t_b when that is closer than the cached state
+        from_tb = wrap_day_seconds(t - self.t_b)
+        from_last = wrap_day_seconds(t - self.t_last)
+        restart = np.abs(from_tb) < np.abs(from_last)
+        start = np.where(restart[:, np.newaxis], self.initial_state, self.state_last)
+        dt = np.where(restart, from_tb, from_last)
+
+        state = rk4_propagate(start, self.acceleration, dt)
+        self.t_last = np.array(t, dtype=float)
+        self.state_last = state
+
+        return SatelliteStates(
+            svid=self.slots,
+            position=state[:, :3].copy(),
+            velocity=state[:, 3:].copy(),
+            clock_bias=-self.tau_n + self.gamma_n * from_tb,
+            clock_drift=self.gamma_n.copy(),
+        )
@@ -0,0 +1,164 @@
+import attr
+import numpy as np
+
+from NavSpark_console.protocol import NavigationState, ReceiverNavigationStatus
+from NavSpark_console.coordinates import ecef_to_geodetic, enu_rotation
+
+WEEK = 604800.0
+
+# how much to trust each kind of fix relative to a plain 3D fix, None means the
+# message carries no position at all
+NAVIGATION_STATE_SCALE = {
+    NavigationState.NO_FIX: None,
+    NavigationState.FIX_PREDICTION: 10.0,
+    NavigationState.FIX_2D: 3.0,
+    NavigationState.FIX_3D: 1.0,
+    NavigationState.FIX_DIFFERENTIAL: 0.3,
+}
+
+# gaps longer than this restart the filter from the next fix
+MAX_GAP = 5.0
+
+# the receiver reports zero DOPs before it has a geometry
+MIN_DOP = 0.5
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class FilterState:
+    """
+    An immutable snapshot of the filter, safe to hand to other threads. time is
+    GPS seconds counted from week 0 so it does not wrap at the end of a week.
+    """
+
+    time: float
+    position: np.ndarray
+    velocity: np.ndarray
+    covariance: np.ndarray
+    navigation_state: NavigationState
+
+    def position_at(self, time):
+        return self.position + self.velocity * (time - self.time)
+
+
+@attr.s(auto_attribs=True)
+class NavigationFilter:
+    """
+    Constant velocity Kalman filter over the ECEF fixes in
+    ReceiverNavigationStatus. Fixes are weighted by their DOPs and fix type.
+
+    The matrices are allocated once and updated in place, so each message costs
+    the same. The newest estimate is published as a FilterState in latest,
+    replacing the reference in one assignment so readers never need a lock.
+    """
+
+    # range error (UERE) and velocity error that a DOP of 1 stands for
+    position_sigma: float = 3.0
+    velocity_sigma: float = 0.1
+    # spectral density of the white acceleration noise, (m/s^2)^2 / Hz
+    acceleration_noise: float = 0.5
+    latest: FilterState = None
+
+    def __attrs_post_init__(self):
+        self.time = None
+        self.x = np.zeros(6)
+        self.P = np.zeros((6, 6))
+        self.F = np.eye(6)
+        self.Q = np.zeros((6, 6))
+        self.R = np.zeros((6, 6))
+        self.S = np.zeros((6, 6))
+        self.K = np.zeros((6, 6))
+        self.z = np.zeros(6)
+        self.y = np.zeros(6)
+        self._enu = np.zeros((3, 3))
+        self._local = np.zeros(3)
+        self._m3 = np.zeros((3, 3))
+        self._block = np.zeros((3, 3))
+        self._m6 = np.zeros((6, 6))
+        self._v6 = np.zeros(6)
+
+        # index arrays for the position/velocity blocks of the diagonals
+        self._pos = np.arange(3)
+        self._vel = np.arange(3, 6)
+
+    def update(self, msg):
+        if not isinstance(msg, ReceiverNavigationStatus):
+            return None
+
+        scale = NAVIGATION_STATE_SCALE.get(msg.navigation_state)
+        if scale is None:
+            return None
+
+        t = msg.week_number * WEEK + msg.time_of_week
+        self.z[0] = msg.ecef_x
+        self.z[1] = msg.ecef_y
+        self.z[2] = msg.ecef_z
+        self.z[3] = msg.ecef_x_vel
+        self.z[4] = msg.ecef_y_vel
+        self.z[5] = msg.ecef_z_vel
+        self._measurement_noise(msg.hdop, msg.vdop, scale)
+
+        dt = None if self.time is None else t - self.time
+        if dt is None or dt <= 0.0 or dt > MAX_GAP:
+            # start over from this fix
+            self.x[:] = self.z
+            self.P[:] = self.R
+        else:
+            self._predict(dt)
+            self._correct()
+
+        self.time = t
+        self.latest = FilterState(
+            time=t,
+            position=self.x[:3].copy(),
+            velocity=self.x[3:].copy(),
+            covariance=self.P.copy(),
+            navigation_state=msg.navigation_state,
+        )
+        return self.latest
+
+    def _measurement_noise(self, hdop, vdop, scale):
+        # the DOPs describe the local frame, rotate them back into ECEF
+        hdop = max(hdop, MIN_DOP)
+        vdop = max(vdop, MIN_DOP)
+        lat, lon, _ = ecef_to_geodetic(self.z[0], self.z[1], self.z[2])
+        enu = enu_rotation(lat, lon, out=self._enu)
+
+        self._local[:2] = hdop * hdop / 2.0 * scale * scale
+        self._local[2] = vdop * vdop * scale * scale
+        np.multiply(enu.T, self._local, out=self._m3)
+        np.matmul(self._m3, enu, out=self._block)
+
+        np.multiply(self._block, self.position_sigma**2, out=self.R[:3, :3])
+        np.multiply(self._block, self.velocity_sigma**2, out=self.R[3:, 3:])
+
+    def _predict(self, dt):
+        F, Q, P = self.F, self.Q, self.P
+        F[self._pos, self._vel] = dt
+
+        q = self.acceleration_noise
+        Q[self._pos, self._pos] = q * dt**3 / 3.0
+        Q[self._pos, self._vel] = q * dt**2 / 2.0
+        Q[self._vel, self._pos] = q * dt**2 / 2.0
+        Q[self._vel, self._vel] = q * dt
+
+        np.matmul(F, self.x, out=self._v6)
+        self.x[:] = self._v6
+        np.matmul(F, P, out=self._m6)
+        np.matmul(self._m6, F.T, out=P)
+        P += Q
+
+    def _correct(self):
+        P, S, K = self.P, self.S, self.K
+        np.add(P, self.R, out=S)
+        # K = P S^-1, both are symmetric
+        K[:] = np.linalg.solve(S, P).T
+
+        np.subtract(self.z, self.x, out=self.y)
+        np.matmul(K, self.y, out=self._v6)
+        self.x += self._v6
+
+        np.matmul(K, P, out=self._m6)
+        P -= self._m6
+        # keep the covariance symmetric against rounding
+        np.add(P, P.T, out=self._m6)
+        np.multiply(self._m6, 0.5, out=P)
@@ -0,0 +1,475 @@
+import asyncio
+import math
+from collections import Counter
+
+import attr
+import serial
+
+from NavSpark_console.protocol import (
+    MAX_PAYLOAD_LENGTH,
+    BaudRate,
+    BinaryUpdateRate,
+    ConfigureSerialPort,
+    EnableSetting,
+    QueryPositionUpdateRate,
+    RTCMType,
+    SubframeEnabledFlag,
+)
+from NavSpark_console.rtcm import (
+    MSM4_CELLS,
+    MSM7_CELLS,
+    MSM_HEADER_BITS,
+    MSM_MASK_BITS,
+    MSM_SYSTEMS,
+    RTCM_CRC_LENGTH,
+    RTCM_HEADER_LENGTH,
+)
+from NavSpark_console.rtcm_encoder import MSM4_SATELLITES, MSM7_SATELLITES
+
+# A0 A1, the length, the LRC and CR LF around every payload
+PACKET_OVERHEAD = 7
+RTCM_OVERHEAD = RTCM_HEADER_LENGTH + RTCM_CRC_LENGTH
+# 8N1, a start and a stop bit around every byte
+BITS_PER_BYTE = 10
+# leave room for command replies and bursts when an epoch comes out at once
+MAX_UTILIZATION = 0.7
+
+# what a busy sky looks like when sizing the link
+DEFAULT_SATELLITES = 40
+SIGNALS_PER_SATELLITE = 2
+SATELLITES_PER_SYSTEM = 10
+
+BINARY_RATE_HZ = {
+    BinaryUpdateRate.r1Hz: 1,
+    BinaryUpdateRate.r2Hz: 2,
+    BinaryUpdateRate.r4Hz: 4,
+    BinaryUpdateRate.r5Hz: 5,
+    BinaryUpdateRate.r8Hz: 8,
+    BinaryUpdateRate.r10Hz: 10,
+    BinaryUpdateRate.r20Hz: 20,
+}
+
+# payload bytes of each ConfigureBinaryMeasurmentDataOutput message, those
+# that grow with the satellites tracked as (fixed, per satellite or signal)
+MEASUREMENT_TIME_BYTES = 10
+RAW_MEASUREMENT_BYTES = (3, 23)
+CHANNEL_STATUS_BYTES = (3, 10)
+RECEIVER_STATE_BYTES = 81
+EXTENDED_RAW_BYTES = (14, 31)
+# the message id each of those settings turns on, one a measurement epoch
+MEASUREMENT_IDS = {
+    "measure_time": 0xDC,
+    "raw_measurement": 0xDD,
+    "save_channel_status": 0xDE,
+    "receive_state_enabled": 0xDF,
+    "extended_raw_measurement_enabled": 0xE5,
+}
+
+# (payload bytes, seconds between them) for every satellite, there's no
+# Galileo message to count
+SUBFRAME_BYTES = {
+    SubframeEnabledFlag.gps: (33, 6),
+    SubframeEnabledFlag.glonass: (12, 2),
+    SubframeEnabledFlag.beidou: (31, 6),
+}
+
+MSM_FIELDS = ("gps", "glonass", "galileo", "sbas", "qzss", "bds")
+# the MSM1 message number of each, in the same order
+MSM_NUMBERS = dict(zip(MSM_FIELDS, MSM_SYSTEMS))
+# message number and bits of each ephemeris, by the interval field holding them
+EPHEMERIS_BITS = {
+    "gps_ephemeris_interval": (1019, 488),
+    "glonass_ephemeris_interval": (1020, 360),
+    "beidou_ephemeris_interval": (1042, 511),
+    "galileo_ephemeris_interval": (1046, 504),
+}
+STATION_MESSAGE = 1005
+STATION_BYTES = 19
+
+# what pyserial opens a port at when not told otherwise
+DEFAULT_BAUD = 9600
+# what the receiver's port goes up to, slowest first
+FAST_BAUD_RATES = (460800, 921600)
+# how long the receiver gets to answer on the new rate, and how often
+VERIFY_TIMEOUT = 0.25
+VERIFY_ATTEMPTS = 3
+
+MONITOR_INTERVAL = 1.0
+# seconds of data left waiting in the port, or the loop running late, before
+# it's worth a warning
+MAX_READ_LAG = 0.25
+MAX_LOOP_LAG = 0.1
+# samples in a row the message queue has to grow for
+QUEUE_GROWTH_SAMPLES = 3
+# more than a partial frame left unparsed means the parser is falling behind
+MAX_UNPARSED = MAX_PAYLOAD_LENGTH + PACKET_OVERHEAD
+
+
+def _enabled(value):
+    return value == EnableSetting.enable
+
+
+def _array_bytes(size, count):
+    fixed, each = size
+    return fixed + each * count + PACKET_OVERHEAD
+
+
+def measurement_load(
+    output, satellites=DEFAULT_SATELLITES, signals=None, measured=None
+):
+    """
+    Bytes a second a ConfigureBinaryMeasurmentDataOutput setting sends. Each
+    message is the size in measured, NavSparkRawProtocol.frame_sizes, once
+    one has been seen and estimated for satellites and signals until then.
+    """
+    if signals is None:
+        signals = satellites * SIGNALS_PER_SATELLITE
+    if measured is None:
+        measured = {}
+
+    estimates = {
+        "measure_time": MEASUREMENT_TIME_BYTES + PACKET_OVERHEAD,
+        "raw_measurement": _array_bytes(RAW_MEASUREMENT_BYTES, satellites),
+        "save_channel_status": _array_bytes(CHANNEL_STATUS_BYTES, satellites),
+        "receive_state_enabled": RECEIVER_STATE_BYTES + PACKET_OVERHEAD,
+        "extended_raw_measurement_enabled": _array_bytes(EXTENDED_RAW_BYTES, signals),
+    }
+    per_epoch = 0
+    for field, estimate in estimates.items():
+        if _enabled(getattr(output, field)):
+            per_epoch += measured.get(MEASUREMENT_IDS[field], estimate)
+
+    load = per_epoch * BINARY_RATE_HZ[output.output_rate]
+    for flag, (size, period) in SUBFRAME_BYTES.items():
+        if output.subframe_enabled & flag:
+            load += SATELLITES_PER_SYSTEM * (size + PACKET_OVERHEAD) / period
+    return load
+
+
+def msm_bytes(msm, satellites, signals):
+    """Length of one MSM message on the wire, cells for every signal"""
+    satellite_bits = sum(MSM7_SATELLITES if msm == 7 else MSM4_SATELLITES)
+    cell_bits = sum(w for w, _ in (MSM7_CELLS if msm == 7 else MSM4_CELLS))
+    cells = satellites * signals
+    bits = (
+        MSM_HEADER_BITS
+        + MSM_MASK_BITS
+        + cells
+        + satellites * satellite_bits
+        + cells * cell_bits
+    )
+    return math.ceil(bits / 8) + RTCM_OVERHEAD
+
+
+def rtcm_load(
+    output,
+    satellites=SATELLITES_PER_SYSTEM,
+    signals=SIGNALS_PER_SATELLITE,
+    measured=None,
+):
+    """
+    Bytes a second a BinaryRTCMDataOutput setting sends, satellites per
+    system. Messages are sized like measurement_load does.
+    """
+    if not _enabled(output.rtcm_output):
+        return 0.0
+    if measured is None:
+        measured = {}
+
+    msm = 4 if output.rtcm_type == RTCMType.MSM4 else 7
+    estimate = msm_bytes(msm, satellites, signals)
+    load = sum(
+        measured.get(MSM_NUMBERS[s] + msm - 1, estimate)
+        for s in MSM_FIELDS
+        if _enabled(getattr(output, f"{s}_msm7"))
+    )
+    if _enabled(output.stationary_rtk):
+        load += measured.get(STATION_MESSAGE, STATION_BYTES + RTCM_OVERHEAD)
+    load *= BINARY_RATE_HZ[output.output_rate]
+
+    for field, (number, bits) in EPHEMERIS_BITS.items():
+        interval = getattr(output, field)
+        if interval:
+            size = measured.get(number, math.ceil(bits / 8) + RTCM_OVERHEAD)
+            load += satellites * size / interval
+    return load
+
+
+def link_load(
+    measurement_output=None,
+    rtcm_output=None,
+    satellites=DEFAULT_SATELLITES,
+    measured=None,
+):
+    """
+    Bytes a second all of the enabled binary output needs with satellites
+    tracked, spread over the systems like the default sky
+    """
+    load = 0.0
+    if measurement_output is not None:
+        load += measurement_load(measurement_output, satellites, measured=measured)
+    if rtcm_output is not None:
+        per_system = math.ceil(satellites * SATELLITES_PER_SYSTEM / DEFAULT_SATELLITES)
+        load += rtcm_load(rtcm_output, per_system, measured=measured)
+    return load
+
+
+def required_baud(load, baud_rates=FAST_BAUD_RATES):
+    """The slowest of baud_rates that carries load, the fastest if none do"""
+    for baud in sorted(baud_rates):
+        if load <= link_capacity(baud):
+            return baud
+    return max(baud_rates)
+
+
+async def _verify(protocol, timeout):
+    for _ in range(VERIFY_ATTEMPTS):
+        try:
+            if await protocol.send_command(QueryPositionUpdateRate(), timeout):
+                return True
+        except asyncio.TimeoutError:
+            pass
+    return False
+
+
+async def change_baud(connection, baud, timeout=VERIFY_TIMEOUT):
+    """
+    Move both ends of connection, a SerialConnection, to baud. The receiver
+    ACKs at the old rate and switches, then a query has to be answered at the
+    new one. Without an answer both ends go back to the old rate. True if the
+    link is at baud afterwards.
+    """
+    protocol = connection.protocol
+    old = connection.settings.get("baudrate", DEFAULT_BAUD)
+    if old == baud:
+        return True
+
+    try:
+        acked = await protocol.send_command(
+            ConfigureSerialPort(baud_rate=BaudRate.from_rate(baud))
+        )
+    except asyncio.TimeoutError:
+        acked = False
+    if not acked:
+        return False
+
+    connection.set_baudrate(baud)
+    if await _verify(protocol, timeout):
+        return True
+
+    # roll back, the receiver may well have switched even if it can't be heard
+    try:
+        await protocol.send_command(
+            ConfigureSerialPort(baud_rate=BaudRate.from_rate(old)), timeout
+        )
+    except asyncio.TimeoutError:
+        pass
+    connection.set_baudrate(old)
+    await _verify(protocol, timeout)
+    return False
+
+
+async def negotiate_baud(
+    connection, measurement_output=None, rtcm_output=None, baud_rates=FAST_BAUD_RATES
+):
+    """
+    Raise the link to the slowest of baud_rates that carries the enabled
+    output, if it's running slower than that. Returns the baud rate in use.
+    """
+    load = link_load(
+        measurement_output, rtcm_output, measured=connection.protocol.frame_sizes
+    )
+    current = connection.settings.get("baudrate", DEFAULT_BAUD)
+    if load <= link_capacity(current):
+        return current
+
+    await change_baud(connection, required_baud(load, baud_rates))
+    return connection.settings.get("baudrate", DEFAULT_BAUD)
+
+
+def link_capacity(baud):
+    """Bytes a second baud carries, leaving MAX_UTILIZATION of headroom"""
+    return baud * MAX_UTILIZATION / BITS_PER_BYTE
+
+
+def capacity_warnings(baud, measurement_output=None, rtcm_output=None, measured=None):
+    """
+    Why the enabled output won't fit at baud, empty when it does. measured is
+    NavSparkRawProtocol.frame_sizes, the sizes of the messages actually sent.
+    """
+    load = link_load(measurement_output, rtcm_output, measured=measured)
+    capacity = link_capacity(baud)
+    if load <= capacity:
+        return []
+
+    warnings = [
+        f"enabled output needs about {load:.0f} B/s, "
+        f"{baud} baud carries {capacity:.0f} B/s"
+    ]
+    if measurement_output is not None:
+        fitted = fit_output(baud, measurement_output, rtcm_output, measured)
+        if fitted is None:
+            warnings.append("no output rate fits, raise the baud rate")
+        else:
+            hz = BINARY_RATE_HZ[fitted.output_rate]
+            dropped = (
+                measurement_output.subframe_enabled and not fitted.subframe_enabled
+            )
+            subframes = " without subframes" if dropped else ""
+            warnings.append(f"{hz} Hz{subframes} fits")
+    return warnings
+
+
+def fit_output(baud, measurement_output, rtcm_output=None, measured=None):
+    """
+    measurement_output changed just enough to fit at baud. Subframes go
+    first, then the rate steps down. None if even 1 Hz doesn't fit.
+    """
+    capacity = link_capacity(baud)
+    output = measurement_output
+    if link_load(output, rtcm_output, measured=measured) <= capacity:
+        return output
+
+    if output.subframe_enabled:
+        output = attr.evolve(output, subframe_enabled=SubframeEnabledFlag(0))
+    hz = BINARY_RATE_HZ[output.output_rate]
+    rates = sorted(
+        (r for r, h in BINARY_RATE_HZ.items() if h <= hz),
+        key=BINARY_RATE_HZ.get,
+        reverse=True,
+    )
+    for rate in rates:
+        output = attr.evolve(output, output_rate=rate)
+        if link_load(output, rtcm_output, measured=measured) <= capacity:
+            return output
+    return None
+
+
+async def tune_output(connection, measurement_output, rtcm_output=None):
+    """
+    Send the receiver measurement_output fitted to the link's baud rate, and
+    the message sizes seen on it. Returns the setting sent, or None if it
+    already fit or nothing would.
+    """
+    baud = connection.settings.get("baudrate", DEFAULT_BAUD)
+    fitted = fit_output(
+        baud, measurement_output, rtcm_output, connection.protocol.frame_sizes
+    )
+    if fitted is None or fitted == measurement_output:
+        return None
+    if not await connection.protocol.send_command(fitted):
+        return None
+    return fitted
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class LinkStatus:
+    baud: int
+    bytes_per_second: float
+    utilization: float
+    # seconds of data the OS is holding that hasn't been read, None if unknown
+    read_lag: float
+    # how late the monitor's own timer ran, the loop is too busy to read
+    loop_lag: float
+    queue_size: int
+    unparsed: int
+    # bytes a second of every frame type, keyed like frame_bytes
+    frame_rates: dict
+    warnings: tuple
+
+
+@attr.s(auto_attribs=True, eq=False)
+class LinkMonitor:
+    """
+    Samples a SerialConnection every interval: throughput against the baud
+    rate, data waiting in the port, event loop lag and the message queue and
+    parse buffer. Anything that points to falling behind is a warning.
+    """
+
+    connection: object
+    interval: float = MONITOR_INTERVAL
+    # called with every LinkStatus
+    on_status: object = attr.ib(default=None, repr=False)
+    status: LinkStatus = None
+    _last: tuple = attr.ib(default=None, repr=False)
+    _growth: int = 0
+    _task: asyncio.Task = attr.ib(default=None, repr=False)
+
+    def _in_waiting(self):
+        transport = self.connection.transport
+        if transport is None:
+            return None
+        try:
+            return transport.serial.in_waiting
+        except (AttributeError, OSError, serial.SerialException):
+            return None
+
+    def sample(self, now, loop_lag=0.0):
+        protocol = self.connection.protocol
+        frame_bytes = Counter(protocol.frame_bytes)
+        queue_size = protocol.message_queue.qsize()
+        last = self._last
+        self._last = (now, protocol.bytes_received, frame_bytes, queue_size)
+        if last is None or now <= last[0]:
+            return None
+
+        last_time, last_received, last_frames, last_queue = last
+        dt = now - last_time
+        baud = self.connection.settings.get("baudrate", DEFAULT_BAUD)
+        rate = (protocol.bytes_received - last_received) / dt
+        utilization = rate * BITS_PER_BYTE / baud
+        frame_rates = {
+            k: (v - last_frames[k]) / dt
+            for k, v in frame_bytes.items()
+            if v != last_frames[k]
+        }
+        waiting = self._in_waiting()
+        read_lag = None if waiting is None else waiting * BITS_PER_BYTE / baud
+        unparsed = len(protocol.buffer)
+        self._growth = self._growth + 1 if queue_size > last_queue else 0
+
+        warnings = []
+        if utilization > MAX_UTILIZATION:
+            warnings.append(f"link at {utilization:.0%} of {baud} baud")
+        if read_lag is not None and read_lag > MAX_READ_LAG:
+            warnings.append(f"reading {read_lag:.2f} s behind the port")
+        if loop_lag > MAX_LOOP_LAG:
+            warnings.append(f"event loop running {loop_lag:.2f} s late")
+        if self._growth >= QUEUE_GROWTH_SAMPLES:
+            warnings.append(f"message queue growing, {queue_size} waiting")
+        if unparsed > MAX_UNPARSED:
+            warnings.append(f"{unparsed} bytes waiting to be parsed")
+
+        self.status = LinkStatus(
+            baud,
+            rate,
+            utilization,
+            read_lag,
+            loop_lag,
+            queue_size,
+            unparsed,
+            frame_rates,
+            tuple(warnings),
+        )
+        if self.on_status is not None:
+            self.on_status(self.status)
+        return self.status
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.sample(loop.time())
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            self.sample(now, max(now - start - self.interval, 0.0))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
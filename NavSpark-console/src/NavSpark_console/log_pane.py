@@ -0,0 +1,362 @@
+import re
+from bisect import bisect_left
+from collections import deque
+
+import attr
+from prompt_toolkit.application import get_app_or_none
+from prompt_toolkit.buffer import Buffer
+from prompt_toolkit.data_structures import Point
+from prompt_toolkit.filters import Condition
+from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.layout.containers import ConditionalContainer, HSplit, Window
+from prompt_toolkit.layout.controls import BufferControl, UIContent, UIControl
+from prompt_toolkit.layout.dimension import LayoutDimension
+from prompt_toolkit.layout.margins import ScrollbarMargin
+from prompt_toolkit.layout.processors import BeforeInput
+from prompt_toolkit.mouse_events import MouseEventType
+
+DEFAULT_CAPACITY = 10000
+
+# words that start with a letter, message and field names rather than values
+TOKEN = re.compile(r"[a-z_]\w*")
+WORD_QUERY = re.compile(r"[a-z_]+")
+
+
+@attr.s(auto_attribs=True)
+class LineRing:
+    """
+    The last capacity lines, numbered from the first line ever appended. Every
+    word starting with a letter is indexed, so searching for message, field or
+    enum names only looks at the lines that hold them.
+    """
+
+    capacity: int = DEFAULT_CAPACITY
+    total: int = 0
+
+    def __attrs_post_init__(self):
+        self._lines = [None] * self.capacity
+        # lower case word to the numbers of the lines holding it, oldest first
+        self._index = {}
+
+    @property
+    def first(self):
+        return max(self.total - self.capacity, 0)
+
+    def __len__(self):
+        return self.total - self.first
+
+    def __getitem__(self, number):
+        if not self.first <= number < self.total:
+            raise IndexError(number)
+        return self._lines[number % self.capacity]
+
+    def append(self, line):
+        slot = self.total % self.capacity
+        evicted = self._lines[slot]
+        if evicted is not None:
+            for token in set(TOKEN.findall(evicted.lower())):
+                postings = self._index[token]
+                postings.popleft()
+                if not postings:
+                    del self._index[token]
+
+        self._lines[slot] = line
+        for token in set(TOKEN.findall(line.lower())):
+            postings = self._index.get(token)
+            if postings is None:
+                postings = self._index[token] = deque()
+            postings.append(self.total)
+        self.total += 1
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def search(self, text, start, backwards=False):
+        """
+        The number of the first line from start on holding text, ignoring case,
+        or the last one before start when going backwards. None without one.
+        """
+        text = text.lower()
+        if not text:
+            return None
+
+        if WORD_QUERY.fullmatch(text):
+            # every match is inside an indexed word that contains text
+            found = None
+            for token, postings in self._index.items():
+                if text not in token:
+                    continue
+                i = bisect_left(postings, start)
+                if backwards and i > 0:
+                    number = postings[i - 1]
+                    found = number if found is None else max(found, number)
+                elif not backwards and i < len(postings):
+                    number = postings[i]
+                    found = number if found is None else min(found, number)
+            return found
+
+        numbers = (
+            range(min(start, self.total) - 1, self.first - 1, -1)
+            if backwards
+            else range(max(start, self.first), self.total)
+        )
+        for number in numbers:
+            if text in self[number].lower():
+                return number
+        return None
+
+
+class LogControl(UIControl):
+    """
+    Shows a LogPane's ring. Only the lines in view are ever formatted, the
+    rest of the ring is left to the window's scrolling.
+    """
+
+    def __init__(self, pane):
+        self.pane = pane
+        # the selected line number, None to follow new lines
+        self.line = None
+        self._bindings = self._key_bindings()
+        # reused until the pane changes, it keeps the heights of drawn lines
+        self._content = None
+        self._version = None
+
+    def is_focusable(self):
+        return True
+
+    def _selected(self):
+        ring = self.pane.ring
+        if self.line is None or ring.total == 0:
+            return ring.total - 1
+        return max(self.line, ring.first)
+
+    def select(self, number):
+        ring = self.pane.ring
+        self.line = None if number >= ring.total - 1 else max(number, ring.first)
+        self.pane.changed()
+
+    def create_content(self, width, height):
+        if self._content is not None and self._version == self.pane.version:
+            return self._content
+
+        self.pane.flush()
+        ring = self.pane.ring
+        first = ring.first
+        selected = self._selected()
+        query = self.pane.search_text.lower()
+
+        def get_line(i):
+            number = first + i
+            line = ring[number]
+            style = ""
+            if number == selected and self.line is not None:
+                style = "class:log.selected"
+            fragments = [("class:log.line-number", f"{number + 1:>8} ")]
+            if not query:
+                fragments.append((style, line))
+                return fragments
+
+            lower = line.lower()
+            pos = 0
+            while True:
+                match = lower.find(query, pos)
+                if match == -1:
+                    break
+                fragments.append((style, line[pos:match]))
+                fragments.append(
+                    ("class:log.search-match", line[match : match + len(query)])
+                )
+                pos = match + len(query)
+            fragments.append((style, line[pos:]))
+            return fragments
+
+        self._version = self.pane.version
+        self._content = UIContent(
+            get_line=get_line,
+            line_count=len(ring),
+            cursor_position=Point(0, max(selected - first, 0)),
+            show_cursor=False,
+        )
+        return self._content
+
+    def move_cursor_down(self):
+        self.select(self._selected() + 1)
+
+    def move_cursor_up(self):
+        self.select(self._selected() - 1)
+
+    def mouse_handler(self, mouse_event):
+        if mouse_event.event_type == MouseEventType.SCROLL_UP:
+            self.select(self._selected() - 3)
+        elif mouse_event.event_type == MouseEventType.SCROLL_DOWN:
+            self.select(self._selected() + 3)
+        else:
+            return NotImplemented
+        return None
+
+    def get_key_bindings(self):
+        return self._bindings
+
+    def _key_bindings(self):
+        bindings = KeyBindings()
+
+        def page(event):
+            info = event.app.layout.current_window.render_info
+            return info.window_height if info else 10
+
+        @bindings.add("up")
+        def _(event):
+            self.move_cursor_up()
+
+        @bindings.add("down")
+        def _(event):
+            self.move_cursor_down()
+
+        @bindings.add("pageup")
+        def _(event):
+            self.select(self._selected() - page(event))
+
+        @bindings.add("pagedown")
+        def _(event):
+            self.select(self._selected() + page(event))
+
+        @bindings.add("home")
+        def _(event):
+            self.select(self.pane.ring.first)
+
+        @bindings.add("end")
+        def _(event):
+            "Follow new lines again."
+            self.line = None
+            self.pane.changed()
+
+        @bindings.add("/")
+        def _(event):
+            self.pane.start_search()
+
+        @bindings.add("n")
+        def _(event):
+            self.pane.find_next()
+
+        @bindings.add("N")
+        def _(event):
+            self.pane.find_next(backwards=True)
+
+        return bindings
+
+
+@attr.s(auto_attribs=True, eq=False)
+class LogPane:
+    """
+    A bounded, scrolling log of messages. Appends are queued and formatted in
+    one batch when the pane is next drawn, and only the newest capacity of
+    them are ever formatted.
+    """
+
+    capacity: int = DEFAULT_CAPACITY
+    formatter: object = str
+    search_text: str = ""
+    searching: bool = False
+    # a RedrawScheduler, without one every change invalidates the application
+    scheduler: object = attr.ib(default=None, repr=False)
+    # bumped on every change, the control redraws only when it moves
+    version: int = 0
+
+    def __attrs_post_init__(self):
+        self.ring = LineRing(self.capacity)
+        self._pending = deque(maxlen=self.capacity)
+
+        self.control = LogControl(self)
+        self.window = Window(
+            content=self.control,
+            wrap_lines=False,
+            right_margins=[ScrollbarMargin(display_arrows=True)],
+        )
+
+        self.search_buffer = Buffer(multiline=False, accept_handler=self._accept)
+        search_bindings = KeyBindings()
+
+        @search_bindings.add("escape", eager=True)
+        def _(event):
+            self._stop_search()
+
+        self.search_window = Window(
+            BufferControl(
+                self.search_buffer,
+                input_processors=[BeforeInput("/")],
+                key_bindings=search_bindings,
+            ),
+            height=LayoutDimension.exact(1),
+        )
+        self.container = HSplit(
+            [
+                self.window,
+                ConditionalContainer(
+                    self.search_window, filter=Condition(lambda: self.searching)
+                ),
+            ]
+        )
+
+    def __pt_container__(self):
+        return self.container
+
+    def changed(self):
+        self.version += 1
+        if self.scheduler is not None:
+            self.scheduler.mark_dirty(self)
+            return
+        app = get_app_or_none()
+        if app is not None:
+            app.invalidate()
+
+    def append(self, msg):
+        self._pending.append(msg)
+        self.changed()
+
+    def flush(self):
+        """Format everything appended since the last flush into the ring"""
+        pending = self._pending
+        while pending:
+            for line in self.formatter(pending.popleft()).splitlines():
+                self.ring.append(line)
+
+    async def follow(self, queue):
+        """Append everything put on queue, NavSparkRawProtocol.message_queue say"""
+        while True:
+            self.append(await queue.get())
+            while not queue.empty():
+                self.append(queue.get_nowait())
+
+    def start_search(self):
+        self.searching = True
+        app = get_app_or_none()
+        if app is not None:
+            app.layout.focus(self.search_window)
+
+    def _stop_search(self):
+        self.searching = False
+        app = get_app_or_none()
+        if app is not None:
+            app.layout.focus(self.window)
+
+    def _accept(self, buffer):
+        self.search_text = buffer.text
+        self.changed()
+        self._stop_search()
+        self.find_next()
+        return False
+
+    def find_next(self, backwards=False):
+        """Select the next line holding search_text, wrapping around the ring"""
+        self.flush()
+        selected = self.control._selected()
+        start = selected if backwards else selected + 1
+        found = self.ring.search(self.search_text, start, backwards)
+        if found is None:
+            # wrap around
+            start = self.ring.total if backwards else self.ring.first
+            found = self.ring.search(self.search_text, start, backwards)
+        if found is not None:
+            self.control.select(found)
+        return found
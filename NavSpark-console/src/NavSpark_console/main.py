@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 from enum import Enum
 
@@ -10,6 +11,7 @@ from toolz.itertoolz import nth
 from prompt_toolkit.application import Application, get_app_or_none
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.layout.containers import (
+    DynamicContainer,
     VSplit,
     HSplit,
     Window,
@@ -21,28 +23,34 @@ from prompt_toolkit.layout.dimension import LayoutDimension, D
 from prompt_toolkit.layout.layout import Layout
 from prompt_toolkit.styles import Style
 from prompt_toolkit.widgets import (
-    SearchToolbar,
-    TextArea,
     Button,
     Dialog,
     Label,
     RadioList,
 )
 
-from NavSpark_console.protocol import NavSparkRawProtocol
+from NavSpark_console.autobaud import detect_baud
+from NavSpark_console.dashboard import SKY_PLOT_RADIUS
+from NavSpark_console.log_pane import LogPane
+from NavSpark_console.offload import FrameDecoder
+from NavSpark_console.receivers import Receiver, Receivers, tagged
+from NavSpark_console.render import RedrawScheduler
 
 
 class baud_settings(Enum):
+    auto = None
+    b921600 = 921600
+    b460800 = 460800
+    b230400 = 230400
     b115200 = 115200
     b57600 = 57600
-    b8400 = 8400
-    b9200 = 9200
-    b600 = 600
-    b800 = 800
-    b400 = 400
+    b38400 = 38400
+    b19200 = 19200
+    b9600 = 9600
+    b4800 = 4800
 
     def __str__(self):
-        return f"{self.value}"
+        return "auto" if self.value is None else f"{self.value}"
 
 
 class byte_size_settings(Enum):
@@ -145,27 +153,81 @@ class SelectComPortDialog:
         return self.dialog
 
 
-async def console_app(loop):
+def serial_settings(result):
+    """The port and serial.Serial arguments from a SelectComPortDialog result"""
+    settings = {k: v.value for k, v in result.items() if k != "port"}
+    return result["port"].device, settings
+
+
+async def console_app(loop, fps=10, decode_workers=0, reader_thread=False):
+    scheduler = RedrawScheduler(fps=fps)
+    receivers = Receivers()
+    decoder = None
+    if decode_workers:
+        decoder = FrameDecoder(workers=decode_workers)
+        decoder.start()
+
+    def connection_text():
+        receiver = receivers.current
+        if receiver is None:
+            return "  Ctrl-O to open a port"
+        connection = receiver.connection
+        text = f"  {receiver.name}"
+        if len(receivers) > 1:
+            text += f" ({list(receivers.receivers).index(receiver.name) + 1}"
+            text += f"/{len(receivers)})"
+        if not connection.connected:
+            return f"{text} reconnecting ({connection.attempts})"
+        text += f" {receiver.protocol.bytes_received} bytes"
+        status = receiver.monitor.status
+        if status is not None:
+            text += f" {status.utilization:.0%} of link"
+        if receiver.recorder is not None:
+            text += " recording"
+        if decoder is not None and decoder.backlog:
+            text += f" {decoder.backlog} frames decoding"
+        return text
+
     def get_statusbar_text():
-        return [
+        text = [
             ("class:status", "Press "),
             ("class:status.key", "Ctrl-C"),
             ("class:status", " to exit, "),
             ("class:status.key", "/"),
             ("class:status", " to search"),
         ]
+        if len(receivers) > 1:
+            text += [
+                ("class:status", ", "),
+                ("class:status.key", "F2"),
+                ("class:status", " to switch, "),
+                ("class:status.key", "F3"),
+                ("class:status", " to compare"),
+            ]
+        return text + [
+            (
+                "class:status.position",
+                f"  {1 / scheduler.interval:.0f} fps"
+                f" {scheduler.render_time * 1000:.1f} ms",
+            ),
+            ("class:status", connection_text()),
+        ]
 
-    search_field = SearchToolbar(
-        text_if_not_searching=[("class:not-searching", "Press '/' to start searching.")]
-    )
+    def dashboard():
+        if receivers.compare and len(receivers) > 1:
+            return VSplit(
+                [r.column for r in receivers],
+                height=LayoutDimension.exact(2 * SKY_PLOT_RADIUS + 2),
+            )
+        receiver = receivers.current
+        if receiver is None:
+            return Window()
+        return VSplit(
+            [receiver.table, receiver.sky_plot],
+            height=LayoutDimension.exact(2 * SKY_PLOT_RADIUS + 1),
+        )
 
-    text_area = TextArea(
-        text="hi",
-        read_only=True,
-        scrollbar=True,
-        line_numbers=True,
-        search_field=search_field,
-    )
+    log_pane = LogPane(formatter=tagged, scheduler=scheduler)
 
     root_container = FloatContainer(
         content=HSplit(
@@ -175,8 +237,8 @@ async def console_app(loop):
                     height=LayoutDimension.exact(1),
                     style="class:status",
                 ),
-                text_area,
-                search_field,
+                DynamicContainer(dashboard),
+                log_pane,
             ]
         ),
         floats=[],
@@ -198,7 +260,38 @@ async def console_app(loop):
                 root_container.floats.remove(float_)
             return result
 
-        asyncio.create_task(dlg())
+        return asyncio.create_task(dlg())
+
+    async def open_port(app):
+        result = await show_dialog(app, SelectComPortDialog())
+        if result == "cancel":
+            return
+
+        port, settings = serial_settings(result)
+        for receiver in receivers:
+            if receiver.port == port:
+                await receivers.remove(receiver.name)
+                break
+        if settings["baudrate"] is None:
+            del settings["baudrate"]
+            detected = await detect_baud(port, **settings)
+            if detected is None:
+                log_pane.append(f"no receiver found on {port}")
+                return
+            settings = detected
+            log_pane.append(f"{port} detected at {settings['baudrate']} baud")
+        receivers.add(
+            Receiver(
+                receivers.name_for(port),
+                port,
+                settings,
+                scheduler=scheduler,
+                log=log_pane.append,
+                decoder=decoder,
+                reader_thread=reader_thread,
+            )
+        )
+        app.invalidate()
 
     @bindings.add("c-c")
     def _(event):
@@ -208,7 +301,34 @@ async def console_app(loop):
     @bindings.add("c-o")
     def _(event):
         "open a port"
-        v = show_dialog(event.app, SelectComPortDialog())
+        asyncio.create_task(open_port(event.app))
+
+    @bindings.add("f2")
+    def _(event):
+        "show the next receiver"
+        receivers.switch()
+
+    @bindings.add("f3")
+    def _(event):
+        "compare the receivers side by side"
+        receivers.compare = not receivers.compare
+
+    @bindings.add("tab")
+    def _(event):
+        "move between the log and the satellite tables, to scroll them"
+        event.app.layout.focus_next()
+
+    @bindings.add("c-r")
+    def _(event):
+        "start or stop recording the receiver shown"
+        receiver = receivers.current
+        if receiver is None:
+            return
+        if receiver.recorder is None:
+            log_pane.append(f"{receiver.name} recording to {receiver.record()}")
+        else:
+            receiver.stop_recording()
+            log_pane.append(f"{receiver.name} recording stopped")
 
     style = Style.from_dict(
         {
@@ -216,19 +336,34 @@ async def console_app(loop):
             "status.position": "#aaaa00",
             "status.key": "#ffaa00",
             "not-searching": "#888888",
+            "log.line-number": "#888888",
+            "log.selected": "reverse",
+            "log.search-match": "bg:#ffaa00 #000000",
+            "satellite.header": "bold",
+            "satellite.in-fix": "#00aa00",
+            "satellite.position": "#888888",
+            "sky.grid": "#888888",
+            "sky.satellite": "#aaaa00",
+            "sky.in-fix": "#00aa00 bold",
+            "receiver.name": "bold",
         }
     )
 
     application = Application(
-        layout=Layout(root_container, focused_element=text_area),
+        layout=Layout(root_container, focused_element=log_pane.window),
         key_bindings=bindings,
         enable_page_navigation_bindings=True,
         mouse_support=True,
         style=style,
         full_screen=True,
     )
+    scheduler.attach(application)
 
     result = await application.run_async(set_exception_handler=False)
+    await receivers.close()
+    if decoder is not None:
+        await decoder.close()
+    scheduler.stop()
     loop.stop()
 
 
@@ -249,12 +384,28 @@ def loop_exception_handler(loop, context):
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--decode-workers",
+        type=int,
+        default=0,
+        help="decode in this many processes, for several receivers at high rates",
+    )
+    parser.add_argument(
+        "--reader-thread",
+        action="store_true",
+        help="read the ports in threads, the event loop wakes less often",
+    )
+    args = parser.parse_args()
+
     loop = asyncio.get_event_loop()
     # loop.set_exception_handler(loop_exception_handler)
 
-    # coro = serial_asyncio.create_serial_connection(loop, NavSparkRawProtocol, "loop://")
-    # transport,protocol = loop.run_until_complete(coro)
-    app = loop.run_until_complete(console_app(loop))
+    app = loop.run_until_complete(
+        console_app(
+            loop, decode_workers=args.decode_workers, reader_thread=args.reader_thread
+        )
+    )
 
     loop.run_forever()
     loop.close()
@@ -0,0 +1,247 @@
+import datetime
+from functools import reduce
+from operator import xor
+
+import attr
+
+# $, at most 79 characters, *hh and CR LF, some receivers go a little over
+MAX_SENTENCE_LENGTH = 100
+# trailing empty fields are often left off, pad up to this many
+MIN_FIELDS = 20
+
+
+def nmea_checksum(body):
+    return reduce(xor, body, 0)
+
+
+def _float(field):
+    return float(field) if field else None
+
+
+def _int(field):
+    return int(field) if field else None
+
+
+def _time(field):
+    """hhmmss.ss to seconds of the UTC day"""
+    if not field:
+        return None
+    return int(field[0:2]) * 3600 + int(field[2:4]) * 60 + float(field[4:])
+
+
+def _angle(field, hemisphere, degree_digits):
+    """ddmm.mmmm or dddmm.mmmm to signed degrees"""
+    if not field:
+        return None
+    degrees = int(field[:degree_digits]) + float(field[degree_digits:]) / 60
+    return -degrees if hemisphere in (b"S", b"W") else degrees
+
+
+def _char(field):
+    return field.decode() if field else None
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class GGA:
+    """Fix data, times are seconds of the UTC day and angles degrees"""
+
+    talker: str
+    time: float
+    latitude: float
+    longitude: float
+    quality: int
+    satellites: int
+    hdop: float
+    altitude: float
+    geoid_separation: float
+    age: float
+    station_id: int
+    arrival_ns: int = attr.ib(default=None, repr=False, eq=False)
+    source: str = attr.ib(default=None, repr=False, eq=False)
+
+    @classmethod
+    def parse(cls, talker, f, **kwargs):
+        return cls(
+            talker,
+            _time(f[1]),
+            _angle(f[2], f[3], 2),
+            _angle(f[4], f[5], 3),
+            _int(f[6]),
+            _int(f[7]),
+            _float(f[8]),
+            _float(f[9]),
+            _float(f[11]),
+            _float(f[13]),
+            _int(f[14]),
+            **kwargs,
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class RMC:
+    """Recommended minimum data, speed in knots and course in degrees"""
+
+    talker: str
+    time: float
+    valid: bool
+    latitude: float
+    longitude: float
+    speed: float
+    course: float
+    date: datetime.date
+    magnetic_variation: float
+    mode: str
+    arrival_ns: int = attr.ib(default=None, repr=False, eq=False)
+    source: str = attr.ib(default=None, repr=False, eq=False)
+
+    @classmethod
+    def parse(cls, talker, f, **kwargs):
+        date = None
+        if f[9]:
+            day, month, year = int(f[9][0:2]), int(f[9][2:4]), int(f[9][4:6])
+            date = datetime.date(2000 + year, month, day)
+        variation = _float(f[10])
+        if variation is not None and f[11] == b"W":
+            variation = -variation
+        return cls(
+            talker,
+            _time(f[1]),
+            f[2] == b"A",
+            _angle(f[3], f[4], 2),
+            _angle(f[5], f[6], 3),
+            _float(f[7]),
+            _float(f[8]),
+            date,
+            variation,
+            _char(f[12]),
+            **kwargs,
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class GSA:
+    """DOP and the satellites used, fix_type is 1 none, 2 2D and 3 3D"""
+
+    talker: str
+    mode: str
+    fix_type: int
+    svids: tuple
+    pdop: float
+    hdop: float
+    vdop: float
+    arrival_ns: int = attr.ib(default=None, repr=False, eq=False)
+    source: str = attr.ib(default=None, repr=False, eq=False)
+
+    @classmethod
+    def parse(cls, talker, f, **kwargs):
+        return cls(
+            talker,
+            _char(f[1]),
+            _int(f[2]),
+            tuple(int(s) for s in f[3:15] if s),
+            _float(f[15]),
+            _float(f[16]),
+            _float(f[17]),
+            **kwargs,
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class GSVSatellite:
+    svid: int
+    elevation: int
+    azimuth: int
+    snr: int
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class GSV:
+    """One of a group of satellites in view sentences, up to four satellites each"""
+
+    talker: str
+    total_messages: int
+    message_number: int
+    satellites_in_view: int
+    satellites: tuple
+    arrival_ns: int = attr.ib(default=None, repr=False, eq=False)
+    source: str = attr.ib(default=None, repr=False, eq=False)
+
+    # not padded, the number of fields sent tells 4.10 sentences apart
+    min_fields = 0
+
+    @classmethod
+    def parse(cls, talker, f, **kwargs):
+        # NMEA 4.10 adds a signal ID after the satellites
+        end = len(f)
+        if (end - 4) % 4 == 1:
+            end -= 1
+        f = f + [b""] * 3
+        satellites = tuple(
+            GSVSatellite(int(f[i]), _int(f[i + 1]), _int(f[i + 2]), _int(f[i + 3]))
+            for i in range(4, end, 4)
+            if f[i]
+        )
+        return cls(talker, int(f[1]), int(f[2]), int(f[3]), satellites, **kwargs)
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class VTG:
+    """Course over ground in degrees and speed in knots and km/h"""
+
+    talker: str
+    course: float
+    magnetic_course: float
+    speed_knots: float
+    speed_kmh: float
+    mode: str
+    arrival_ns: int = attr.ib(default=None, repr=False, eq=False)
+    source: str = attr.ib(default=None, repr=False, eq=False)
+
+    @classmethod
+    def parse(cls, talker, f, **kwargs):
+        return cls(
+            talker,
+            _float(f[1]),
+            _float(f[3]),
+            _float(f[5]),
+            _float(f[7]),
+            _char(f[9]),
+            **kwargs,
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class NMEASentence:
+    """Any sentence there's no parser for, fields without the address"""
+
+    talker: str
+    sentence_type: str
+    fields: tuple
+    arrival_ns: int = attr.ib(default=None, repr=False, eq=False)
+    source: str = attr.ib(default=None, repr=False, eq=False)
+
+
+SENTENCES = {b"GGA": GGA, b"RMC": RMC, b"GSA": GSA, b"GSV": GSV, b"VTG": VTG}
+
+
+def parse_sentence(sentence, **kwargs):
+    """
+    Parse the body of a sentence, everything between the $ and the *. The
+    checksum has to have been checked already.
+    """
+    fields = sentence.split(b",")
+    address = fields[0]
+    talker = address[:-3].decode()
+    sentence_cls = SENTENCES.get(address[-3:])
+    if sentence_cls is None:
+        return NMEASentence(
+            talker,
+            address[-3:].decode(),
+            tuple(f.decode() for f in fields[1:]),
+            **kwargs,
+        )
+
+    min_fields = getattr(sentence_cls, "min_fields", MIN_FIELDS)
+    if len(fields) < min_fields:
+        fields.extend([b""] * (min_fields - len(fields)))
+    return sentence_cls.parse(talker, fields, **kwargs)
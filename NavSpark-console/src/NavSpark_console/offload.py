@@ -0,0 +1,294 @@
+import asyncio
+import multiprocessing
+import struct
+from collections import deque
+from itertools import count
+from multiprocessing.shared_memory import SharedMemory
+
+import attr
+
+from NavSpark_console.protocol import decode_frame
+
+# a few seconds of several receivers with raw measurements at 20 Hz
+RING_SIZE = 1 << 22
+# most bytes of frames handed to a worker at once
+MAX_BATCH = 1 << 16
+# the workers import only what decoding needs rather than the whole console
+START_METHOD = "spawn"
+# how long a worker gets to finish when the decoder is closed
+CLOSE_TIMEOUT = 1.0
+
+# kind, the source's index in the batch, payload length and arrival_ns
+FRAME_HEADER = struct.Struct("<BBIQ")
+
+
+def pack_frames(buffer, offset, frames):
+    """
+    Write frames, (kind, source index, payload, arrival_ns), one after another
+    into buffer from offset on. Returns where they end.
+    """
+    for kind, source, payload, arrival_ns in frames:
+        FRAME_HEADER.pack_into(buffer, offset, kind, source, len(payload), arrival_ns)
+        offset += FRAME_HEADER.size
+        buffer[offset : offset + len(payload)] = payload
+        offset += len(payload)
+    return offset
+
+
+def decode_frames(buffer, sources):
+    """Decode everything pack_frames wrote to buffer, None for any that fails"""
+    messages = []
+    pos = 0
+    while pos < len(buffer):
+        kind, source, length, arrival_ns = FRAME_HEADER.unpack_from(buffer, pos)
+        pos += FRAME_HEADER.size
+        payload = bytes(buffer[pos : pos + length])
+        pos += length
+        try:
+            messages.append(
+                decode_frame(
+                    kind, payload, arrival_ns=arrival_ns, source=sources[source]
+                )
+            )
+        except Exception as ex:
+            print(ex)
+            messages.append(None)
+    return messages
+
+
+def _decode_worker(name, pipe):
+    ring = SharedMemory(name)
+    try:
+        while True:
+            job = pipe.recv()
+            if job is None:
+                break
+            seq, start, end, sources = job
+            with ring.buf[start:end] as buffer:
+                messages = decode_frames(buffer, sources)
+            pipe.send((seq, messages))
+    finally:
+        ring.close()
+
+
+@attr.s(auto_attribs=True, eq=False)
+class FrameRing:
+    """
+    Shared memory the decoders read batches of frames from. Space is handed
+    out in order and given back oldest first, as batches are decoded.
+    """
+
+    size: int = RING_SIZE
+
+    def __attrs_post_init__(self):
+        self.shm = SharedMemory(create=True, size=self.size)
+        # (start, end) of every batch not yet decoded, oldest first
+        self._used = deque()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def buf(self):
+        return self.shm.buf
+
+    def reserve(self, length):
+        """The start of length free bytes, or None if there isn't room yet"""
+        if length > self.size:
+            raise ValueError(f"{length} bytes won't fit in a {self.size} byte ring")
+        if not self._used:
+            start = 0
+        else:
+            tail = self._used[0][0]
+            newest, head = self._used[-1]
+            if newest >= tail and head + length <= self.size:
+                start = head
+            elif newest >= tail and length <= tail:
+                start = 0
+            elif newest < tail and head + length <= tail:
+                start = head
+            else:
+                return None
+        self._used.append((start, start + length))
+        return start
+
+    def release(self):
+        """Give back the oldest batch's space"""
+        self._used.popleft()
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+@attr.s(auto_attribs=True, eq=False)
+class DecoderWorker:
+    process: multiprocessing.Process
+    pipe: object
+    # batches sent it and not yet answered
+    outstanding: int = 0
+
+
+@attr.s(auto_attribs=True, eq=False)
+class FrameDecoder:
+    """
+    Decodes frames for any number of NavSparkRawProtocols in worker processes.
+    The protocols still find and check frames in the event loop and submit
+    them here. Frames are batched until the loop gets round to flush, copied
+    into a FrameRing, and the least busy worker is sent where they are. The
+    messages come back pickled and go on their protocol's message_queue in
+    the order the frames were read, as if decoded there.
+    """
+
+    workers: int = 1
+    ring_size: int = RING_SIZE
+    max_batch: int = MAX_BATCH
+    # frames and batches decoded so far
+    frames: int = 0
+    batches: int = 0
+    ring: FrameRing = attr.ib(default=None, repr=False)
+    # (protocol, kind, payload, arrival_ns) of frames not yet in the ring
+    _waiting: deque = attr.ib(factory=deque, repr=False)
+    # (seq, protocols, worker, start, end, sources) of batches in the ring
+    _in_flight: deque = attr.ib(factory=deque, repr=False)
+    _results: dict = attr.ib(factory=dict, repr=False)
+    _pool: list = attr.ib(factory=list, repr=False)
+    _seq: object = attr.ib(factory=count, repr=False)
+    _flush_handle: asyncio.Handle = attr.ib(default=None, repr=False)
+
+    @property
+    def backlog(self):
+        """Frames submitted but not yet on a message queue"""
+        return len(self._waiting) + sum(len(b[1]) for b in self._in_flight)
+
+    def start(self):
+        context = multiprocessing.get_context(START_METHOD)
+        self.ring = FrameRing(self.ring_size)
+        loop = asyncio.get_running_loop()
+        for _ in range(self.workers):
+            pipe, child = context.Pipe()
+            process = context.Process(
+                target=_decode_worker, args=(self.ring.name, child), daemon=True
+            )
+            process.start()
+            child.close()
+            worker = DecoderWorker(process, pipe)
+            loop.add_reader(pipe.fileno(), self._receive, worker)
+            self._pool.append(worker)
+
+    def submit(self, protocol, kind, payload, arrival_ns):
+        self._waiting.append((protocol, kind, payload, arrival_ns))
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        # once for everything read in this pass of the event loop
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self):
+        """Send the waiting frames to the workers, as far as the ring has room"""
+        self._flush_handle = None
+        while self._waiting:
+            frames = []
+            size = 0
+            for frame in self._waiting:
+                length = FRAME_HEADER.size + len(frame[2])
+                if frames and size + length > self.max_batch:
+                    break
+                frames.append(frame)
+                size += length
+
+            start = self.ring.reserve(size)
+            if start is None:
+                # carried on with as batches come back
+                return
+            for _ in frames:
+                self._waiting.popleft()
+
+            sources = {}
+            packed = []
+            for protocol, kind, payload, arrival_ns in frames:
+                source = sources.setdefault(protocol.source, len(sources))
+                packed.append((kind, source, payload, arrival_ns))
+            end = pack_frames(self.ring.buf, start, packed)
+            sources = tuple(sources)
+
+            seq = next(self._seq)
+            protocols = [frame[0] for frame in frames]
+            if not self._pool:
+                # every worker has gone, decode here rather than not at all
+                self._in_flight.append((seq, protocols, None, start, end, sources))
+                self._decode_here(seq, start, end, sources)
+                continue
+
+            worker = min(self._pool, key=lambda w: w.outstanding)
+            self._in_flight.append((seq, protocols, worker, start, end, sources))
+            try:
+                worker.pipe.send((seq, start, end, sources))
+            except OSError:
+                self._lost(worker)
+                continue
+            worker.outstanding += 1
+
+    def _decode_here(self, seq, start, end, sources):
+        with self.ring.buf[start:end] as buffer:
+            self._results[seq] = decode_frames(buffer, sources)
+        self._deliver()
+
+    def _receive(self, worker):
+        try:
+            seq, messages = worker.pipe.recv()
+        except (EOFError, OSError):
+            self._lost(worker)
+            return
+        worker.outstanding -= 1
+        self._results[seq] = messages
+        self._deliver()
+
+    def _lost(self, worker):
+        print("decoder process exited", worker.process.exitcode)
+        asyncio.get_running_loop().remove_reader(worker.pipe.fileno())
+        worker.pipe.close()
+        self._pool.remove(worker)
+        # its frames are still in the ring
+        for seq, _, owner, start, end, sources in list(self._in_flight):
+            if owner is worker:
+                self._decode_here(seq, start, end, sources)
+
+    def _deliver(self):
+        # in the order the frames were read whichever worker finished first
+        while self._in_flight and self._in_flight[0][0] in self._results:
+            seq, protocols, *_ = self._in_flight.popleft()
+            self.ring.release()
+            for protocol, msg in zip(protocols, self._results.pop(seq)):
+                if msg is not None:
+                    protocol.message_queue.put_nowait(msg)
+            self.frames += len(protocols)
+            self.batches += 1
+
+        if self._waiting:
+            self._schedule_flush()
+
+    async def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        loop = asyncio.get_running_loop()
+        for worker in self._pool:
+            loop.remove_reader(worker.pipe.fileno())
+            try:
+                worker.pipe.send(None)
+            except OSError:
+                pass
+        for worker in self._pool:
+            await loop.run_in_executor(None, worker.process.join, CLOSE_TIMEOUT)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.pipe.close()
+        self._pool.clear()
+
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
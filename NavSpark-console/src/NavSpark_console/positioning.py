@@ -0,0 +1,333 @@
+import attr
+import numpy as np
+
+from NavSpark_console.protocol import (
+    GNSSType,
+    MeasurementTimeInformation,
+    RawMeasurementsArray,
+    ExtendedRawMeasurements,
+    GPSRawMeasurementIndicator,
+    ExtendedRawChannelIndicator,
+)
+from NavSpark_console.ephemeris import GPSEphemerisCache, GPS_OMEGA_E_DOT
+from NavSpark_console.beidou import BeidouEphemerisCache, BDT_GPS_OFFSET
+from NavSpark_console.glonass import GLONASSOrbitPropagator, gps_tow_to_glonass_tod
+from NavSpark_console.coordinates import ecef_to_geodetic
+
+SPEED_OF_LIGHT = 299792458.0
+
+MAX_ITERATIONS = 10
+CONVERGENCE = 1e-4
+
+# a solution older than this is not used as the starting point for the next one
+WARM_START_MAX_AGE = 30.0
+
+# below this the estimate is too far from the surface for elevations to mean much
+MIN_RADIUS_FOR_ELEVATION = 6.0e6
+
+DEFAULT_LEAP_SECONDS = 18
+
+
+def tropospheric_delay(lat, height, elevation, humidity=0.7):
+    """Saastamoinen model with a standard atmosphere, in metres"""
+    # the standard atmosphere only makes sense close to the ground
+    in_range = (height > -100.0) & (height < 1e4)
+    height = np.clip(height, 0.0, 1e4)
+    pressure = 1013.25 * (1.0 - 2.2557e-5 * height) ** 5.2568
+    temperature = 15.0 - 6.5e-3 * height + 273.16
+    e = (
+        6.108
+        * humidity
+        * np.exp((17.15 * temperature - 4684.0) / (temperature - 38.45))
+    )
+
+    # cos of the zenith angle
+    cos_z = np.sin(np.clip(elevation, 1e-3, None))
+    hydrostatic = (
+        0.0022768
+        * pressure
+        / (1.0 - 0.00266 * np.cos(2.0 * lat) - 0.00028 * height / 1e3)
+        / cos_z
+    )
+    wet = 0.002277 * (1255.0 / temperature + 0.05) * e / cos_z
+    return np.where(in_range & (elevation > 0), hydrostatic + wet, 0.0)
+
+
+def raw_measurement_system(svid):
+    """Split the svid numbering of RawMeasurement into a system and PRN/slot"""
+    svid = np.asarray(svid)
+    gnss_type = np.full(svid.shape, GNSSType.GPS, dtype=np.uint8)
+    prn = svid.copy()
+
+    glonass = (svid >= 65) & (svid <= 96)
+    gnss_type[glonass] = GNSSType.GLONASS
+    prn[glonass] -= 64
+
+    sbas = (svid >= 120) & (svid <= 158)
+    gnss_type[sbas] = GNSSType.SBAS
+
+    beidou = svid > 200
+    gnss_type[beidou] = GNSSType.BEIDOU
+    prn[beidou] -= 200
+    return gnss_type, prn
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Solution:
+    tow: float
+    position: np.ndarray
+    clock_bias: dict
+    gnss_type: np.ndarray
+    svid: np.ndarray
+    residuals: np.ndarray
+    used: np.ndarray
+    iterations: int
+    converged: bool
+
+
+@attr.s(auto_attribs=True)
+class PointPositionSolver:
+    """
+    Least squares single point positioning from raw pseudoranges. Every system
+    gets its own receiver clock term, and each epoch starts from the previous
+    solution so it normally converges in one or two iterations.
+
+    tow is GPS seconds of week of the receive time.
+    """
+
+    gps: GPSEphemerisCache = attr.ib(factory=GPSEphemerisCache)
+    beidou: BeidouEphemerisCache = attr.ib(factory=BeidouEphemerisCache)
+    glonass: GLONASSOrbitPropagator = attr.ib(factory=GLONASSOrbitPropagator)
+    elevation_mask: float = np.radians(10.0)
+    leap_seconds: int = DEFAULT_LEAP_SECONDS
+    solution: Solution = None
+    _measurement_tows: dict = attr.ib(factory=dict, repr=False)
+
+    def update(self, msg):
+        """
+        Feed any decoded message, returns a new Solution when the message
+        completes an epoch of measurements.
+        """
+        if isinstance(msg, MeasurementTimeInformation):
+            self._measurement_tows[msg.iod] = msg.receiver_tow / 1000.0
+        elif isinstance(msg, RawMeasurementsArray):
+            tow = self._measurement_tows.pop(msg.iod, None)
+            if tow is None:
+                return None
+
+            svid = np.array([m.svid for m in msg.sub_messages], dtype=np.int64)
+            pseudorange = np.array([m.pseudo_range for m in msg.sub_messages])
+            available = np.array(
+                [
+                    bool(
+                        m.measurement_indicator
+                        & GPSRawMeasurementIndicator.pseudo_range_available
+                    )
+                    for m in msg.sub_messages
+                ],
+                dtype=bool,
+            )
+            gnss_type, prn = raw_measurement_system(svid)
+            return self.solve(
+                tow, gnss_type[available], prn[available], pseudorange[available]
+            )
+        elif isinstance(msg, ExtendedRawMeasurements):
+            # only the primary signal of each satellite, L1 C/A, B1I and so on
+            subs = [
+                m
+                for m in msg.sub_messages
+                if m.signal_type == 0
+                and m.channel_indicator
+                & ExtendedRawChannelIndicator.pseudorange_available
+            ]
+            return self.solve(
+                msg.tow / 1000.0,
+                np.array([m.gnss_type for m in subs], dtype=np.uint8),
+                np.array([m.svid for m in subs], dtype=np.int64),
+                np.array([m.pseudorange for m in subs]),
+            )
+        else:
+            self.gps.update(msg)
+            self.beidou.update(msg)
+            self.glonass.update(msg)
+        return None
+
+    def satellites(self, tow, gnss_type, svid, pseudorange):
+        """
+        Satellite positions at transmit time and their clock corrections in
+        seconds, along with a mask of the measurements that have an ephemeris.
+        """
+        n = len(svid)
+        position = np.zeros((n, 3))
+        clock = np.zeros(n)
+        valid = np.zeros(n, dtype=bool)
+        t_tx = tow - pseudorange / SPEED_OF_LIGHT
+
+        for system in np.unique(gnss_type):
+            sel = np.flatnonzero(gnss_type == system)
+            if system == GNSSType.GPS:
+                cache, t = self.gps, t_tx[sel]
+            elif system == GNSSType.BEIDOU:
+                cache, t = self.beidou, t_tx[sel] - BDT_GPS_OFFSET
+            elif system == GNSSType.GLONASS:
+                self._glonass_satellites(sel, svid, t_tx, position, clock, valid)
+                continue
+            else:
+                continue
+
+            known = np.array([sv in cache.ephemerides for sv in svid[sel]], dtype=bool)
+            sel = sel[known]
+            if not len(sel):
+                continue
+
+            states = cache.satellite_states(t[known], svids=svid[sel])
+            # move the position back by the satellite clock error
+            position[sel] = (
+                states.position - states.velocity * states.clock_bias[:, np.newaxis]
+            )
+            clock[sel] = states.clock_bias
+            valid[sel] = True
+
+        return position, clock, valid
+
+    def _glonass_satellites(self, sel, svid, t_tx, position, clock, valid):
+        slots = self.glonass.slots.tolist()
+        rows = {slot: i for i, slot in enumerate(slots)}
+        known = np.array([sv in rows for sv in svid[sel]], dtype=bool)
+        sel = sel[known]
+        if not len(sel):
+            return
+
+        # the propagator steps every slot, unobserved ones go to the epoch time
+        tod = gps_tow_to_glonass_tod(t_tx[sel], self.leap_seconds)
+        t = np.full(len(slots), np.median(tod))
+        idx = [rows[sv] for sv in svid[sel]]
+        t[idx] = tod
+
+        states = self.glonass.satellite_states(t)
+        position[sel] = (
+            states.position[idx]
+            - states.velocity[idx] * states.clock_bias[idx, np.newaxis]
+        )
+        clock[sel] = states.clock_bias[idx]
+        valid[sel] = True
+
+    def solve(self, tow, gnss_type, svid, pseudorange):
+        gnss_type = np.asarray(gnss_type)
+        svid = np.asarray(svid)
+        pseudorange = np.asarray(pseudorange, dtype=float)
+
+        sat_position, sat_clock, valid = self.satellites(
+            tow, gnss_type, svid, pseudorange
+        )
+        systems = [GNSSType(s) for s in np.unique(gnss_type[valid])]
+        n_unknowns = 3 + len(systems)
+        if valid.sum() < n_unknowns:
+            return None
+
+        # one column per system for the receiver clock, in metres
+        system_index = np.searchsorted(
+            np.array(systems, dtype=np.uint8), gnss_type[valid]
+        )
+        sat_position = sat_position[valid]
+        corrected = pseudorange[valid] + SPEED_OF_LIGHT * sat_clock[valid]
+
+        x = np.zeros(n_unknowns)
+        previous = self.solution
+        if previous is not None and abs(tow - previous.tow) < WARM_START_MAX_AGE:
+            x[:3] = previous.position
+            for i, system in enumerate(systems):
+                x[3 + i] = previous.clock_bias.get(system, 0.0) * SPEED_OF_LIGHT
+
+        H = np.zeros((len(corrected), n_unknowns))
+        H[np.arange(len(corrected)), 3 + system_index] = 1.0
+        used = np.ones(len(corrected), dtype=bool)
+
+        converged = False
+        for iteration in range(1, MAX_ITERATIONS + 1):
+            delta = sat_position - x[:3]
+            geometric = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+            line_of_sight = delta / geometric[:, np.newaxis]
+
+            # earth rotation during the signal travel time
+            sagnac = (
+                GPS_OMEGA_E_DOT
+                * (sat_position[:, 0] * x[1] - sat_position[:, 1] * x[0])
+                / SPEED_OF_LIGHT
+            )
+            predicted = geometric + sagnac + x[3 + system_index]
+
+            weight = np.ones(len(corrected))
+            if np.dot(x[:3], x[:3]) > MIN_RADIUS_FOR_ELEVATION**2:
+                lat, lon, height = ecef_to_geodetic(*x[:3])
+                up = np.array(
+                    [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+                )
+                elevation = np.arcsin(np.clip(line_of_sight @ up, -1.0, 1.0))
+                predicted += tropospheric_delay(lat, height, elevation)
+                used = elevation >= self.elevation_mask
+                if used.sum() < n_unknowns:
+                    used[:] = True
+                weight = np.sin(np.clip(elevation, 0.05, None))
+
+            H[:, :3] = -line_of_sight
+            residuals = corrected - predicted
+            w = weight[used, np.newaxis]
+            dx = np.linalg.lstsq(H[used] * w, residuals[used] * w[:, 0], rcond=None)[0]
+            x += dx
+
+            if np.dot(dx[:3], dx[:3]) < CONVERGENCE**2:
+                converged = True
+                break
+
+        solution = Solution(
+            tow=tow,
+            position=x[:3].copy(),
+            clock_bias={
+                system: x[3 + i] / SPEED_OF_LIGHT for i, system in enumerate(systems)
+            },
+            gnss_type=gnss_type[valid],
+            svid=svid[valid],
+            residuals=residuals - H @ dx,
+            used=used,
+            iterations=iteration,
+            converged=converged,
+        )
+        if converged:
+            self.solution = solution
+        return solution
+
+
+def simulate_pseudoranges(solver, tow, gnss_type, svid, position, clock_bias=0.0):
+    """
+    Pseudoranges that solver would see for a receiver at position with the
+    given clock bias in seconds, for testing and benchmarking.
+    """
+    gnss_type = np.asarray(gnss_type)
+    svid = np.asarray(svid)
+    position = np.asarray(position, dtype=float)
+    pseudorange = np.full(len(svid), 2.0e7)
+
+    lat, lon, height = ecef_to_geodetic(*position)
+    up = np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    # the transmit time depends on the range, a few rounds settle it
+    for _ in range(4):
+        sat_position, sat_clock, _ = solver.satellites(
+            tow, gnss_type, svid, pseudorange
+        )
+        delta = sat_position - position
+        geometric = np.linalg.norm(delta, axis=1)
+        sagnac = (
+            GPS_OMEGA_E_DOT
+            * (sat_position[:, 0] * position[1] - sat_position[:, 1] * position[0])
+            / SPEED_OF_LIGHT
+        )
+        elevation = np.arcsin((delta / geometric[:, np.newaxis]) @ up)
+        pseudorange = (
+            geometric
+            + sagnac
+            + tropospheric_delay(lat, height, elevation)
+            + SPEED_OF_LIGHT * (clock_bias - sat_clock)
+        )
+    return pseudorange, elevation
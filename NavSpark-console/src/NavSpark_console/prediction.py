@@ -0,0 +1,79 @@
+import time
+
+import attr
+
+from NavSpark_console.protocol import NavigationState, ReceiverNavigationStatus
+
+# don't extrapolate further than this past the last fix
+MAX_EXTRAPOLATION_NS = 1_000_000_000
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class Anchor:
+    """The last fix, position and velocity as plain floats in ECEF"""
+
+    arrival_ns: int
+    x: float
+    y: float
+    z: float
+    vx: float
+    vy: float
+    vz: float
+
+
+@attr.s(auto_attribs=True)
+class PositionPredictor:
+    """
+    Dead reckoning between fixes for control loops that run faster than the
+    receiver. The position is extrapolated along the last reported velocity
+    from when the fix was read off the wire.
+
+    latency_ns is how long before arriving the fix was valid, the receiver's
+    processing and the time on the serial line. update publishes a new Anchor
+    with a single assignment so position_at can be called from any thread
+    without a lock.
+    """
+
+    latency_ns: int = 0
+    max_extrapolation_ns: int = MAX_EXTRAPOLATION_NS
+    anchor: Anchor = None
+
+    def update(self, msg):
+        if not isinstance(msg, ReceiverNavigationStatus):
+            return
+        if msg.navigation_state == NavigationState.NO_FIX:
+            return
+
+        arrival_ns = msg.arrival_ns
+        if arrival_ns is None:
+            arrival_ns = time.monotonic_ns()
+
+        self.anchor = Anchor(
+            arrival_ns - self.latency_ns,
+            msg.ecef_x,
+            msg.ecef_y,
+            msg.ecef_z,
+            msg.ecef_x_vel,
+            msg.ecef_y_vel,
+            msg.ecef_z_vel,
+        )
+
+    def position_at(self, monotonic_ns):
+        """
+        ECEF position at a time.monotonic_ns() timestamp, None without a fix
+        or when the last one is too old to extrapolate from.
+        """
+        anchor = self.anchor
+        if anchor is None:
+            return None
+
+        elapsed = monotonic_ns - anchor.arrival_ns
+        if elapsed > self.max_extrapolation_ns:
+            return None
+
+        dt = elapsed * 1e-9
+        return (
+            anchor.x + anchor.vx * dt,
+            anchor.y + anchor.vy * dt,
+            anchor.z + anchor.vz * dt,
+        )
@@ -1,4 +1,7 @@
 import asyncio
+import re
+import time
+from collections import Counter
 from operator import xor
 from enum import IntEnum, Enum, auto, Flag, IntFlag
 from functools import partial, partialmethod, reduce
@@ -8,9 +11,22 @@ from io import BytesIO
 import attr
 import bitstruct
 
+from NavSpark_console.rtcm import (
+    RTCM_PREAMBLE,
+    RTCM_HEADER_LENGTH,
+    RTCM_CRC_LENGTH,
+    crc24q,
+    message_number,
+    unpack_rtcm,
+)
+from NavSpark_console.nmea import MAX_SENTENCE_LENGTH, nmea_checksum, parse_sentence
+
 ACK_TYPE = 0x83
 NACK_TYPE = 0x84
 
+# how long the receiver gets to ACK a command
+COMMAND_TIMEOUT = 1.0
+
 MESSAGES_ = {}
 
 
@@ -18,20 +34,117 @@ def hexdump(b):
     print(b.hex(" ", 1))
 
 
+def packet(payload):
+    """Frame a message payload, bytes(msg), as a SkyTraq binary packet"""
+    payload = bytes(payload)
+    return (
+        b"\xA0\xA1"
+        + len(payload).to_bytes(2, "big")
+        + payload
+        + bytes((reduce(xor, payload, 0),))
+        + b"\x0D\x0A"
+    )
+
+
 packet_preamble = bitstruct.compile("u16u8>")
 
+# longest payload accepted before a leader is treated as noise
+MAX_PAYLOAD_LENGTH = 0x1000
+
+NMEA_START = ord("$")
+# the start of a SkyTraq binary packet, an RTCM3 frame or an NMEA sentence
+FRAME_LEADER = re.compile(rb"\xA0\xA1|\xD3|\$")
+
+# the kinds of frame in the stream
+BINARY_FRAME = 0
+NMEA_FRAME = 1
+RTCM_FRAME = 2
+# frame_bytes keys, binary frames are counted by message id
+FRAME_NAMES = {NMEA_FRAME: "NMEA", RTCM_FRAME: "RTCM"}
+
+
+def decode_frame(kind, payload, **tags):
+    """
+    The message in a frame NavSparkRawProtocol has already found and checked.
+    An NMEA payload is the sentence between the $ and the *. tags, arrival_ns
+    and source, are passed on to the message.
+    """
+    if kind == BINARY_FRAME:
+        return MESSAGES_[payload[0]].unpack(payload, **tags)
+    if kind == NMEA_FRAME:
+        return parse_sentence(payload, **tags)
+    return unpack_rtcm(payload, **tags)
+
+
+def find_frame(buffer, pos=0):
+    """
+    True if buffer holds a whole SkyTraq packet with a good LRC, an RTCM3
+    frame with a good CRC or an NMEA sentence with a good checksum, starting
+    from pos on. Line noise almost never does.
+    """
+    for leader in FRAME_LEADER.finditer(buffer, pos):
+        start = leader.start()
+        first = buffer[start]
+        if first == RTCM_PREAMBLE:
+            end = start + RTCM_HEADER_LENGTH + RTCM_CRC_LENGTH
+            if end > len(buffer) or buffer[start + 1] & 0xFC:
+                continue
+            end += int.from_bytes(buffer[start + 1 : start + 3], "big")
+            if end <= len(buffer) and crc24q(memoryview(buffer)[start:end]) == 0:
+                return True
+        elif first == NMEA_START:
+            end = buffer.find(b"\r\n", start, start + MAX_SENTENCE_LENGTH)
+            if end - start < 4 or buffer[end - 3] != ord("*"):
+                continue
+            try:
+                checksum = int(buffer[end - 2 : end], 16)
+            except ValueError:
+                continue
+            if checksum == nmea_checksum(buffer[start + 1 : end - 3]):
+                return True
+        else:
+            length = int.from_bytes(buffer[start + 2 : start + 4], "big")
+            end = start + 4 + length
+            if (
+                0 < length <= MAX_PAYLOAD_LENGTH
+                and end + 3 <= len(buffer)
+                and reduce(xor, buffer[start + 4 : end + 1], 0) == 0
+                and buffer[end + 1 : end + 3] == b"\x0D\x0A"
+            ):
+                return True
+    return False
+
 
 @attr.s(kw_only=True)
 class NavSparkRawProtocol(asyncio.Protocol):
     message_queue: asyncio.Queue = attr.ib(factory=lambda: asyncio.Queue())
     ack_event: asyncio.Event = attr.ib(factory=lambda: asyncio.Event())
+    # called with the exception, or None, when the transport goes away
+    on_connection_lost: object = attr.ib(default=None, repr=False)
+    # the receiver's name, every message is tagged with it
+    source: str = attr.ib(default=None)
+    # something with a write method, a Recorder say, given every byte read
+    recorder: object = attr.ib(default=None, repr=False)
+    # a FrameDecoder to hand frames to rather than decoding them here
+    decoder: object = attr.ib(default=None, repr=False)
+    # kept across reconnects, a frame cut off by the drop is resynced past
+    buffer: bytearray = attr.ib(factory=bytearray, repr=False)
+    bytes_received: int = attr.ib(default=0)
+    connections: int = attr.ib(default=0)
+    # bytes of every good frame by binary message id, "RTCM" or "NMEA"
+    frame_bytes: Counter = attr.ib(factory=Counter, repr=False)
+    # size of the latest frame by binary message id or RTCM message number
+    frame_sizes: dict = attr.ib(factory=dict, repr=False)
+    transport: asyncio.Transport = attr.ib(default=None, init=False, repr=False)
+    # the message id and result of the last ACK or NACK
+    ack_id: int = attr.ib(default=None, init=False, repr=False)
+    acked: bool = attr.ib(default=None, init=False, repr=False)
+    # frames found by the current call to frame
+    _framed: list = attr.ib(factory=list, init=False, repr=False)
 
     def connection_made(self, transport):
         self.transport = transport
-        self.buffer = bytearray()
-
-    def _update_buffer(self, packet_end):
-        self.buffer = self.buffer[packet_end + 3 :]
+        self.connections += 1
 
     def _send_ack(self):
         self.transport.write(b"\xA0\xA1\x00\x01\x83\x83\x0D\x0A")
@@ -39,77 +152,199 @@ class NavSparkRawProtocol(asyncio.Protocol):
     def _send_nack(self):
         self.transport.write(b"\xA0\xA1\x00\x01\x84\x84\x0D\x0A")
 
-    async def _send_command(self, inst):
+    async def send_command(self, inst, timeout=COMMAND_TIMEOUT):
+        """
+        Send a message and wait for the receiver to answer it, True for an ACK
+        and False for a NACK. Raises asyncio.TimeoutError without an answer.
+        """
+        buffer = bytes(inst)
         self.ack_event.clear()
+        self.transport.write(packet(buffer))
 
-        buffer = bytes(inst)
-        self.transport.write(b"\xA0\xA1")
-        self.transport.write(
-            packet_preamble.pack(len(buffer).to_bytes(2, byteorder="big"))
-        )
-        self.transport.write(buffer)
-        lrc = reduce(xor, buffer, cmd)
-        self.transport.write(lrc.to_bytes(1))
-        self.transport.write(b"\x0D\x0A")
+        async def answer():
+            while True:
+                await self.ack_event.wait()
+                if self.ack_id == buffer[0]:
+                    return self.acked
+                # an answer to some earlier command
+                self.ack_event.clear()
 
-        await self.ack_event.wait()
+        return await asyncio.wait_for(answer(), timeout)
 
     def data_received(self, data):
-        try:
-            self.buffer.extend(data)
-            if len(self.buffer) < 8:
-                # there have to be at least 8 bytes for a complete packet
-                return
-
-            packet_start = self.buffer.find(b"\xA0\xA1")
-            if packet_start == -1:
-                return
-
-            packet_start += 2  # skip the leader
-            l, packet_type = packet_preamble.unpack_from(self.buffer[packet_start:])
-            packet_start += 2  # skip the length
-
-            packet_end = self.buffer.find(b"\x0D\x0A", packet_start + l)
-            if packet_end == -1:
-                return
-
-            if packet_end - packet_start + 1 == l:
-                return
-
-            # the length does not include the crc
-            lrc = reduce(xor, self.buffer[packet_start:packet_end])
-            if lrc != 0:
-                # packet lrc wrong
-                self._update_buffer(packet_end)
-                return
-
-            packet_end -= 1  # backup to before the lrc
+        self.frames_received(self.frame(data))
+
+    def frame(self, data):
+        """
+        Find the frames data completes, without acting on them. Returns the
+        kind, payload, size and arrival time of each, for frames_received.
+        Nothing else touches the buffer, so this can run in a reader thread.
+        """
+        # read once, the loop may swap it while this runs in a reader thread
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.write(data)
+        self.buffer.extend(data)
+        self.bytes_received += len(data)
+        # every packet finished by this read arrived now
+        self.arrival_ns = time.monotonic_ns()
+
+        # a single read can hold several packets
+        self._framed = []
+        while self._process_packet():
+            pass
+        return self._framed
+
+    def frames_received(self, frames):
+        """Count, take in the ACKs of and decode frames found by frame"""
+        for kind, payload, size, arrival_ns in frames:
+            if kind != BINARY_FRAME:
+                self.frame_bytes[FRAME_NAMES[kind]] += size
+                if kind == RTCM_FRAME and len(payload) > 1:
+                    self.frame_sizes[message_number(payload)] = size
+                self._decode(kind, payload, arrival_ns)
+                continue
+
+            packet_type = payload[0]
+            self.frame_bytes[packet_type] += size
+            self.frame_sizes[packet_type] = size
             if packet_type == ACK_TYPE or packet_type == NACK_TYPE:
+                self.ack_id = payload[1] if len(payload) > 1 else None
+                self.acked = packet_type == ACK_TYPE
                 self.ack_event.set()
-                return
+                continue
 
-            try:
-                msg_cls = MESSAGES_[packet_type]
+            if packet_type not in MESSAGES_:
+                print("unknown message type", hex(packet_type))
+                continue
 
-                # hexdump(self.buffer[packet_start:packet_end])
+            # hexdump(payload)
 
-                # We could just ignore queue full exceptions for most packets.
-                # The navigation messages would be out of date if we get behind
-                # and we just want to catch up to the current state of the world.
-                self.message_queue.put_nowait(
-                    msg_cls.unpack(self.buffer[packet_start:packet_end])
-                )
-            except KeyError:
-                print("unknown message type", hex(packet_type))
+            self._decode(kind, payload, arrival_ns)
 
-            finally:
-                self._update_buffer(packet_end)
+    def _decode(self, kind, payload, arrival_ns):
+        if self.decoder is not None:
+            self.decoder.submit(self, kind, payload, arrival_ns)
+            return
 
+        try:
+            # We could just ignore queue full exceptions for most packets.
+            # The navigation messages would be out of date if we get behind
+            # and we just want to catch up to the current state of the world.
+            self.message_queue.put_nowait(
+                decode_frame(kind, payload, arrival_ns=arrival_ns, source=self.source)
+            )
         except Exception as ex:
             print(ex)
 
+    def _process_packet(self):
+        if len(self.buffer) < 8:
+            # there have to be at least 8 bytes for a complete packet
+            return False
+
+        # SkyTraq binary, RTCM3 frames and NMEA sentences share the stream,
+        # take whichever leader comes first
+        leader = FRAME_LEADER.search(self.buffer)
+        if leader is None:
+            # keep the last byte, it could be the first half of a leader
+            del self.buffer[:-1]
+            return False
+
+        del self.buffer[: leader.start()]
+        if self.buffer[0] == RTCM_PREAMBLE:
+            return self._process_rtcm()
+        if self.buffer[0] == NMEA_START:
+            return self._process_nmea()
+
+        if len(self.buffer) < 8:
+            return False
+
+        l, packet_type = packet_preamble.unpack_from(self.buffer, offset=16)
+        packet_start = 4  # skip the leader and the length
+        packet_end = packet_start + l  # the lrc follows the payload
+
+        if l == 0 or l > MAX_PAYLOAD_LENGTH:
+            # not a real leader, resync on the next one
+            del self.buffer[:1]
+            return True
+
+        if len(self.buffer) < packet_end + 3:
+            return False
+
+        lrc = reduce(xor, self.buffer[packet_start : packet_end + 1])
+        if lrc != 0 or self.buffer[packet_end + 1 : packet_end + 3] != b"\x0D\x0A":
+            # packet lrc wrong or this was not a real leader
+            del self.buffer[:1]
+            return True
+
+        payload = bytes(self.buffer[packet_start:packet_end])
+        del self.buffer[: packet_end + 3]
+        self._framed.append((BINARY_FRAME, payload, packet_end + 3, self.arrival_ns))
+        return True
+
+    def _process_nmea(self):
+        end = self.buffer.find(b"\r\n", 0, MAX_SENTENCE_LENGTH)
+        if end == -1:
+            if len(self.buffer) >= MAX_SENTENCE_LENGTH:
+                # a $ in line noise rather than a sentence
+                del self.buffer[:1]
+                return True
+            return False
+
+        # everything between the $ and the *, then *hh
+        sentence = bytes(self.buffer[1 : end - 3])
+        checksum = bytes(self.buffer[end - 3 : end])
+        try:
+            valid = (
+                end > 3
+                and checksum[:1] == b"*"
+                and int(checksum[1:], 16) == nmea_checksum(sentence)
+            )
+        except ValueError:
+            valid = False
+
+        if not valid:
+            del self.buffer[:1]
+            return True
+
+        del self.buffer[: end + 2]
+        self._framed.append((NMEA_FRAME, sentence, end + 2, self.arrival_ns))
+        return True
+
+    def _process_rtcm(self):
+        if len(self.buffer) < RTCM_HEADER_LENGTH:
+            return False
+
+        # the 6 bits above the length are reserved and always 0
+        if self.buffer[1] & 0xFC or self.buffer[1:3] == b"\x00\x00":
+            del self.buffer[:1]
+            return True
+
+        l = int.from_bytes(self.buffer[1:3], "big")
+        packet_end = RTCM_HEADER_LENGTH + l
+        if len(self.buffer) < packet_end + RTCM_CRC_LENGTH:
+            # a whole frame further on means this D3 wasn't a preamble, don't
+            # hold everything behind it back for up to a kilobyte to find out
+            if find_frame(self.buffer, 1):
+                del self.buffer[:1]
+                return True
+            return False
+
+        if crc24q(memoryview(self.buffer)[: packet_end + RTCM_CRC_LENGTH]) != 0:
+            # a D3 byte in line noise rather than a frame
+            del self.buffer[:1]
+            return True
+
+        payload = bytes(self.buffer[RTCM_HEADER_LENGTH:packet_end])
+        size = packet_end + RTCM_CRC_LENGTH
+        del self.buffer[:size]
+        self._framed.append((RTCM_FRAME, payload, size, self.arrival_ns))
+        return True
+
     def connection_lost(self, exc):
-        self.transport.loop.stop()
+        self.transport = None
+        if self.on_connection_lost is not None:
+            self.on_connection_lost(exc)
 
     def resume_reading(self):
         self.transport.resume_reading()
@@ -231,9 +466,42 @@ def pack_message_(self, compiled_struct_format):
     )
 
 
-def unpack_message_(compiled_struct_format, cls, data):
+def unpack_message_(compiled_struct_format, cls, data, **kwargs):
     inst = compiled_struct_format.unpack(data)
-    return cls(**inst)
+    return cls(**inst, **kwargs)
+
+
+def _tag_attribute(name, type):
+    # set by NavSparkRawProtocol rather than read from the packet
+    return attr.Attribute(
+        name,
+        None,
+        None,
+        False,
+        None,
+        False,
+        True,
+        False,
+        type=type,
+        eq=False,
+        order=False,
+        metadata={
+            "NavSpark_console": {
+                "format": None,
+                "direction": MessageDirection(0),
+            }
+        },
+    )
+
+
+def arrival_attribute():
+    # time.monotonic_ns() when the packet was read, it isn't part of the packet
+    return _tag_attribute("arrival_ns", int)
+
+
+def source_attribute():
+    # the name of the receiver the packet came from
+    return _tag_attribute("source", str)
 
 
 def message(
@@ -333,6 +601,9 @@ def message(
                     bitstruct.compile(struct_format, list(unpack_format.keys())),
                 )
             )
+            if msg_ids:
+                results.append(arrival_attribute())
+                results.append(source_attribute())
 
         return results
 
@@ -441,7 +712,7 @@ def arr_message(msg_id, sub_message_cls, *, message_length=None, periodic=False)
         sub_format_compiled = bitstruct.compile(sub_format, list(unpack_format.keys()))
         sub_format_len = bitstruct.calcsize(sub_format)
 
-        def unpack_message_arr(cls, buffer):
+        def unpack_message_arr(cls, buffer, **kwargs):
             parent_inst = parent_format_compiled.unpack(buffer)
 
             sub_messages = []
@@ -450,10 +721,12 @@ def arr_message(msg_id, sub_message_cls, *, message_length=None, periodic=False)
                     sub_message_cls(**sub_format_compiled.unpack_from(buffer, offset=i))
                 )
 
-            ret = cls(**parent_inst, sub_messages=sub_messages)
+            ret = cls(**parent_inst, sub_messages=sub_messages, **kwargs)
             return ret
 
         cls.unpack = classmethod(unpack_message_arr)
+        results.append(arrival_attribute())
+        results.append(source_attribute())
         return results
 
     def decorator(cls):
@@ -475,11 +748,38 @@ def arr_message(msg_id, sub_message_cls, *, message_length=None, periodic=False)
 def simple_message(name, id):
     assert id > 0 and id < 256
     cls = attr.make_class(name, [], slots=True, frozen=True)
-    cls.__bytes__ = lambda self: b"\xA0\xA1\x00\x01%(id)c%(id)c\x0D\x0A"
+    cls.__bytes__ = lambda self: bytes((id,))
     MESSAGES_[id] = cls
     return cls
 
 
+class BaudRate(IntEnum):
+    b4800 = 0
+    b9600 = 1
+    b19200 = 2
+    b38400 = 3
+    b57600 = 4
+    b115200 = 5
+    b230400 = 6
+    b460800 = 7
+    b921600 = 8
+
+    @property
+    def rate(self):
+        return int(self.name[1:])
+
+    @classmethod
+    def from_rate(cls, rate):
+        return cls[f"b{rate}"]
+
+
+@message(0x5, direction=MessageDirection.INPUT, message_length=4)
+class ConfigureSerialPort:
+    com_port = UINT8()
+    baud_rate = ENUM(BaudRate)
+    persist = PERSIST()
+
+
 class MessageType(IntEnum):
     no_output = 0
     NMEA_message = 1
@@ -531,7 +831,9 @@ class SubframeEnabledFlag(IntFlag):
     beidou = 0b1000
 
 
-simple_message("QueryBinaryMeasurementDataOutputStatus", 0x1F)
+QueryBinaryMeasurementDataOutputStatus = simple_message(
+    "QueryBinaryMeasurementDataOutputStatus", 0x1F
+)
 
 
 @message(0x1E, 0x89, message_length=8, input_message_length=9)
@@ -546,7 +848,9 @@ class ConfigureBinaryMeasurmentDataOutput:
     persist = PERSIST()
 
 
-simple_message("QueryBinaryRTCMDataOutputStatus", 0x21)
+QueryBinaryRTCMDataOutputStatus = simple_message(
+    "QueryBinaryRTCMDataOutputStatus", 0x21
+)
 
 
 class RTCMType(IntEnum):
@@ -722,9 +1026,9 @@ class GPSEphemeris:
     @property
     def subframe2_fields(self):
         fields = gps_eph_subframe2_pattern.unpack(self.eph_data_subframe2)
-        fields["M_0"] = (fields.pop("M_0_msb") << 8) | fields.pop("M_0_lsb")
-        fileds["e"] = (fields.pop("e_msb") << 8) | fields.pop("e_lsb")
-        fields["root_a"] = (fields.pop("root_a_msb") << 8) | fields.pop("root_a_lsb")
+        fields["M_0"] = (fields.pop("M_0_msb") << 24) | fields.pop("M_0_lsb")
+        fields["e"] = (fields.pop("e_msb") << 24) | fields.pop("e_lsb")
+        fields["root_a"] = (fields.pop("root_a_msb") << 24) | fields.pop("root_a_lsb")
         return fields
 
     @property
@@ -737,6 +1041,59 @@ class GPSEphemeris:
 
 
 
+# GLONASS strings are delivered as the string number byte followed by the 72 data
+# bits (85..9 in the ICD numbering) MSB first, the hamming code is stripped. The
+# sign bit of the "sign-magnitude" fields is left in place as the MSB.
+glonass_string1_pattern = bitstruct.compile(
+    (
+        ">u8"      # string number
+        "p2u2"     # unused, P1
+        "u5u6u1"   # t_k hours, minutes, 30 second flag
+        "u24u5"    # x velocity, x acceleration
+        "u27"      # x position
+    ),
+    ["m", "P1", "t_k_hours", "t_k_minutes", "t_k_30s", "x_dot", "x_dot_dot", "x"],
+)
+
+glonass_string2_pattern = bitstruct.compile(
+    (
+        ">u8"      # string number
+        "u3u1u7p5" # B_n, P2, t_b, unused
+        "u24u5"    # y velocity, y acceleration
+        "u27"      # y position
+    ),
+    ["m", "B_n", "P2", "t_b", "y_dot", "y_dot_dot", "y"],
+)
+
+glonass_string3_pattern = bitstruct.compile(
+    (
+        ">u8"        # string number
+        "u1u11p1"    # P3, gamma_n, unused
+        "u2u1"       # P, l_n
+        "u24u5"      # z velocity, z acceleration
+        "u27"        # z position
+    ),
+    ["m", "P3", "gamma_n", "P", "l_n", "z_dot", "z_dot_dot", "z"],
+)
+
+glonass_string4_pattern = bitstruct.compile(
+    (
+        ">u8"        # string number
+        "u22u5u5"    # tau_n, delta tau_n, E_n
+        "p14u1u4p3"  # unused, P4, F_T, unused
+        "u11u5u2"    # N_T, n, M
+    ),
+    ["m", "tau_n", "delta_tau_n", "E_n", "P4", "F_T", "N_T", "n", "M"],
+)
+
+glonass_string_patterns = {
+    1: glonass_string1_pattern,
+    2: glonass_string2_pattern,
+    3: glonass_string3_pattern,
+    4: glonass_string4_pattern,
+}
+
+
 @message(0x5B, direction=MessageDirection.INPUT, message_length=2)
 class GetGLONASSEphemeris:
     satellite_number = UINT8()
@@ -751,6 +1108,16 @@ class GLONASSEphemeris:
     eph_data2 = BYTES(10)
     eph_data3 = BYTES(10)
 
+    @property
+    def string_fields(self):
+        # each block holds one of strings 1 to 4, keyed by its string number
+        fields = {}
+        for data in (self.eph_data0, self.eph_data1, self.eph_data2, self.eph_data3):
+            pattern = glonass_string_patterns.get(data[0])
+            if pattern:
+                fields[data[0]] = pattern.unpack(data)
+        return fields
+
 
 @message(0x80, direction=MessageDirection.OUTPUT, message_length=14)
 class ReceiverSoftwareVersion:
@@ -827,6 +1194,14 @@ class GLONASSString:
     string_number = UINT8()
     words = BYTES(9)
 
+    @property
+    def fields(self):
+        # only the immediate (ephemeris) strings are picked apart
+        pattern = glonass_string_patterns.get(self.string_number)
+        if pattern:
+            return pattern.unpack(bytes([self.string_number]) + self.words)
+        return None
+
 
 @message(0xE2, direction=MessageDirection.OUTPUT, message_length=31, periodic=True)
 class Beidou2D1Subframe:
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+
+import serial
+
+# the most taken from the port in one read
+READ_SIZE = 65536
+# how long a read blocks before checking whether the transport is closing,
+# close cancels the read anyway
+READ_TIMEOUT = 0.5
+
+
+class ReaderThreadTransport(asyncio.Transport):
+    """
+    A serial transport that reads in a thread of its own rather than the
+    event loop. Each read blocks for the first byte and then takes everything
+    waiting on the port. A protocol with a frame method, NavSparkRawProtocol,
+    is framed in the thread too. Whatever piles up while the loop is busy is
+    handed over together with one call_soon_threadsafe, so the loop wakes per
+    batch rather than per read. Other protocols are given the bytes read.
+    """
+
+    def __init__(self, loop, protocol, serial_instance, read_size=READ_SIZE):
+        super().__init__(extra={"serial": serial_instance})
+        self.serial = serial_instance
+        self.read_size = read_size
+        # reads by the thread and batches handed to the loop
+        self.reads = 0
+        self.batches = 0
+        self._loop = loop
+        self._protocol = protocol
+        self._framing = hasattr(protocol, "frame")
+        self._lock = threading.Lock()
+        self._pending = []
+        self._closing = False
+        self._exc = None
+        self._reading = threading.Event()
+        self._reading.set()
+        self._thread = threading.Thread(
+            target=self._read_loop, name=f"reader {serial_instance.port}", daemon=True
+        )
+        loop.call_soon(protocol.connection_made, self)
+        loop.call_soon(self._thread.start)
+
+    def _read(self):
+        data = self.serial.read(1)
+        waiting = self.serial.in_waiting
+        if data and waiting:
+            data += self.serial.read(min(waiting, self.read_size))
+        return data
+
+    def _read_loop(self):
+        exc = None
+        try:
+            while not self._closing:
+                self._reading.wait()
+                data = self._read()
+                if not data or self._closing:
+                    continue
+                self.reads += 1
+                if not self._framing:
+                    self._hand_over([data])
+                    continue
+                frames = self._protocol.frame(data)
+                if frames:
+                    self._hand_over(frames)
+        except Exception as ex:
+            # the port going away, or anything else, the protocol has to hear
+            # of it either way
+            exc = ex
+
+        try:
+            self._loop.call_soon_threadsafe(self._finish, exc)
+        except RuntimeError:
+            # the event loop has been closed under us
+            pass
+
+    def _hand_over(self, items):
+        with self._lock:
+            first = not self._pending
+            self._pending.extend(items)
+        # the loop hasn't taken the last batch yet, these go with it
+        if first:
+            self._loop.call_soon_threadsafe(self._deliver)
+
+    def _deliver(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending or self._protocol is None:
+            return
+        self.batches += 1
+        if self._framing:
+            self._protocol.frames_received(pending)
+        else:
+            self._protocol.data_received(b"".join(pending))
+
+    def _finish(self, exc):
+        self.serial.close()
+        protocol, self._protocol = self._protocol, None
+        if protocol is not None:
+            protocol.connection_lost(exc or self._exc)
+
+    def write(self, data):
+        if self._closing:
+            return
+        try:
+            self.serial.write(data)
+        except (serial.SerialException, OSError) as ex:
+            self._exc = ex
+            self.close()
+
+    def can_write_eof(self):
+        return False
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def is_reading(self):
+        return self._reading.is_set()
+
+    def pause_reading(self):
+        self._reading.clear()
+
+    def resume_reading(self):
+        self._reading.set()
+
+    def is_closing(self):
+        return self._closing
+
+    def close(self):
+        """Stop the thread, connection_lost follows once it has"""
+        if self._closing:
+            return
+        self._closing = True
+        self._reading.set()
+        self.serial.cancel_read()
+
+    def abort(self):
+        with self._lock:
+            self._pending.clear()
+        self.close()
+
+
+async def create_reader_thread_connection(loop, protocol_factory, url, **kwargs):
+    """serial_asyncio.create_serial_connection with a ReaderThreadTransport"""
+    serial_instance = serial.serial_for_url(url, timeout=READ_TIMEOUT, **kwargs)
+    protocol = protocol_factory()
+    transport = ReaderThreadTransport(loop, protocol, serial_instance)
+    return transport, protocol
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import time
+
+import attr
+from prompt_toolkit.layout.containers import HSplit, Window
+from prompt_toolkit.layout.controls import FormattedTextControl
+from prompt_toolkit.layout.dimension import LayoutDimension
+
+from NavSpark_console.capture import Recorder
+from NavSpark_console.connection import SerialConnection
+from NavSpark_console.dashboard import Satellites, SatelliteTable, SkyPlot
+from NavSpark_console.link import LinkMonitor, capacity_warnings
+from NavSpark_console.protocol import (
+    BinaryRTCMDataOutput,
+    ConfigureBinaryMeasurmentDataOutput,
+    NavSparkRawProtocol,
+    QueryBinaryMeasurementDataOutputStatus,
+    QueryBinaryRTCMDataOutputStatus,
+)
+
+
+def tagged(msg):
+    """A LogPane formatter, str(msg) after the name of the receiver it came from"""
+    source = getattr(msg, "source", None)
+    if source is None:
+        return str(msg)
+    return f"{source}: {msg}"
+
+
+def capture_path(name, directory="."):
+    return os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.raw")
+
+
+@attr.s(auto_attribs=True, eq=False)
+class Receiver:
+    """
+    One receiver and everything kept for it, its own protocol, connection,
+    link monitor, dashboard panels and, while recording, recorder. Every
+    message it decodes is tagged with name. Nothing but a decoder is shared
+    with the other receivers, so each costs the same whatever else is
+    connected.
+    """
+
+    name: str
+    port: str
+    # passed on to serial.Serial
+    settings: dict = attr.ib(factory=dict)
+    scheduler: object = attr.ib(default=None, repr=False)
+    # called with every message, after the dashboard, and new link warnings
+    log: object = attr.ib(default=None, repr=False)
+    # a FrameDecoder, shared between receivers, to decode in other processes
+    decoder: object = attr.ib(default=None, repr=False)
+    # read and frame in a thread rather than the event loop
+    reader_thread: bool = False
+    warnings: tuple = ()
+    # what the receiver last said it's set to output
+    measurement_output: ConfigureBinaryMeasurmentDataOutput = None
+    rtcm_output: BinaryRTCMDataOutput = None
+
+    def __attrs_post_init__(self):
+        self.protocol = NavSparkRawProtocol(source=self.name, decoder=self.decoder)
+        self.connection = SerialConnection(
+            self.port,
+            self.settings,
+            protocol=self.protocol,
+            reader_thread=self.reader_thread,
+        )
+        self.monitor = LinkMonitor(self.connection, on_status=self._link_status)
+        self.satellites = Satellites(scheduler=self.scheduler)
+        self.table = SatelliteTable(self.satellites)
+        self.sky_plot = SkyPlot(self.satellites)
+        # the table under the receiver's name, for comparing receivers
+        self.column = HSplit(
+            [
+                Window(
+                    content=FormattedTextControl(self.name),
+                    height=LayoutDimension.exact(1),
+                    style="class:receiver.name",
+                ),
+                self.table,
+            ]
+        )
+        self._dispatcher = None
+        self._query = None
+
+    @property
+    def recorder(self):
+        return self.protocol.recorder
+
+    def start(self):
+        self.connection.start()
+        self.monitor.start()
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        if self._query is None:
+            self._query = asyncio.create_task(self._query_output())
+
+    async def _query_output(self):
+        # the answers come back through _dispatch
+        await self.connection.wait_connected()
+        for query in (
+            QueryBinaryMeasurementDataOutputStatus(),
+            QueryBinaryRTCMDataOutputStatus(),
+        ):
+            try:
+                await self.protocol.send_command(query)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self):
+        queue = self.protocol.message_queue
+        while True:
+            msg = await queue.get()
+            if isinstance(msg, ConfigureBinaryMeasurmentDataOutput):
+                self.measurement_output = msg
+            elif isinstance(msg, BinaryRTCMDataOutput):
+                self.rtcm_output = msg
+            self.satellites.update(msg)
+            if self.log is not None:
+                self.log(msg)
+
+    def _link_status(self, status):
+        # whether the output the receiver is set to fits, by the sizes seen
+        warnings = status.warnings + tuple(
+            capacity_warnings(
+                status.baud,
+                self.measurement_output,
+                self.rtcm_output,
+                self.protocol.frame_sizes,
+            )
+        )
+        # log warnings as they come and go rather than every sample
+        for warning in warnings:
+            if warning not in self.warnings and self.log is not None:
+                self.log(f"{self.name} link: {warning}")
+        self.warnings = warnings
+
+    def record(self, path=None):
+        """Start recording the raw serial output, to a new capture by default"""
+        self.stop_recording()
+        if path is None:
+            path = capture_path(self.name)
+        self.protocol.recorder = Recorder.open(path)
+        return path
+
+    def stop_recording(self):
+        recorder, self.protocol.recorder = self.protocol.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    async def close(self):
+        for task in (self._dispatcher, self._query):
+            if task is not None:
+                task.cancel()
+        self._dispatcher = self._query = None
+        self.monitor.stop()
+        await self.connection.close()
+        self.stop_recording()
+
+
+@attr.s(auto_attribs=True)
+class Receivers:
+    """
+    The connected receivers, by name, and which of them the dashboard shows.
+    In compare mode it shows all of them side by side instead.
+    """
+
+    receivers: dict = attr.ib(factory=dict)
+    active: str = None
+    compare: bool = False
+
+    def __len__(self):
+        return len(self.receivers)
+
+    def __iter__(self):
+        return iter(self.receivers.values())
+
+    def __getitem__(self, name):
+        return self.receivers[name]
+
+    @property
+    def current(self):
+        if self.active is None:
+            return None
+        return self.receivers[self.active]
+
+    def name_for(self, port):
+        """The port's device name, numbered if a receiver already has it"""
+        base = name = os.path.basename(port)
+        n = 2
+        while name in self.receivers:
+            name = f"{base}-{n}"
+            n += 1
+        return name
+
+    def add(self, receiver):
+        if receiver.name in self.receivers:
+            raise ValueError(f"there is already a receiver named {receiver.name}")
+        self.receivers[receiver.name] = receiver
+        self.active = receiver.name
+        receiver.start()
+        return receiver
+
+    async def remove(self, name):
+        receiver = self.receivers.pop(name)
+        if self.active == name:
+            self.active = next(iter(self.receivers), None)
+        await receiver.close()
+
+    def switch(self, step=1):
+        """Show the next receiver, or the previous one for a negative step"""
+        if not self.receivers:
+            return None
+        names = list(self.receivers)
+        self.active = names[(names.index(self.active) + step) % len(names)]
+        return self.current
+
+    async def close(self):
+        for name in list(self.receivers):
+            await self.remove(name)
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import attr
+
+DEFAULT_FPS = 10.0
+MIN_FPS = 1.0
+# the most of the loop's time drawing may take, the rest is left for reading
+MAX_RENDER_SHARE = 0.25
+# weight of the newest render in the running average
+RENDER_TIME_WEIGHT = 0.2
+
+
+@attr.s(auto_attribs=True)
+class RedrawScheduler:
+    """
+    Coalesces changes into at most fps redraws a second. Panels call
+    mark_dirty when their data changes and the application is invalidated once
+    per frame, and only when something changed. Every render is timed and the
+    frame rate drops so drawing never takes more than max_render_share of the
+    event loop, leaving it free to read the serial port.
+    """
+
+    fps: float = DEFAULT_FPS
+    min_fps: float = MIN_FPS
+    max_render_share: float = MAX_RENDER_SHARE
+    clock: object = attr.ib(default=time.perf_counter, repr=False)
+    app: object = attr.ib(default=None, repr=False)
+    render_time: float = 0.0
+    renders: int = 0
+    dirty: set = attr.ib(factory=set, repr=False)
+    _last_redraw: float = None
+    _render_start: float = None
+    _handle: asyncio.TimerHandle = attr.ib(default=None, repr=False)
+
+    def attach(self, app):
+        self.app = app
+        app.before_render += self._before_render
+        app.after_render += self._after_render
+
+    @property
+    def interval(self):
+        """Seconds between redraws, longer than 1 / fps when drawing is slow"""
+        interval = max(1.0 / self.fps, self.render_time / self.max_render_share)
+        return min(interval, 1.0 / self.min_fps)
+
+    def mark_dirty(self, panel):
+        self.dirty.add(panel)
+        if self._handle is not None or self.app is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        delay = 0.0
+        if self._last_redraw is not None:
+            delay = self._last_redraw + self.interval - self.clock()
+        if delay > 0:
+            self._handle = loop.call_later(delay, self._redraw)
+        else:
+            self._handle = loop.call_soon(self._redraw)
+
+    def _redraw(self):
+        self._handle = None
+        if not self.dirty:
+            return
+        self._last_redraw = self.clock()
+        self.app.invalidate()
+
+    def _before_render(self, app):
+        self._render_start = self.clock()
+
+    def _after_render(self, app):
+        # everything marked before drawing started is on screen now
+        self.dirty.clear()
+        if self._render_start is None:
+            return
+
+        elapsed = self.clock() - self._render_start
+        self._render_start = None
+        if self.renders:
+            self.render_time += RENDER_TIME_WEIGHT * (elapsed - self.render_time)
+        else:
+            self.render_time = elapsed
+        self.renders += 1
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
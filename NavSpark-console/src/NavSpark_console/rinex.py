@@ -0,0 +1,431 @@
+import datetime
+
+import attr
+
+from NavSpark_console import __version__
+from NavSpark_console.protocol import (
+    ExtendedRawMeasurements,
+    ExtendedRawChannelIndicator,
+    GNSSType,
+    MeasurementTimeInformation,
+    ReceiverNavigationStatus,
+)
+from NavSpark_console.ephemeris import GPSEphemerisCache
+from NavSpark_console.beidou import BeidouEphemerisCache
+from NavSpark_console.glonass import GLONASSOrbitPropagator, MOSCOW_OFFSET
+from NavSpark_console.cycle_slip import CycleSlipDetector, GLONASS_CHANNEL_OFFSET
+from NavSpark_console.positioning import DEFAULT_LEAP_SECONDS
+from NavSpark_console.capture import replay
+
+RINEX_VERSION = "3.04"
+PROGRAM = f"pyNavSpark {__version__}"
+
+GPS_EPOCH = datetime.datetime(1980, 1, 6)
+BDT_EPOCH = datetime.datetime(2006, 1, 1)
+
+SYSTEM_LETTERS = {
+    GNSSType.GPS: "G",
+    GNSSType.SBAS: "S",
+    GNSSType.GLONASS: "R",
+    GNSSType.GALILEO: "E",
+    GNSSType.QZSS: "J",
+    GNSSType.BEIDOU: "C",
+    GNSSType.IRNSS: "I",
+}
+
+# band and tracking attribute of each signal_type
+OBSERVATION_CODES = {
+    (GNSSType.GPS, 0): "1C",
+    (GNSSType.GPS, 1): "1X",
+    (GNSSType.GPS, 2): "2L",
+    (GNSSType.GPS, 4): "5Q",
+    (GNSSType.SBAS, 0): "1C",
+    (GNSSType.GLONASS, 0): "1C",
+    (GNSSType.GLONASS, 2): "2C",
+    (GNSSType.GALILEO, 0): "1C",
+    (GNSSType.GALILEO, 4): "5Q",
+    (GNSSType.GALILEO, 5): "7Q",
+    (GNSSType.GALILEO, 6): "6C",
+    (GNSSType.QZSS, 0): "1C",
+    (GNSSType.QZSS, 1): "1X",
+    (GNSSType.QZSS, 2): "2L",
+    (GNSSType.QZSS, 4): "5Q",
+    (GNSSType.BEIDOU, 0): "2I",
+    (GNSSType.BEIDOU, 1): "1P",
+    (GNSSType.BEIDOU, 4): "5P",
+    (GNSSType.BEIDOU, 5): "7I",
+    (GNSSType.BEIDOU, 7): "6I",
+    (GNSSType.IRNSS, 4): "5A",
+}
+
+# pseudorange, carrier phase, Doppler and signal strength for every code
+OBSERVABLES = "CLDS"
+
+# the receiver's GLONASS code-phase biases aren't known
+GLONASS_BIASES = ("C1C", "C1P", "C2C", "C2P")
+
+# GPS URA index to metres
+URA_METRES = (2.4, 3.4, 4.85, 6.85, 9.65, 13.65, 24.0, 48.0, 96.0, 192.0, 384.0)
+URA_METRES += (768.0, 1536.0, 3072.0, 6144.0)
+
+
+def header_line(content, label):
+    return f"{content:<60.60}{label}\n"
+
+
+def satellite_id(gnss_type, svid):
+    if gnss_type == GNSSType.SBAS:
+        svid -= 100
+    elif gnss_type == GNSSType.QZSS and svid > 192:
+        svid -= 192
+    return f"{SYSTEM_LETTERS[gnss_type]}{svid:02d}"
+
+
+def observation_types():
+    """The observation types of every system, in the order they're written"""
+    types = {}
+    for (gnss_type, _), code in OBSERVATION_CODES.items():
+        codes = types.setdefault(gnss_type, [])
+        codes.extend(o + code for o in OBSERVABLES)
+    return types
+
+
+def gps_datetime(week, tow):
+    return GPS_EPOCH + datetime.timedelta(weeks=week, seconds=tow)
+
+
+def glonass_channels(msg):
+    """The frequency channel of each GLONASS slot in ExtendedRawMeasurements"""
+    return {
+        m.svid: m.frequency_id - GLONASS_CHANNEL_OFFSET
+        for m in msg.sub_messages
+        if m.gnss_type == GNSSType.GLONASS
+    }
+
+
+def format_epoch(t):
+    seconds = t.second + t.microsecond / 1e6
+    return (
+        f"{t.year:4d} {t.month:02d} {t.day:02d} {t.hour:02d} {t.minute:02d}"
+        f"{seconds:11.7f}"
+    )
+
+
+def format_toc(letter, svid, t):
+    return (
+        f"{letter}{svid:02d} {t.year:4d} {t.month:02d} {t.day:02d}"
+        f" {t.hour:02d} {t.minute:02d} {t.second:02d}"
+    )
+
+
+def format_values(*values):
+    return "".join(f"{v:19.12E}" for v in values)
+
+
+@attr.s(auto_attribs=True)
+class RinexObservationWriter:
+    """
+    Streams ExtendedRawMeasurements to a RINEX 3 observation file. The header
+    lists every signal the receiver can report, so it can be written before the
+    first epoch and nothing has to be held back. Each epoch is one write to fp.
+    """
+
+    fp: object
+    marker_name: str = "NAVSPARK"
+    receiver_type: str = "SKYTRAQ"
+    approx_position: tuple = (0.0, 0.0, 0.0)
+    slips: CycleSlipDetector = attr.ib(factory=CycleSlipDetector)
+    epochs: int = 0
+
+    def __attrs_post_init__(self):
+        self.types = observation_types()
+        # where each observation goes in the line of its system
+        self._columns = {
+            key: self.types[key[0]].index("C" + code)
+            for key, code in OBSERVATION_CODES.items()
+        }
+
+    def write_header(self, first_epoch, glonass=None):
+        """glonass is the frequency channel of each slot, as far as it's known"""
+        now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d %H%M%S UTC")
+        lines = [
+            header_line(
+                f"{RINEX_VERSION:>9}{'':11}{'OBSERVATION DATA':<20}M",
+                "RINEX VERSION / TYPE",
+            ),
+            header_line(f"{PROGRAM:<20.20}{'':20}{now}", "PGM / RUN BY / DATE"),
+            header_line(self.marker_name, "MARKER NAME"),
+            header_line("", "OBSERVER / AGENCY"),
+            header_line(f"{'':20}{self.receiver_type:<20}", "REC # / TYPE / VERS"),
+            header_line("", "ANT # / TYPE"),
+            header_line(
+                "".join(f"{v:14.4f}" for v in self.approx_position),
+                "APPROX POSITION XYZ",
+            ),
+            header_line(f"{0.0:14.4f}{0.0:14.4f}{0.0:14.4f}", "ANTENNA: DELTA H/E/N"),
+        ]
+
+        for gnss_type, types in self.types.items():
+            letter = SYSTEM_LETTERS[gnss_type]
+            for i in range(0, len(types), 13):
+                head = f"{letter}  {len(types):3d}" if i == 0 else " " * 6
+                lines.append(
+                    header_line(
+                        head + "".join(f" {t}" for t in types[i : i + 13]),
+                        "SYS / # / OBS TYPES",
+                    )
+                )
+
+        t = first_epoch
+        seconds = t.second + t.microsecond / 1e6
+        lines.append(
+            header_line(
+                f"{t.year:6d}{t.month:6d}{t.day:6d}{t.hour:6d}{t.minute:6d}"
+                f"{seconds:13.7f}     GPS",
+                "TIME OF FIRST OBS",
+            )
+        )
+
+        for gnss_type, types in self.types.items():
+            letter = SYSTEM_LETTERS[gnss_type]
+            for obs in types:
+                if obs[0] == "L":
+                    lines.append(
+                        header_line(f"{letter} {obs} {0.0:8.5f}", "SYS / PHASE SHIFT")
+                    )
+
+        slots = sorted((glonass or {}).items())
+        for i in range(0, max(len(slots), 1), 8):
+            head = f"{len(slots):3d} " if i == 0 else " " * 4
+            lines.append(
+                header_line(
+                    head
+                    + "".join(
+                        f"{satellite_id(GNSSType.GLONASS, slot)} {k:2d} "
+                        for slot, k in slots[i : i + 8]
+                    ),
+                    "GLONASS SLOT / FRQ #",
+                )
+            )
+        lines.append(
+            header_line(
+                "".join(f" {code} {0.0:8.3f}" for code in GLONASS_BIASES),
+                "GLONASS COD/PHS/BIS",
+            )
+        )
+        lines.append(header_line("", "END OF HEADER"))
+        self.fp.write("".join(lines))
+
+    def update(self, msg):
+        if not isinstance(msg, ExtendedRawMeasurements):
+            return
+
+        t = gps_datetime(msg.receiver_wn, msg.tow / 1000.0)
+        if self.epochs == 0:
+            # the header can only list the GLONASS slots tracked at the start
+            self.write_header(t, glonass_channels(msg))
+
+        # loss of lock as far as the slip detector can tell
+        epoch = self.slips.update(msg)
+        slipped = {
+            (int(g), int(s), int(st))
+            for g, s, st, slip in zip(
+                epoch.gnss_type, epoch.svid, epoch.signal_type, epoch.slip
+            )
+            if slip
+        }
+
+        satellites = {}
+        for m in msg.sub_messages:
+            key = (int(m.gnss_type), m.signal_type)
+            column = self._columns.get(key)
+            if column is None:
+                continue
+
+            sat = (int(m.gnss_type), m.svid)
+            fields = satellites.get(sat)
+            if fields is None:
+                fields = satellites[sat] = [" " * 16] * len(self.types[m.gnss_type])
+
+            flags = m.channel_indicator
+            lli = 0
+            if (int(m.gnss_type), m.svid, m.signal_type) in slipped:
+                lli |= 1
+            if flags & ExtendedRawChannelIndicator.unknown_half_cycle_ambiguity:
+                lli |= 2
+            ssi = min(max(m.cn0 // 6, 1), 9)
+
+            if flags & ExtendedRawChannelIndicator.pseudorange_available:
+                fields[column] = f"{m.pseudorange:14.3f} {ssi}"
+            if flags & ExtendedRawChannelIndicator.carrier_phase_available:
+                fields[column + 1] = (
+                    f"{m.accumulated_carrier_cycle:14.3f}{lli or ' '}{ssi}"
+                )
+            if flags & ExtendedRawChannelIndicator.doppler_frequency:
+                fields[column + 2] = f"{m.doppler_frequency:14.3f}  "
+            fields[column + 3] = f"{m.cn0:14.3f}  "
+
+        lines = [f"> {format_epoch(t)}  0{len(satellites):3d}\n"]
+        for (gnss_type, svid), fields in sorted(satellites.items()):
+            lines.append(
+                satellite_id(gnss_type, svid) + "".join(fields).rstrip() + "\n"
+            )
+        self.fp.write("".join(lines))
+        self.epochs += 1
+
+
+@attr.s(auto_attribs=True)
+class RinexNavigationWriter:
+    """
+    Writes a RINEX 3 navigation record for every new GPS, BeiDou and GLONASS
+    ephemeris. The GPS week in the ephemeris is only 10 bits, and GLONASS times
+    are times of day, so records wait until a message with the full GPS time
+    has been seen.
+    """
+
+    fp: object
+    leap_seconds: int = DEFAULT_LEAP_SECONDS
+    gps: GPSEphemerisCache = attr.ib(factory=GPSEphemerisCache)
+    beidou: BeidouEphemerisCache = attr.ib(factory=BeidouEphemerisCache)
+    glonass: GLONASSOrbitPropagator = attr.ib(factory=GLONASSOrbitPropagator)
+    week: int = None
+    tow: float = None
+    records: int = 0
+    _written: dict = attr.ib(factory=dict, repr=False)
+
+    def write_header(self):
+        now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d %H%M%S UTC")
+        self.fp.write(
+            header_line(
+                f"{RINEX_VERSION:>9}{'':11}{'N: GNSS NAV DATA':<20}M",
+                "RINEX VERSION / TYPE",
+            )
+            + header_line(f"{PROGRAM:<20.20}{'':20}{now}", "PGM / RUN BY / DATE")
+            + header_line(f"{self.leap_seconds:6d}", "LEAP SECONDS")
+            + header_line("", "END OF HEADER")
+        )
+
+    def update(self, msg):
+        if isinstance(msg, ExtendedRawMeasurements):
+            self.week, self.tow = msg.receiver_wn, msg.tow / 1000.0
+        elif isinstance(msg, MeasurementTimeInformation):
+            self.week, self.tow = msg.receiver_wn, msg.receiver_tow / 1000.0
+        elif isinstance(msg, ReceiverNavigationStatus):
+            self.week, self.tow = msg.week_number, msg.time_of_week
+        else:
+            self.gps.update(msg)
+            self.beidou.update(msg)
+            self.glonass.update(msg)
+
+        if self.week is None:
+            return
+
+        for letter, cache, record in (
+            ("G", self.gps, self._gps_record),
+            ("C", self.beidou, self._beidou_record),
+            ("R", self.glonass, self._glonass_record),
+        ):
+            for svid, eph in cache.ephemerides.items():
+                # GPSEphemeris decodes a new dict even when nothing changed
+                previous = self._written.get((letter, svid))
+                if previous is eph or previous == eph:
+                    continue
+                self._written[letter, svid] = eph
+                self._write(record(svid, eph))
+
+    def _write(self, record):
+        if self.records == 0:
+            self.write_header()
+        self.fp.write(record)
+        self.records += 1
+
+    def _gps_week(self, week):
+        # the broadcast week wraps every 1024 weeks
+        return week + 1024 * round((self.week - week) / 1024)
+
+    def _gps_record(self, svid, eph):
+        week = self._gps_week(eph["week_number"])
+        toc = gps_datetime(week, eph["t_oc"])
+        ura = URA_METRES[min(eph["ura_index"], len(URA_METRES) - 1)]
+        lines = (
+            format_toc("G", svid, toc)
+            + format_values(eph["a_f0"], eph["a_f1"], eph["a_f2"]),
+            format_values(eph["iode"], eph["C_rs"], eph["delta_n"], eph["M_0"]),
+            format_values(eph["C_uc"], eph["e"], eph["C_us"], eph["root_a"]),
+            format_values(eph["t_oe"], eph["C_ic"], eph["Omega_0"], eph["C_is"]),
+            format_values(eph["I_0"], eph["C_rc"], eph["omega"], eph["Omega_dot"]),
+            format_values(eph["IDOT"], 0.0, week, 0.0),
+            format_values(ura, eph["sv_health"], eph["t_gd"], eph["iodc"]),
+            format_values(self.tow, 4.0 if not eph["fit_interval_flag"] else 6.0),
+        )
+        return lines[0] + "\n" + "".join(f"    {line}\n" for line in lines[1:])
+
+    def _beidou_record(self, svid, eph):
+        week = eph["week_number"]
+        toc = BDT_EPOCH + datetime.timedelta(weeks=week, seconds=eph["t_oc"])
+        lines = (
+            format_toc("C", svid, toc)
+            + format_values(eph["a_f0"], eph["a_f1"], eph["a_f2"]),
+            format_values(eph["aode"], eph["C_rs"], eph["delta_n"], eph["M_0"]),
+            format_values(eph["C_uc"], eph["e"], eph["C_us"], eph["root_a"]),
+            format_values(eph["t_oe"], eph["C_ic"], eph["Omega_0"], eph["C_is"]),
+            format_values(eph["I_0"], eph["C_rc"], eph["omega"], eph["Omega_dot"]),
+            format_values(eph["IDOT"], 0.0, week, 0.0),
+            format_values(
+                URA_METRES[min(eph["urai"], len(URA_METRES) - 1)],
+                eph["sat_h1"],
+                eph["t_gd1"],
+                eph["t_gd2"],
+            ),
+            format_values(self.tow - 14.0, eph["aodc"]),
+        )
+        return lines[0] + "\n" + "".join(f"    {line}\n" for line in lines[1:])
+
+    def _glonass_utc(self, seconds_of_day):
+        """A Moscow time of day near the current time as a UTC datetime"""
+        now = gps_datetime(self.week, self.tow - self.leap_seconds)
+        moscow = now + datetime.timedelta(seconds=MOSCOW_OFFSET)
+        day = datetime.datetime(moscow.year, moscow.month, moscow.day)
+        t = day + datetime.timedelta(seconds=seconds_of_day - MOSCOW_OFFSET)
+        # the ephemeris can belong to the day before or after
+        for days in (-1, 1):
+            other = t + datetime.timedelta(days=days)
+            if abs(other - now) < abs(t - now):
+                t = other
+        return t
+
+    def _glonass_record(self, slot, eph):
+        toc = self._glonass_utc(eph["t_b"])
+        frame = self._glonass_utc(eph["t_k"])
+        week_start = frame - datetime.timedelta(
+            days=(frame.weekday() + 1) % 7,
+            hours=frame.hour,
+            minutes=frame.minute,
+            seconds=frame.second,
+            microseconds=frame.microsecond,
+        )
+        x, y, z = (v / 1000.0 for v in eph["position"])
+        vx, vy, vz = (v / 1000.0 for v in eph["velocity"])
+        ax, ay, az = (v / 1000.0 for v in eph["acceleration"])
+        k = eph["k"] if eph["k"] is not None else 0
+        lines = (
+            format_toc("R", slot, toc)
+            + format_values(
+                -eph["tau_n"], eph["gamma_n"], (frame - week_start).total_seconds()
+            ),
+            format_values(x, vx, ax, eph["health"]),
+            format_values(y, vy, ay, k),
+            format_values(z, vz, az, eph["E_n"]),
+        )
+        return lines[0] + "\n" + "".join(f"    {line}\n" for line in lines[1:])
+
+
+def convert_capture(capture_fp, obs_fp, nav_fp=None, **kwargs):
+    """Write RINEX observation and navigation files from a raw capture"""
+    obs = RinexObservationWriter(obs_fp, **kwargs)
+    nav = RinexNavigationWriter(nav_fp) if nav_fp is not None else None
+    for msg in replay(capture_fp):
+        obs.update(msg)
+        if nav is not None:
+            nav.update(msg)
+    return obs, nav
@@ -0,0 +1,316 @@
+import attr
+import bitstruct
+import numpy as np
+
+RTCM_PREAMBLE = 0xD3
+# preamble, 6 reserved bits and the 10 bit length
+RTCM_HEADER_LENGTH = 3
+RTCM_CRC_LENGTH = 3
+MAX_RTCM_LENGTH = 0x3FF
+
+CRC24Q_POLYNOMIAL = 0x1864CFB
+
+# metres light travels in one millisecond, the unit of MSM ranges
+LIGHT_MILLISECOND = 299792.458
+
+# the first MSM1 message number of each system, MSMn is this plus n - 1
+MSM_SYSTEMS = {
+    1071: "G",
+    1081: "R",
+    1091: "E",
+    1101: "S",
+    1111: "J",
+    1121: "C",
+}
+
+# RINEX band and attribute of the MSM signal ids
+SIGNAL_CODES = {
+    "G": {
+        2: "1C", 3: "1P", 4: "1W", 8: "2C", 9: "2P", 10: "2W", 15: "2S",
+        16: "2L", 17: "2X", 22: "5I", 23: "5Q", 24: "5X", 30: "1S", 31: "1L",
+        32: "1X",
+    },
+    "R": {2: "1C", 3: "1P", 8: "2C", 9: "2P"},
+    "E": {
+        2: "1C", 3: "1A", 4: "1B", 5: "1X", 6: "1Z", 8: "6C", 9: "6A",
+        10: "6B", 11: "6X", 12: "6Z", 14: "7I", 15: "7Q", 16: "7X", 18: "8I",
+        19: "8Q", 20: "8X", 22: "5I", 23: "5Q", 24: "5X",
+    },
+    "S": {2: "1C", 22: "5I", 23: "5Q", 24: "5X"},
+    "J": {
+        2: "1C", 9: "6S", 10: "6L", 11: "6X", 15: "2S", 16: "2L", 17: "2X",
+        22: "5I", 23: "5Q", 24: "5X", 30: "1S", 31: "1L", 32: "1X",
+    },
+    "C": {
+        2: "2I", 3: "2Q", 4: "2X", 8: "6I", 9: "6Q", 10: "6X", 14: "7I",
+        15: "7Q", 16: "7X",
+    },
+}  # fmt: skip
+
+station_position = bitstruct.compile("u12u12u6b1b1b1b1s38b1p1s38u2s38")
+antenna_height = bitstruct.compile("u16")
+# everything up to the cell mask
+msm_header = bitstruct.compile("u12u12u30b1u3p7u2u2b1u3")
+MSM_HEADER_BITS = 73
+MSM_MASK_BITS = 64 + 32
+
+# DF400, DF401, DF405, DF406 and DF404 use the most negative value for "no data"
+MSM4_CELLS = ((15, True), (22, True), (4, False), (1, False), (6, False))
+MSM7_CELLS = ((20, True), (24, True), (10, False), (1, False), (10, False))
+MSM7_CELLS += ((15, True),)
+
+
+def _crc24q_table():
+    table = []
+    for i in range(256):
+        crc = i << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= CRC24Q_POLYNOMIAL
+        table.append(crc & 0xFFFFFF)
+    return tuple(table)
+
+
+CRC24Q_TABLE = _crc24q_table()
+
+
+def crc24q(data, crc=0):
+    """The Qualcomm CRC-24 RTCM3 frames end with, a byte at a time"""
+    table = CRC24Q_TABLE
+    for b in data:
+        crc = ((crc << 8) & 0xFFFFFF) ^ table[(crc >> 16) ^ b]
+    return crc
+
+
+def frame(payload):
+    """Wrap a message in an RTCM3 frame"""
+    header = bytes((RTCM_PREAMBLE, len(payload) >> 8, len(payload) & 0xFF))
+    body = header + bytes(payload)
+    return body + crc24q(body).to_bytes(3, "big")
+
+
+def message_number(payload):
+    return (payload[0] << 4) | (payload[1] >> 4)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class RTCMMessage:
+    """Any RTCM3 message there's no decoder for"""
+
+    message_number: int
+    payload: bytes = attr.ib(repr=False)
+    arrival_ns: int = attr.ib(default=None, repr=False, eq=False)
+    source: str = attr.ib(default=None, repr=False, eq=False)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class StationPosition:
+    """1005 and 1006, the ECEF antenna reference point of a base station"""
+
+    message_number: int
+    station_id: int
+    itrf_year: int
+    gps: bool
+    glonass: bool
+    galileo: bool
+    reference_station: bool
+    x: float
+    y: float
+    z: float
+    single_receiver_oscillator: bool
+    quarter_cycle: int
+    antenna_height: float = 0.0
+    arrival_ns: int = attr.ib(default=None, repr=False, eq=False)
+    source: str = attr.ib(default=None, repr=False, eq=False)
+
+    @classmethod
+    def unpack(cls, payload, **kwargs):
+        values = station_position.unpack(payload)
+        number, *flags, x, single, y, quarter, z = values
+        height = 0.0
+        if number == 1006:
+            (height,) = antenna_height.unpack_from(payload, offset=152)
+            height *= 1e-4
+        return cls(
+            number,
+            *flags,
+            x * 1e-4,
+            y * 1e-4,
+            z * 1e-4,
+            single,
+            quarter,
+            height,
+            **kwargs,
+        )
+
+    def __bytes__(self):
+        payload = station_position.pack(
+            self.message_number,
+            self.station_id,
+            self.itrf_year,
+            self.gps,
+            self.glonass,
+            self.galileo,
+            self.reference_station,
+            round(self.x * 1e4),
+            self.single_receiver_oscillator,
+            round(self.y * 1e4),
+            self.quarter_cycle,
+            round(self.z * 1e4),
+        )
+        if self.message_number == 1006:
+            payload += antenna_height.pack(round(self.antenna_height * 1e4))
+        return payload
+
+
+# place values of the bits of every field width, most significant first
+FIELD_WEIGHTS = {
+    width: np.left_shift(1, np.arange(width - 1, -1, -1, dtype=np.int64))
+    for width in range(1, 25)
+}
+
+
+def _fields(bits, pos, count, width, signed):
+    """count consecutive width bit fields starting at bit pos"""
+    end = pos + count * width
+    values = bits[pos:end].reshape(count, width) @ FIELD_WEIGHTS[width]
+    if signed:
+        values[values >= 1 << (width - 1)] -= 1 << width
+    return values, end
+
+
+def _invalid(values, width):
+    return values == -(1 << (width - 1))
+
+
+@attr.s(auto_attribs=True, frozen=True, eq=False)
+class MSMObservations:
+    """
+    The observations of one system in an MSM4 or MSM7 message. epoch_time is
+    milliseconds of the week in the system's own time scale, except for GLONASS
+    where it's the day of the week in the top 3 bits and milliseconds of the
+    day below them. Satellite arrays are indexed by satellite, cell arrays by
+    cell with cell_satellite and cell_signal saying which it belongs to. Ranges
+    are in metres, NaN when the message marks them invalid.
+    """
+
+    message_number: int
+    system: str
+    msm: int
+    station_id: int
+    epoch_time: int
+    multiple_message: bool
+    iods: int
+    clock_steering: int
+    external_clock: int
+    smoothing: bool
+    smoothing_interval: int
+    satellites: np.ndarray
+    signals: np.ndarray
+    cell_satellite: np.ndarray
+    cell_signal: np.ndarray
+    pseudorange: np.ndarray
+    phase_range: np.ndarray
+    lock_time_indicator: np.ndarray
+    half_cycle: np.ndarray
+    cn0: np.ndarray
+    # MSM7 only
+    phase_range_rate: np.ndarray = None
+    extended_info: np.ndarray = None
+    arrival_ns: int = attr.ib(default=None, repr=False)
+    source: str = attr.ib(default=None, repr=False, eq=False)
+
+    def signal_codes(self):
+        """The RINEX code of every cell, None for ids without one"""
+        codes = SIGNAL_CODES[self.system]
+        return [codes.get(int(s)) for s in self.cell_signal]
+
+    @classmethod
+    def unpack(cls, payload, **kwargs):
+        number, *header = msm_header.unpack(payload)
+        first = number - (number - 1071) % 10
+        system = MSM_SYSTEMS[first]
+        msm = number - first + 1
+
+        bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+        pos = MSM_HEADER_BITS
+        satellites = np.flatnonzero(bits[pos : pos + 64]) + 1
+        signals = np.flatnonzero(bits[pos + 64 : pos + MSM_MASK_BITS]) + 1
+        pos += MSM_MASK_BITS
+
+        n_sat, n_sig = len(satellites), len(signals)
+        cells = bits[pos : pos + n_sat * n_sig].reshape(n_sat, n_sig)
+        cell_sat, cell_sig = np.nonzero(cells)
+        n_cell = len(cell_sat)
+        pos += n_sat * n_sig
+
+        rough_ms, pos = _fields(bits, pos, n_sat, 8, False)
+        if msm == 7:
+            extended_info, pos = _fields(bits, pos, n_sat, 4, False)
+        rough_mod, pos = _fields(bits, pos, n_sat, 10, False)
+        if msm == 7:
+            rough_rate, pos = _fields(bits, pos, n_sat, 14, True)
+
+        rough = rough_ms + rough_mod * 2.0**-10
+        rough[rough_ms == 0xFF] = np.nan
+        rough = rough[cell_sat]
+
+        layout = MSM7_CELLS if msm == 7 else MSM4_CELLS
+        values = []
+        for width, signed in layout:
+            v, pos = _fields(bits, pos, n_cell, width, signed)
+            values.append(v)
+
+        if msm == 7:
+            fine_pr, fine_phase, lock, half, cn0, fine_rate = values
+            pr_scale, phase_scale, cn0_scale = 2.0**-29, 2.0**-31, 2.0**-4
+        else:
+            fine_pr, fine_phase, lock, half, cn0 = values
+            pr_scale, phase_scale, cn0_scale = 2.0**-24, 2.0**-29, 1.0
+
+        pseudorange = (rough + fine_pr * pr_scale) * LIGHT_MILLISECOND
+        pseudorange[_invalid(fine_pr, layout[0][0])] = np.nan
+        phase_range = (rough + fine_phase * phase_scale) * LIGHT_MILLISECOND
+        phase_range[_invalid(fine_phase, layout[1][0])] = np.nan
+
+        msm7 = {}
+        if msm == 7:
+            rate = rough_rate.astype(float)
+            rate[rough_rate == -(1 << 13)] = np.nan
+            phase_range_rate = rate[cell_sat] + fine_rate * 1e-4
+            phase_range_rate[_invalid(fine_rate, 15)] = np.nan
+            msm7 = dict(phase_range_rate=phase_range_rate, extended_info=extended_info)
+
+        return cls(
+            number,
+            system,
+            msm,
+            *header,
+            satellites,
+            signals,
+            satellites[cell_sat],
+            signals[cell_sig],
+            pseudorange,
+            phase_range,
+            lock,
+            half.astype(bool),
+            cn0 * cn0_scale,
+            **msm7,
+            **kwargs,
+        )
+
+
+RTCM_MESSAGES = {1005: StationPosition, 1006: StationPosition}
+# MSM4 and MSM7 of every system
+RTCM_MESSAGES.update((n + i, MSMObservations) for n in MSM_SYSTEMS for i in (3, 6))
+
+
+def unpack_rtcm(payload, **kwargs):
+    """Decode the payload of an RTCM3 frame"""
+    number = message_number(payload)
+    try:
+        msg_cls = RTCM_MESSAGES[number]
+    except KeyError:
+        return RTCMMessage(number, bytes(payload), **kwargs)
+    return msg_cls.unpack(payload, **kwargs)
@@ -0,0 +1,445 @@
+import functools
+import math
+
+import attr
+import numpy as np
+
+from NavSpark_console.protocol import (
+    BasePositionMode,
+    ConfigureBasePositionOutput,
+    ExtendedRawMeasurements,
+    ExtendedRawChannelIndicator,
+    GNSSType,
+)
+from NavSpark_console.rtcm import (
+    LIGHT_MILLISECOND,
+    MAX_RTCM_LENGTH,
+    MSM_HEADER_BITS,
+    MSM_MASK_BITS,
+    MSM4_CELLS,
+    MSM7_CELLS,
+    SIGNAL_CODES,
+    StationPosition,
+    frame,
+    msm_header,
+)
+from NavSpark_console.rinex import OBSERVATION_CODES, SYSTEM_LETTERS
+from NavSpark_console.coordinates import geodetic_to_ecef
+from NavSpark_console.cycle_slip import wavelengths
+from NavSpark_console.glonass import MOSCOW_OFFSET
+from NavSpark_console.beidou import BDT_GPS_OFFSET
+from NavSpark_console.signal_quality import SignalIndex, MAX_SIGNALS
+from NavSpark_console.positioning import DEFAULT_LEAP_SECONDS
+
+WEEK_MS = 604800000
+DAY_MS = 86400000
+
+# MSM1 message number and the svid of satellite 1 for every system
+MSM_SYSTEMS = {
+    GNSSType.GPS: (1071, 1),
+    GNSSType.GLONASS: (1081, 1),
+    GNSSType.GALILEO: (1091, 1),
+    GNSSType.SBAS: (1101, 120),
+    GNSSType.QZSS: (1111, 193),
+    GNSSType.BEIDOU: (1121, 1),
+}
+
+
+def _msm_signal_ids():
+    """MSM signal id of every gnss_type * 16 + signal_type, 0 for none"""
+    ids = np.zeros(16 * 16, dtype=np.int64)
+    for (gnss_type, signal_type), code in OBSERVATION_CODES.items():
+        if gnss_type in MSM_SYSTEMS:
+            codes = SIGNAL_CODES[SYSTEM_LETTERS[gnss_type]]
+            by_code = {c: i for i, c in codes.items()}
+            ids[gnss_type * 16 + signal_type] = by_code.get(code, 0)
+    return ids
+
+
+MSM_SIGNAL_IDS = _msm_signal_ids()
+# svid of MSM satellite 1 by gnss_type, systems without MSM are out of range
+MSM_FIRST_SVID = np.full(16, 1 << 16, dtype=np.int64)
+MSM_FIRST_SVID[list(MSM_SYSTEMS)] = [svid for _, svid in MSM_SYSTEMS.values()]
+
+# field widths of the satellite data
+MSM4_SATELLITES = (8, 10)
+MSM7_SATELLITES = (8, 4, 10, 14)
+
+# scale of the fine pseudorange, fine phase range and CN0 fields in ms and dB-Hz
+MSM4_SCALES = (2.0**-24, 2.0**-29, 1.0)
+MSM7_SCALES = (2.0**-29, 2.0**-31, 2.0**-4)
+
+# the most cells one message can carry
+MAX_CELLS = 64
+# seconds between station position messages
+STATION_INTERVAL = 10
+
+
+@functools.lru_cache(maxsize=None)
+def bit_layout(widths, count):
+    """
+    Where every bit comes from when count values of each field follow each
+    other, one field after another: the index into the flattened (fields,
+    count) values and the shift that brings the bit down.
+    """
+    index = []
+    shift = []
+    for field, width in enumerate(widths):
+        index.append(field * count + np.repeat(np.arange(count), width))
+        shift.append(np.tile(np.arange(width - 1, -1, -1), count))
+    return np.concatenate(index), np.concatenate(shift)
+
+
+def _put_fields(bits, pos, values, widths):
+    """Write the rows of values as two's complement fields of widths"""
+    values = np.array(values, dtype=np.int64)
+    index, shift = bit_layout(widths, values.shape[1])
+    end = pos + len(index)
+    bits[pos:end] = (values.ravel()[index] >> shift) & 1
+    return end
+
+
+def _fine(values, width):
+    """Round to a signed field, out of range values get the "no data" code"""
+    invalid = -(1 << (width - 1))
+    values = np.round(values)
+    with np.errstate(invalid="ignore"):
+        fine = np.where(np.abs(values) < -invalid, values, invalid)
+    return fine.astype(np.int64)
+
+
+def msm4_lock_time(ms):
+    """DF402, 0 below 32 ms and then one step per doubling up to 15"""
+    ms = np.asarray(ms, dtype=np.int64)
+    steps = np.floor(np.log2(np.maximum(ms, 1))).astype(np.int64) - 4
+    return np.clip(steps, 0, 15)
+
+
+def msm7_lock_time(ms):
+    """
+    DF407, milliseconds up to 64 and then 32 steps for each doubling with the
+    resolution halving every time, up to 704
+    """
+    ms = np.asarray(ms, dtype=np.int64)
+    band = np.floor(np.log2(np.maximum(ms, 1))).astype(np.int64) - 5
+    band = np.clip(band, 1, 21)
+    indicator = np.where(ms < 64, ms, 32 * band + (ms >> band))
+    return np.clip(indicator, 0, 704)
+
+
+@attr.s(auto_attribs=True)
+class MSMEncoder:
+    """
+    Builds RTCM3 MSM4 or MSM7 frames, one per system, from every
+    ExtendedRawMeasurements so the host can act as a base station. The carrier
+    phase of each signal is shifted by a whole number of cycles to sit next to
+    its pseudorange, and that shift only changes when a new arc starts. A
+    1005/1006 station position frame goes out every station_interval seconds
+    once ConfigureBasePositionOutput says the base is in static mode.
+    """
+
+    station_id: int = 0
+    msm: int = 7
+    antenna_height: float = 0.0
+    station_interval: int = STATION_INTERVAL
+    leap_seconds: int = DEFAULT_LEAP_SECONDS
+    max_signals: int = MAX_SIGNALS
+    station: StationPosition = None
+    _last_station: int = None
+
+    def __attrs_post_init__(self):
+        n = self.max_signals
+        self.index = SignalIndex(n)
+        # whole cycles added to the phase of every signal, NaN between arcs
+        self.offset = np.full(n, np.nan)
+        self.lock_start = np.zeros(n, dtype=np.int64)
+        # one bit per byte, reused for every message
+        self._bits = np.zeros(MAX_RTCM_LENGTH * 8, dtype=np.uint8)
+
+        cells = MSM7_CELLS if self.msm == 7 else MSM4_CELLS
+        self.cell_widths = tuple(w for w, _ in cells)
+        self.satellite_widths = MSM7_SATELLITES if self.msm == 7 else MSM4_SATELLITES
+        self.scales = MSM7_SCALES if self.msm == 7 else MSM4_SCALES
+        self.lock_time = msm7_lock_time if self.msm == 7 else msm4_lock_time
+
+    def update(self, msg):
+        """The frames to send for msg, if any"""
+        if isinstance(msg, ConfigureBasePositionOutput):
+            self.set_station(msg)
+            return [self.station_frame()] if self.station else []
+
+        if isinstance(msg, ExtendedRawMeasurements):
+            frames = self.encode(msg)
+            if self.station and (
+                self._last_station is None
+                or msg.tow - self._last_station >= self.station_interval * 1000
+                or msg.tow < self._last_station
+            ):
+                self._last_station = msg.tow
+                frames.insert(0, self.station_frame())
+            return frames
+
+        return []
+
+    def set_station(self, msg):
+        if msg.runtime_base_position_mode != BasePositionMode.static_mode:
+            self.station = None
+            return
+
+        x, y, z = geodetic_to_ecef(
+            math.radians(msg.latitude),
+            math.radians(msg.longitude),
+            msg.ellipsoidal_height,
+        )
+        self.station = StationPosition(
+            1006 if self.antenna_height else 1005,
+            self.station_id,
+            0,
+            True,
+            True,
+            True,
+            False,
+            float(x),
+            float(y),
+            float(z),
+            False,
+            0,
+            self.antenna_height,
+        )
+
+    def station_frame(self):
+        return frame(bytes(self.station))
+
+    def encode(self, msg):
+        subs = msg.sub_messages
+        return self.encode_epoch(
+            msg.tow,
+            np.array([m.gnss_type for m in subs], dtype=np.int64),
+            np.array([m.svid for m in subs], dtype=np.int64),
+            np.array([m.signal_type for m in subs], dtype=np.int64),
+            np.array([m.frequency_id for m in subs], dtype=np.int64),
+            np.array([m.cn0 for m in subs], dtype=float),
+            np.array([m.pseudorange for m in subs]),
+            np.array([m.accumulated_carrier_cycle for m in subs]),
+            np.array([m.doppler_frequency for m in subs]),
+            np.array([int(m.channel_indicator) for m in subs], dtype=np.int64),
+        )
+
+    def encode_epoch(
+        self,
+        tow_ms,
+        gnss_type,
+        svid,
+        signal_type,
+        frequency_id,
+        cn0,
+        pseudorange,
+        phase,
+        doppler,
+        flags,
+    ):
+        """
+        One frame per system, more when a system has more cells than fit in
+        one message. Phase is in cycles, Doppler in Hz.
+        """
+        signal_id = MSM_SIGNAL_IDS[gnss_type * 16 + signal_type]
+        satellite = svid - MSM_FIRST_SVID[gnss_type] + 1
+        keep = (signal_id > 0) & (satellite >= 1) & (satellite <= 64)
+        keep &= (flags & ExtendedRawChannelIndicator.pseudorange_available) != 0
+
+        columns = (
+            gnss_type,
+            svid,
+            signal_type,
+            frequency_id,
+            cn0,
+            pseudorange,
+            phase,
+            doppler,
+            flags,
+            signal_id,
+            satellite,
+        )
+        (
+            gnss_type,
+            svid,
+            signal_type,
+            frequency_id,
+            cn0,
+            pseudorange,
+            phase,
+            doppler,
+            flags,
+            signal_id,
+            satellite,
+        ) = (a[keep] for a in columns)
+
+        wavelength = wavelengths(gnss_type, signal_type, frequency_id)
+        rows, phase_range = self._align_phase(
+            tow_ms, gnss_type, svid, signal_type, pseudorange, phase, flags, wavelength
+        )
+        lock = self.lock_time(tow_ms - self.lock_start[rows])
+
+        # work in light milliseconds from here on
+        pseudorange = pseudorange / LIGHT_MILLISECOND
+        phase_range = phase_range / LIGHT_MILLISECOND
+        rate = -doppler * wavelength
+        rate[(flags & ExtendedRawChannelIndicator.doppler_frequency) == 0] = np.nan
+        half_cycle = (
+            flags & ExtendedRawChannelIndicator.unknown_half_cycle_ambiguity
+        ) != 0
+
+        messages = []
+        for gnss in sorted(set(gnss_type.tolist())):
+            sel = np.flatnonzero(gnss_type == gnss)
+            signals = np.unique(signal_id[sel])
+
+            # cells are in satellite then signal order
+            sel = sel[np.lexsort((signal_id[sel], satellite[sel]))]
+            sats = np.unique(satellite[sel])
+
+            per_message = max(MAX_CELLS // len(signals), 1)
+            for start in range(0, len(sats), per_message):
+                chunk = sats[start : start + per_message]
+                cells = sel[np.isin(satellite[sel], chunk)]
+                messages.append((gnss, chunk, signals, cells))
+
+        frames = []
+        for i, (gnss, sats, signals, cells) in enumerate(messages):
+            payload = self._message(
+                gnss,
+                self._epoch_time(gnss, tow_ms),
+                i < len(messages) - 1,
+                sats,
+                signals,
+                satellite[cells],
+                signal_id[cells],
+                frequency_id[cells],
+                pseudorange[cells],
+                phase_range[cells],
+                rate[cells],
+                lock[cells],
+                half_cycle[cells],
+                cn0[cells],
+            )
+            frames.append(frame(payload))
+        return frames
+
+    def _align_phase(
+        self,
+        tow_ms,
+        gnss_type,
+        svid,
+        signal_type,
+        pseudorange,
+        phase,
+        flags,
+        wavelength,
+    ):
+        """Phase in metres next to the pseudorange, NaN where there isn't one"""
+        rows, reset = self.index.lookup(gnss_type, svid, signal_type)
+        self.offset[reset] = np.nan
+
+        available = (flags & ExtendedRawChannelIndicator.carrier_phase_available) != 0
+        available &= np.isfinite(wavelength)
+        slipped = (flags & ExtendedRawChannelIndicator.cycle_slip_possible) != 0
+
+        offset = self.offset[rows]
+        phase_range = (phase + offset) * wavelength
+        # code and carrier drift apart too far for the fine phase range field
+        limit = 2.0 ** (self.cell_widths[1] - 1) * self.scales[1] * LIGHT_MILLISECOND
+        with np.errstate(invalid="ignore"):
+            drifted = ~(np.abs(phase_range - pseudorange) < limit)
+
+        new_arc = available & (slipped | drifted)
+        offset[new_arc] = np.round(
+            pseudorange[new_arc] / wavelength[new_arc] - phase[new_arc]
+        )
+        offset[~available] = np.nan
+
+        self.offset[rows] = offset
+        self.lock_start[rows[new_arc]] = tow_ms
+        return rows, (phase + offset) * wavelength
+
+    def _epoch_time(self, gnss_type, tow_ms):
+        if gnss_type == GNSSType.BEIDOU:
+            return (tow_ms - int(BDT_GPS_OFFSET * 1000)) % WEEK_MS
+        if gnss_type == GNSSType.GLONASS:
+            t = (
+                tow_ms - self.leap_seconds * 1000 + int(MOSCOW_OFFSET * 1000)
+            ) % WEEK_MS
+            return (t // DAY_MS) << 27 | (t % DAY_MS)
+        return tow_ms
+
+    def _message(
+        self,
+        gnss_type,
+        epoch_time,
+        multiple_message,
+        sats,
+        signals,
+        cell_satellite,
+        cell_signal,
+        frequency_id,
+        pseudorange,
+        phase_range,
+        rate,
+        lock,
+        half_cycle,
+        cn0,
+    ):
+        bits = self._bits
+        number = MSM_SYSTEMS[gnss_type][0] + self.msm - 1
+        header = msm_header.pack(
+            number, self.station_id, epoch_time, multiple_message, 0, 0, 0, False, 0
+        )
+        header = np.unpackbits(np.frombuffer(header, dtype=np.uint8))
+        bits[:MSM_HEADER_BITS] = header[:MSM_HEADER_BITS]
+
+        pos = MSM_HEADER_BITS
+        bits[pos : pos + MSM_MASK_BITS] = 0
+        bits[pos + sats - 1] = 1
+        bits[pos + 64 + signals - 1] = 1
+        pos += MSM_MASK_BITS
+
+        n_sat, n_sig = len(sats), len(signals)
+        sat_idx = np.searchsorted(sats, cell_satellite)
+        sig_idx = np.searchsorted(signals, cell_signal)
+        bits[pos : pos + n_sat * n_sig] = 0
+        bits[pos + sat_idx * n_sig + sig_idx] = 1
+        pos += n_sat * n_sig
+
+        # the rough range of a satellite comes from its first signal
+        first = np.searchsorted(sat_idx, np.arange(n_sat))
+        rough = np.round(pseudorange[first] * 1024.0)
+        rough_ms = rough // 1024
+        rough_mod = rough % 1024
+        rough = (rough / 1024.0)[sat_idx]
+
+        pr_scale, phase_scale, cn0_scale = self.scales
+        pr_width, phase_width, _, _, cn0_width, *_ = self.cell_widths
+        cells = [
+            _fine((pseudorange - rough) / pr_scale, pr_width),
+            _fine((phase_range - rough) / phase_scale, phase_width),
+            lock,
+            half_cycle,
+            np.clip(np.round(cn0 / cn0_scale), 0, (1 << cn0_width) - 1),
+        ]
+
+        if self.msm == 7:
+            # the GLONASS frequency channel, offset by 7 like frequency_id
+            extended_info = frequency_id[first] * (gnss_type == GNSSType.GLONASS)
+            rough_rate = np.round(rate[first])
+            rough_rate[~np.isfinite(rough_rate)] = -(1 << 13)
+            satellites = [rough_ms, extended_info, rough_mod, rough_rate]
+            cells.append(_fine((rate - rough_rate[sat_idx]) / 1e-4, 15))
+        else:
+            satellites = [rough_ms, rough_mod]
+
+        pos = _put_fields(bits, pos, satellites, self.satellite_widths)
+        pos = _put_fields(bits, pos, cells, self.cell_widths)
+
+        # pad to a whole byte
+        end = (pos + 7) // 8 * 8
+        bits[pos:end] = 0
+        return np.packbits(bits[:end]).tobytes()
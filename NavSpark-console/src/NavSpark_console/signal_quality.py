@@ -0,0 +1,216 @@
+import attr
+import numpy as np
+
+from NavSpark_console.protocol import ExtendedRawMeasurements, SattelliteChannelStatuses
+from NavSpark_console.positioning import raw_measurement_system
+
+# the columns kept for every signal
+METRICS = ("cn0", "pseudorange_std", "carrier_phase_std", "doppler_std")
+
+DEFAULT_WINDOW = 60
+MAX_SIGNALS = 192
+
+
+@attr.s(auto_attribs=True)
+class SignalIndex:
+    """
+    Gives every (gnss_type, svid, signal_type) a row in fixed size arrays the
+    first time it's seen. When the rows run out the signal that has gone
+    longest without an update gives up its row, never one seen in the same
+    epoch so long as an epoch has no more than max_signals signals.
+    """
+
+    max_signals: int = MAX_SIGNALS
+    epoch: int = 0
+    _rows: dict = attr.ib(factory=dict, repr=False)
+
+    def __attrs_post_init__(self):
+        self.keys = np.zeros((self.max_signals, 3), dtype=np.int64)
+        self.last_epoch = np.full(self.max_signals, -1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _row(self, key, new):
+        row = self._rows.get(key)
+        if row is None:
+            if len(self._rows) < self.max_signals:
+                row = len(self._rows)
+            else:
+                row = int(np.argmin(self.last_epoch))
+                del self._rows[tuple(self.keys[row])]
+            self._rows[key] = row
+            self.keys[row] = key
+            new.append(row)
+
+        # taken for this epoch, the next new signal looks elsewhere
+        self.last_epoch[row] = self.epoch
+        return row
+
+    def lookup(self, gnss_type, svid, signal_type):
+        """
+        Rows for one epoch of signals, along with the rows that were given to a
+        new signal and need their state cleared.
+        """
+        new = []
+        rows = np.array(
+            [
+                self._row((int(g), int(s), int(t)), new)
+                for g, s, t in zip(gnss_type, svid, signal_type)
+            ],
+            dtype=np.int64,
+        )
+        self.epoch += 1
+        return rows, np.array(new, dtype=np.int64)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class SignalStatistics:
+    """One row per tracked signal, one column per entry in METRICS"""
+
+    gnss_type: np.ndarray
+    svid: np.ndarray
+    signal_type: np.ndarray
+    count: np.ndarray
+    mean: np.ndarray
+    variance: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+
+
+@attr.s(auto_attribs=True)
+class SignalQualityStats:
+    """
+    Rolling statistics over the last window epochs of each
+    (gnss_type, svid, signal_type), missing values are stored as NaN.
+
+    Running sums are kept as samples enter and leave the window so the mean
+    and variance queries don't have to look at the window at all.
+
+    Channel status comes before the extended raw measurements of its epoch,
+    so it's held back until they arrive, or another epoch starts, and only
+    adds the signals they don't have. Each epoch is one sample either way,
+    without extended raw measurements a sample shows up an epoch late.
+    """
+
+    window: int = DEFAULT_WINDOW
+    max_signals: int = MAX_SIGNALS
+    # channel status waiting for extended raw measurements with the same iod
+    pending: SattelliteChannelStatuses = attr.ib(default=None, repr=False)
+
+    def __attrs_post_init__(self):
+        n = self.max_signals
+        self.index = SignalIndex(n)
+        self.samples = np.full((n, self.window, len(METRICS)), np.nan)
+        self.position = np.zeros(n, dtype=np.int64)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.valid = np.zeros((n, len(METRICS)), dtype=np.int64)
+        self.total = np.zeros((n, len(METRICS)))
+        self.total_sq = np.zeros((n, len(METRICS)))
+
+    def update(self, msg):
+        if isinstance(msg, SattelliteChannelStatuses):
+            self.flush()
+            self.pending = msg
+            return
+        if not isinstance(msg, ExtendedRawMeasurements):
+            return
+
+        if self.pending is not None and self.pending.iod != msg.iod:
+            self.flush()
+        pending, self.pending = self.pending, None
+
+        subs = msg.sub_messages
+        gnss_type = [int(m.gnss_type) for m in subs]
+        svid = [m.svid for m in subs]
+        signal_type = [m.signal_type for m in subs]
+        values = np.array(
+            [
+                (
+                    m.cn0,
+                    m.pseudorange_standard_dev,
+                    m.accumulated_carrier_cycle_standard_dev,
+                    m.doppler_freq_standard_dev,
+                )
+                for m in subs
+            ],
+            dtype=float,
+        ).reshape(-1, len(METRICS))
+
+        if pending is not None:
+            # the same epoch's channel status, for the signals not measured
+            measured = set(zip(gnss_type, svid, signal_type))
+            g, s, t, v = self._channel_status(pending)
+            extra = [
+                i
+                for i, key in enumerate(zip(g.tolist(), s.tolist(), t.tolist()))
+                if key not in measured
+            ]
+            gnss_type += g[extra].tolist()
+            svid += s[extra].tolist()
+            signal_type += t[extra].tolist()
+            values = np.concatenate([values, v[extra]])
+
+        self.add_epoch(gnss_type, svid, signal_type, values)
+
+    def _channel_status(self, msg):
+        # channel status only has the CN0 of the primary signal
+        gnss_type, svid = raw_measurement_system(
+            np.array([m.svid for m in msg.sub_messages], dtype=np.int64)
+        )
+        values = np.full((len(svid), len(METRICS)), np.nan)
+        values[:, 0] = [m.cn0 for m in msg.sub_messages]
+        return gnss_type, svid, np.zeros(len(svid), dtype=np.int64), values
+
+    def flush(self):
+        """Add channel status still waiting for its extended raw measurements"""
+        pending, self.pending = self.pending, None
+        if pending is not None:
+            self.add_epoch(*self._channel_status(pending))
+
+    def add_epoch(self, gnss_type, svid, signal_type, values):
+        """Add one epoch of values, shaped (signals, len(METRICS))"""
+        rows, reset = self.index.lookup(gnss_type, svid, signal_type)
+        if not len(rows):
+            return
+
+        self.samples[reset] = np.nan
+        self.position[reset] = 0
+        self.count[reset] = 0
+        self.valid[reset] = 0
+        self.total[reset] = 0.0
+        self.total_sq[reset] = 0.0
+
+        position = self.position[rows]
+        old = np.nan_to_num(self.samples[rows, position])
+        old_valid = ~np.isnan(self.samples[rows, position])
+        new = np.nan_to_num(values)
+        new_valid = ~np.isnan(values)
+
+        self.valid[rows] += new_valid.astype(np.int64) - old_valid
+        self.total[rows] += new - old
+        self.total_sq[rows] += new * new - old * old
+        self.samples[rows, position] = values
+        self.position[rows] = (self.position[rows] + 1) % self.window
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.window)
+
+    def statistics(self):
+        rows = np.flatnonzero(self.count)
+        samples = self.samples[rows]
+
+        # metrics a signal has no values for come out as NaN
+        n = self.valid[rows].astype(float)
+        n[n == 0] = np.nan
+        mean = self.total[rows] / n
+        variance = np.maximum(self.total_sq[rows] / n - mean * mean, 0.0)
+
+        return SignalStatistics(
+            gnss_type=self.index.keys[rows, 0],
+            svid=self.index.keys[rows, 1],
+            signal_type=self.index.keys[rows, 2],
+            count=self.count[rows],
+            mean=mean,
+            variance=variance,
+            minimum=np.fmin.reduce(samples, axis=1),
+            maximum=np.fmax.reduce(samples, axis=1),
+        )
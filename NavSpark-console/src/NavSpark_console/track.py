@@ -0,0 +1,165 @@
+import attr
+import numpy as np
+
+from NavSpark_console.protocol import NavigationState, ReceiverNavigationStatus
+from NavSpark_console.coordinates import LocalFrame, ecef_to_geodetic
+
+WEEK = 604800.0
+
+# 24 hours at 10Hz
+DEFAULT_CAPACITY = 24 * 3600 * 10
+
+
+def lttb(x, y, n_out):
+    """
+    Largest triangle three buckets downsampling, returns the indices of the
+    points to keep. x has to be increasing.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # the first and last points are always kept, the rest is split evenly
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # the average of the next bucket stands in for the third point
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        if next_hi <= next_lo:
+            next_hi = next_lo + 1
+        cx = x[next_lo:next_hi].mean()
+        cy = y[next_lo:next_hi].mean()
+
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+@attr.s(auto_attribs=True)
+class TrackHistory:
+    """
+    The last capacity fixes in preallocated arrays used as a ring. Appending is
+    constant time and the memory use is fixed when it's created.
+
+    time is GPS seconds counted from week 0, geodetic is latitude, longitude in
+    radians and ellipsoidal height, dop is PDOP, HDOP and VDOP.
+    """
+
+    capacity: int = DEFAULT_CAPACITY
+    count: int = 0
+    head: int = 0
+
+    def __attrs_post_init__(self):
+        n = self.capacity
+        self.time = np.zeros(n)
+        self.ecef = np.zeros((n, 3))
+        self.geodetic = np.zeros((n, 3))
+        self.velocity = np.zeros((n, 3), dtype=np.float32)
+        self.dop = np.zeros((n, 3), dtype=np.float32)
+        self.navigation_state = np.zeros(n, dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        return sum(
+            a.nbytes
+            for a in (
+                self.time,
+                self.ecef,
+                self.geodetic,
+                self.velocity,
+                self.dop,
+                self.navigation_state,
+            )
+        )
+
+    def __len__(self):
+        return self.count
+
+    def update(self, msg):
+        if not isinstance(msg, ReceiverNavigationStatus):
+            return
+        if msg.navigation_state == NavigationState.NO_FIX:
+            return
+
+        self.append(
+            msg.week_number * WEEK + msg.time_of_week,
+            (msg.ecef_x, msg.ecef_y, msg.ecef_z),
+            (msg.ecef_x_vel, msg.ecef_y_vel, msg.ecef_z_vel),
+            (msg.pdop, msg.hdop, msg.vdop),
+            msg.navigation_state,
+        )
+
+    def append(self, time, ecef, velocity, dop, navigation_state):
+        i = self.head
+        self.time[i] = time
+        self.ecef[i] = ecef
+        self.geodetic[i] = ecef_to_geodetic(*ecef)
+        self.velocity[i] = velocity
+        self.dop[i] = dop
+        self.navigation_state[i] = navigation_state
+
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def indices(self, seconds=None):
+        """Ring indices of the fixes in the last seconds, oldest first"""
+        start = (self.head - self.count) % self.capacity
+        idx = (start + np.arange(self.count)) % self.capacity
+        if seconds is None or not self.count:
+            return idx
+
+        newest = self.time[(self.head - 1) % self.capacity]
+        first = np.searchsorted(self.time[idx], newest - seconds, side="left")
+        return idx[first:]
+
+    def mean(self, seconds=None):
+        idx = self.indices(seconds)
+        if not len(idx):
+            return None
+        return self.ecef[idx].mean(axis=0)
+
+    def cep(self, seconds=None, percentile=50.0):
+        """
+        Horizontal radius around the mean position that holds percentile of the
+        fixes, CEP with the default and R95 with 95.
+        """
+        idx = self.indices(seconds)
+        if not len(idx):
+            return None
+
+        frame = LocalFrame(self.ecef[idx].mean(axis=0))
+        e, n, _ = frame.ecef_to_enu(*self.ecef[idx].T)
+        return float(np.percentile(np.hypot(e, n), percentile))
+
+    def drift(self, seconds=None):
+        """Least squares east/north/up rate of the position in m/s"""
+        idx = self.indices(seconds)
+        if len(idx) < 2:
+            return None
+
+        frame = LocalFrame(self.ecef[idx[0]])
+        enu = np.stack(frame.ecef_to_enu(*self.ecef[idx].T), axis=1)
+        t = self.time[idx] - self.time[idx[0]]
+        if t[-1] <= 0:
+            return None
+        A = np.stack((t, np.ones(len(t))), axis=1)
+        return np.linalg.lstsq(A, enu, rcond=None)[0][0]
+
+    def downsample(self, n_out, seconds=None, frame=None):
+        """
+        Ring indices of about n_out fixes that keep the shape of the track, for
+        plotting. The height, or the east offset in frame when one is given,
+        picks the points.
+        """
+        idx = self.indices(seconds)
+        if frame is None:
+            y = self.geodetic[idx, 2]
+        else:
+            y, _, _ = frame.ecef_to_enu(*self.ecef[idx].T)
+        return idx[lttb(self.time[idx], y, n_out)]
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import termios
+import time
+import unittest
+
+from NavSpark_console.protocol import BaudRate
+from NavSpark_console.rtcm import frame
+from NavSpark_console.autobaud import *
+
+ACK = b"\xA0\xA1\x00\x02\x83\x10\x93\x0D\x0A"
+GGA = b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n"
+
+
+class TestFindFrame(unittest.TestCase):
+    def test_frames(self):
+        self.assertTrue(find_frame(b"\x13\xA0\xA1\xFF" + ACK))
+        self.assertTrue(find_frame(b"\xFE$\x00" + GGA))
+        self.assertTrue(find_frame(b"\xD3\xD3" + frame(b"\x3E\xD0\x00")))
+
+    def test_noise(self):
+        self.assertFalse(find_frame(ACK[:-1]))
+        self.assertFalse(find_frame(ACK.replace(b"\x93", b"\x92")))
+        self.assertFalse(find_frame(GGA.replace(b"*47", b"*48")))
+        self.assertFalse(find_frame(bytes(range(256)) * 4))
+
+    def test_candidates(self):
+        self.assertEqual(candidate_rates()[:2], (115200, 9600))
+        rates = candidate_rates(4800)
+        self.assertEqual(rates[0], 4800)
+        self.assertEqual(sorted(rates), sorted(BAUD_RATES))
+        # every rate the receiver can be set to
+        self.assertEqual(sorted(rates), sorted(b.rate for b in BaudRate))
+
+
+class TestDetectBaud(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+
+    def tearDown(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+    def receiver(self, speed):
+        """Answer probes like a receiver at speed, with noise at any other"""
+
+        def read():
+            os.read(self.master, 1024)
+            if termios.tcgetattr(self.master)[4] == speed:
+                os.write(self.master, ACK)
+            else:
+                os.write(self.master, b"\xA0\xA1\x00\x02\x55\xAA\x13\x0D")
+
+        asyncio.get_running_loop().add_reader(self.master, read)
+
+    async def test_detect(self):
+        self.receiver(termios.B38400)
+        start = time.perf_counter()
+        settings = await detect_baud(self.port, window=0.05)
+        self.assertEqual(settings, {"baudrate": 38400})
+        self.assertLess(time.perf_counter() - start, 1.0)
+        asyncio.get_running_loop().remove_reader(self.master)
+
+    async def test_nothing(self):
+        self.receiver(termios.B50)
+        settings = await detect_baud(self.port, baud_rates=(9600, 4800), window=0.02)
+        self.assertIsNone(settings)
+        asyncio.get_running_loop().remove_reader(self.master)
@@ -0,0 +1,138 @@
+import unittest
+
+import numpy as np
+
+from NavSpark_console.protocol import Beidou2D1Subframe, Beidou2D2Subframe
+from NavSpark_console.beidou import *
+
+MEO_EPHEMERIS = {
+    "week_number": 800,
+    "t_oc": 3600,
+    "t_oe": 3600,
+    "t_gd1": 12,
+    "a_f0": -123456,
+    "a_f1": 2345,
+    "a_f2": 0,
+    "aode": 3,
+    "root_a": int(5282.6 * 2**19),
+    "e": int(0.0012 * 2**33),
+    "M_0": -987654321,
+    "delta_n": 4567,
+    "omega": 1234567890,
+    "Omega_0": -1234567890,
+    "Omega_dot": -24680,
+    "I_0": 660000000,
+    "IDOT": -210,
+    "C_uc": -1500,
+    "C_us": 2500,
+    "C_rc": 3000,
+    "C_rs": -100,
+    "C_ic": 40,
+    "C_is": -50,
+}
+
+
+def encode_pages(layout, raw):
+    """Build parity stripped page words holding the given raw field values"""
+    pages = {}
+    for name, (_, parts) in layout.items():
+        value = raw.get(name, 0)
+        shift = sum(width for *_, width in parts)
+        for page, word, offset, width in parts:
+            shift -= width
+            part = (value >> shift) & ((1 << width) - 1)
+            start = offset if word == 1 else 26 + (word - 2) * 22 + offset
+            pages[page] = pages.get(page, 0) | part << (INFO_BITS - start - width)
+    return pages
+
+
+def with_header(bits, sow, page=None):
+    bits |= (sow >> 12) << (INFO_BITS - 26)
+    bits |= (sow & 0xFFF) << (INFO_BITS - 38)
+    if page is not None:
+        bits |= page << (INFO_BITS - 42)
+    return bits.to_bytes(28, "big")
+
+
+class TestInfoBits(unittest.TestCase):
+    def test_word_offsets(self):
+        words = bytearray(28)
+        words[0] = 0xE2  # preamble starts the first word
+        self.assertEqual(info_bits(bytes(words), 1, 0, 11), 0xE2 << 3)
+
+        # the second word starts right after the 26 bits of the first
+        bits = 0b101 << (INFO_BITS - 29)
+        self.assertEqual(info_bits(bits.to_bytes(28, "big"), 2, 0, 3), 0b101)
+
+
+class TestBeidouEphemerisCache(unittest.TestCase):
+    def test_d1(self):
+        cache = BeidouEphemerisCache()
+        pages = encode_pages(D1_FIELDS, MEO_EPHEMERIS)
+        for sfid in (1, 2, 3):
+            words = with_header(pages[sfid], 28800 + 6 * sfid)
+            cache.update(Beidou2D1Subframe(svid=211, sfid=sfid, words=words))
+
+        eph = cache.ephemerides[11]
+        self.assertEqual(eph["t_oe"], 28800)
+        self.assertAlmostEqual(eph["a_f0"], -123456 * 2.0**-33)
+        self.assertAlmostEqual(eph["M_0"], -987654321 * 2.0**-31 * GPS_PI)
+        self.assertAlmostEqual(eph["C_uc"], -1500 * 2.0**-31)
+        self.assertAlmostEqual(eph["t_gd"], 1.2e-9)
+
+        states = cache.satellite_states(28800.0)
+        radius = np.linalg.norm(states.position[0])
+        self.assertAlmostEqual(radius / 1e3, 5282.6**2 / 1e3, delta=50)
+
+    def test_d1_pages_decoded_once(self):
+        cache = BeidouEphemerisCache()
+        pages = encode_pages(D1_FIELDS, MEO_EPHEMERIS)
+        for sfid in (1, 2, 3):
+            words = with_header(pages[sfid], 28800 + 6 * sfid)
+            cache.update(Beidou2D1Subframe(svid=11, sfid=sfid, words=words))
+        eph = cache.ephemerides[11]
+
+        # the next frame repeats the same ephemeris
+        for sfid in (1, 2, 3):
+            words = with_header(pages[sfid], 28830 + 6 * sfid)
+            cache.update(Beidou2D1Subframe(svid=11, sfid=sfid, words=words))
+        self.assertIs(cache.ephemerides[11], eph)
+
+    def test_expiry(self):
+        cache = BeidouEphemerisCache()
+        pages = encode_pages(D1_FIELDS, MEO_EPHEMERIS)
+        for sfid in (1, 2, 3):
+            words = with_header(pages[sfid], 28800 + 6 * sfid)
+            cache.update(Beidou2D1Subframe(svid=11, sfid=sfid, words=words))
+
+        words = with_header(pages[1], int(28800 + EPHEMERIS_MAX_AGE + 6))
+        cache.update(Beidou2D1Subframe(svid=12, sfid=1, words=words))
+        self.assertNotIn(11, cache.ephemerides)
+
+    def test_d2_geo(self):
+        # a geostationary orbit described in the 5 degree tilted frame, where it
+        # appears inclined by 5 degrees with its ascending node facing -X
+        t_oe = 3600 * 8
+        n = BDS_OMEGA_E_DOT
+        root_a = (BDS_GM / n**2) ** (1 / 6)
+        Omega_0 = np.angle(np.exp(1j * (BDS_OMEGA_E_DOT * t_oe + np.pi)))
+        geo = {
+            "t_oc": t_oe // 8,
+            "t_oe": t_oe // 8,
+            "root_a": round(root_a * 2**19),
+            "I_0": round(np.radians(5) / GPS_PI * 2**31),
+            "Omega_0": round(Omega_0 / GPS_PI * 2**31),
+        }
+
+        cache = BeidouEphemerisCache()
+        pages = encode_pages(D2_FIELDS, geo)
+        for page in sorted(pages):
+            words = with_header(pages[page], t_oe + 3 * page, page=page)
+            cache.update(Beidou2D2Subframe(svid=3, sfid=1, words=words))
+
+        self.assertIn(3, cache.ephemerides)
+        start = cache.satellite_states(float(t_oe))
+        later = cache.satellite_states(t_oe + 3600.0)
+        np.testing.assert_allclose(start.position, later.position, atol=100.0)
+        self.assertLess(abs(start.position[0, 2]), 1.0)
+        self.assertLess(np.linalg.norm(later.velocity), 0.1)
@@ -0,0 +1,38 @@
+import unittest
+from io import BytesIO
+
+from NavSpark_console.capture import Recorder, replay
+from NavSpark_console.protocol import MeasurementTimeInformation, NavSparkRawProtocol
+
+
+class TestReplay(unittest.TestCase):
+    def test_replay(self):
+        capture = BytesIO(
+            b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+            b"\xA0\xA1\x00\x0A\xDC\x3E\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x19\x0D\x0A"
+        )
+
+        # packets split over several reads
+        messages = list(replay(capture, read_size=5))
+        self.assertEqual([m.iod for m in messages], [0x3D, 0x3E])
+        self.assertIsInstance(messages[0], MeasurementTimeInformation)
+
+    def test_record(self):
+        data = b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+        recorder = Recorder(BytesIO())
+        protocol = NavSparkRawProtocol(recorder=recorder)
+        protocol.connection_made(None)
+        protocol.data_received(data[:5])
+        protocol.data_received(data[5:])
+        self.assertEqual(recorder.bytes_written, len(data))
+
+        # what was recorded replays as it was received, tagged with its source
+        recorder.fp.seek(0)
+        (msg,) = replay(recorder.fp, source="base")
+        self.assertEqual(msg, protocol.message_queue.get_nowait())
+        self.assertEqual(msg.source, "base")
+
+        # a reader thread still holding it after it's closed
+        recorder.close()
+        protocol.data_received(data)
+        self.assertEqual(recorder.bytes_written, len(data))
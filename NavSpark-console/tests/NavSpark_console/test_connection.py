@@ -0,0 +1,70 @@
+import asyncio
+import os
+import unittest
+
+from NavSpark_console.connection import *
+
+PACKET = b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+
+
+class TestSerialConnection(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # a pty stands in for the receiver, closing the master drops the port
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+
+    def tearDown(self):
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    async def test_reconnect(self):
+        connection = SerialConnection(self.port, {"baudrate": 115200})
+        connection.start()
+        await asyncio.wait_for(connection.wait_connected(), 1)
+
+        protocol = connection.protocol
+        os.write(self.master, PACKET[:9])
+        while protocol.bytes_received < 9:
+            await asyncio.sleep(0.01)
+
+        # the port glitches halfway through a packet
+        connection.transport.abort()
+        await asyncio.sleep(0)
+        self.assertFalse(connection.connected)
+        await asyncio.wait_for(connection.wait_connected(), 1)
+        os.write(self.master, PACKET[9:] + PACKET)
+        msg = await asyncio.wait_for(protocol.message_queue.get(), 1)
+        self.assertEqual(msg.iod, 0x3D)
+
+        self.assertIs(connection.protocol, protocol)
+        self.assertEqual(protocol.connections, 2)
+        self.assertEqual(protocol.bytes_received, 2 * len(PACKET))
+        await connection.close()
+        self.assertFalse(connection.connected)
+
+    async def test_backoff(self):
+        connection = SerialConnection(
+            self.port + "-missing", initial_backoff=0.01, max_backoff=0.04
+        )
+        connection.start()
+        await asyncio.sleep(0.2)
+        self.assertFalse(connection.connected)
+        self.assertIsInstance(connection.last_error, OSError)
+        # 0, 10, 20, 40, 40, 40 ms... rather than spinning
+        self.assertGreater(connection.attempts, 3)
+        self.assertLess(connection.attempts, 10)
+        await connection.close()
+
+    async def test_device_lost(self):
+        connection = SerialConnection(self.port, initial_backoff=0.01)
+        connection.start()
+        await asyncio.wait_for(connection.wait_connected(), 1)
+
+        os.close(self.master)
+        await asyncio.sleep(0.1)
+        self.assertFalse(connection.connected)
+        self.assertIsNotNone(connection.last_error)
+        await connection.close()
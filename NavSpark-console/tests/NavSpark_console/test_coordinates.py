@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+
+from NavSpark_console.protocol import ConfigureBasePositionInput
+from NavSpark_console.coordinates import *
+
+
+class TestGeodetic(unittest.TestCase):
+    def test_round_trip(self):
+        lat = np.radians(np.array([0.0, 39.0, -45.0, 89.9]))
+        lon = np.radians(np.array([0.0, -77.0, 170.0, 10.0]))
+        height = np.array([0.0, 120.0, -30.0, 2500.0])
+
+        x, y, z = geodetic_to_ecef(lat, lon, height)
+        lat2, lon2, height2 = ecef_to_geodetic(x, y, z)
+        np.testing.assert_allclose(lat2, lat, atol=1e-11)
+        np.testing.assert_allclose(lon2, lon, atol=1e-11)
+        np.testing.assert_allclose(height2, height, atol=1e-4)
+
+    def test_scalar_matches_array(self):
+        x, y, z = geodetic_to_ecef(np.radians(39.0), np.radians(-77.0), 120.0)
+        scalar = ecef_to_geodetic(float(x), float(y), float(z))
+        array = ecef_to_geodetic(np.array([x]), np.array([y]), np.array([z]))
+        for s, a in zip(scalar, array):
+            self.assertIsInstance(s, float)
+            self.assertAlmostEqual(s, a[0], places=9)
+
+
+class TestLocalFrame(unittest.TestCase):
+    def setUp(self):
+        self.frame = LocalFrame.from_geodetic(
+            np.radians(39.0), np.radians(-77.0), 120.0
+        )
+
+    def test_axes(self):
+        lat, lon = np.radians(39.0), np.radians(-77.0)
+        north = geodetic_to_ecef(lat + 1e-6, lon, 120.0)
+        east = geodetic_to_ecef(lat, lon + 1e-6, 120.0)
+        up = geodetic_to_ecef(lat, lon, 130.0)
+
+        e, n, u = self.frame.ecef_to_enu(*north)
+        self.assertGreater(n, 6.0)
+        self.assertAlmostEqual(e, 0.0, places=6)
+
+        e, n, u = self.frame.ecef_to_enu(*east)
+        self.assertGreater(e, 4.0)
+        self.assertAlmostEqual(n, 0.0, places=4)
+
+        np.testing.assert_allclose(self.frame.ecef_to_enu(*up), (0, 0, 10), atol=1e-6)
+
+    def test_arrays(self):
+        rng = np.random.default_rng(3)
+        enu = rng.normal(0, 1000.0, (3, 50))
+        x, y, z = self.frame.enu_to_ecef(*enu)
+        np.testing.assert_allclose(self.frame.ecef_to_enu(x, y, z), enu, atol=1e-6)
+
+        # velocities only rotate
+        np.testing.assert_allclose(
+            self.frame.rotate_velocity(*enu), self.frame.rotation @ enu
+        )
+
+    def test_base_position(self):
+        msg = ConfigureBasePositionInput(
+            latitude=39.0, longitude=-77.0, ellipsoidal_height=120.0
+        )
+        frame = LocalFrame.from_base_position(msg)
+        np.testing.assert_allclose(frame.origin, self.frame.origin)
@@ -0,0 +1,135 @@
+import unittest
+
+import numpy as np
+
+from NavSpark_console.protocol import (
+    ExtendedRawMeasurement,
+    ExtendedRawMeasurements,
+    ExtendedRawChannelIndicator,
+    GNSSType,
+)
+from NavSpark_console.cycle_slip import *
+from NavSpark_console.positioning import SPEED_OF_LIGHT
+
+L1 = CARRIER_FREQUENCIES[GNSSType.GPS, 0]
+L2 = CARRIER_FREQUENCIES[GNSSType.GPS, 2]
+
+
+class TestCycleSlipDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = CycleSlipDetector()
+        self.svid = np.repeat([3, 8, 17], 2)
+        self.signal_type = np.tile([0, 2], 3)
+        self.frequency = np.tile([L1, L2], 3)
+        self.range = np.repeat([2.1e7, 2.2e7, 2.3e7], 2)
+        self.rate = np.repeat([-300.0, 50.0, 650.0], 2)
+
+    def epoch(self, t, slips=None, flag=None, lock_time=None):
+        # range with a little acceleration, the phase in the RINEX sense
+        r = self.range + self.rate * t + 0.2 * t * t
+        phase = -r * self.frequency / SPEED_OF_LIGHT
+        doppler = (self.rate + 0.4 * t) * self.frequency / SPEED_OF_LIGHT
+        if slips is not None:
+            phase = phase + slips
+
+        n = len(self.svid)
+        return self.detector.add_epoch(
+            100.0 + t,
+            np.zeros(n, dtype=np.int64),
+            self.svid,
+            self.signal_type,
+            np.zeros(n, dtype=np.int64),
+            np.full(n, 5) if lock_time is None else lock_time,
+            phase,
+            doppler,
+            np.zeros(n, dtype=bool) if flag is None else flag,
+        )
+
+    def run_epochs(self, n, slip_at=None, **kwargs):
+        epochs = []
+        offset = np.zeros(len(self.svid))
+        for i in range(n):
+            if i == slip_at:
+                offset = offset + kwargs["slips"]
+            epochs.append(self.epoch(i * 0.1, slips=offset))
+        return epochs
+
+    def test_clean_arcs(self):
+        epochs = self.run_epochs(20)
+        self.assertTrue(np.all(epochs[0].slip == SlipReason.NEW_ARC))
+        np.testing.assert_array_equal(epochs[0].arc_id, np.arange(6))
+        for e in epochs[1:]:
+            self.assertFalse(e.slip.any())
+            np.testing.assert_array_equal(e.arc_id, np.arange(6))
+
+    def test_doppler_check(self):
+        slips = np.zeros(6)
+        slips[2] = 12.0
+        epochs = self.run_epochs(10, slip_at=5, slips=slips)
+
+        # the L2 signal of the same satellite is caught by the geometry-free check
+        slipped = {(e.svid, e.signal_type): e for e in epochs[5].events()}
+        self.assertEqual(set(slipped), {(8, 0), (8, 2)})
+        self.assertEqual(
+            slipped[8, 0].reason, SlipReason.DOPPLER | SlipReason.GEOMETRY_FREE
+        )
+        self.assertEqual(slipped[8, 2].reason, SlipReason.GEOMETRY_FREE)
+        self.assertEqual({e.arc_id for e in slipped.values()}, {6, 7})
+        self.assertFalse(epochs[6].slip.any())
+
+    def test_geometry_free_check(self):
+        # one cycle on L2 is too small for the Doppler check
+        slips = np.zeros(6)
+        slips[5] = 1.0
+        epochs = self.run_epochs(10, slip_at=4, slips=slips)
+
+        slipped = {(e.svid, e.signal_type): e.reason for e in epochs[4].events()}
+        self.assertEqual(set(slipped), {(17, 0), (17, 2)})
+        self.assertEqual(slipped[17, 2], SlipReason.GEOMETRY_FREE)
+
+    def test_receiver_flag_and_lock_time(self):
+        self.epoch(0.0)
+        flag = np.zeros(6, dtype=bool)
+        flag[0] = True
+        lock_time = np.full(6, 5)
+        lock_time[3] = 1
+
+        epoch = self.epoch(0.1, flag=flag, lock_time=lock_time)
+        self.assertEqual(epoch.slip[0], SlipReason.RECEIVER_FLAG)
+        self.assertEqual(epoch.slip[3], SlipReason.LOCK_TIME)
+
+    def test_gap(self):
+        self.epoch(0.0)
+        epoch = self.epoch(5.0)
+        self.assertTrue(np.all(epoch.slip == SlipReason.NEW_ARC))
+
+    def test_message(self):
+        phase = ExtendedRawChannelIndicator.carrier_phase_available
+        msg = ExtendedRawMeasurements(
+            tow=1000,
+            sub_messages=[
+                ExtendedRawMeasurement(
+                    gnss_type=GNSSType.GPS,
+                    svid=5,
+                    accumulated_carrier_cycle=-1e8,
+                    channel_indicator=phase,
+                ),
+                ExtendedRawMeasurement(gnss_type=GNSSType.GPS, svid=6),
+            ],
+        )
+        epoch = self.detector.update(msg)
+        np.testing.assert_array_equal(epoch.svid, [5])
+        self.assertEqual(epoch.tow, 1.0)
+
+
+class TestWavelengths(unittest.TestCase):
+    def test_glonass(self):
+        wavelength = wavelengths(
+            [GNSSType.GLONASS, GNSSType.GLONASS, GNSSType.GPS, GNSSType.GPS],
+            [0, 2, 0, 3],
+            [8, 7, 0, 0],
+        )
+        np.testing.assert_allclose(
+            wavelength[:3], SPEED_OF_LIGHT / np.array([1602.5625e6, 1246e6, L1])
+        )
+        self.assertTrue(np.isnan(wavelength[3]))
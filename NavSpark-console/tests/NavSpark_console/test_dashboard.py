@@ -0,0 +1,158 @@
+import unittest
+
+from NavSpark_console.protocol import (
+    GNSSSatelliteStatus,
+    GNSSSatelliteStatuses,
+    GNSSType,
+    SattelliteChannelStatus,
+    SattelliteChannelStatuses,
+    SattelliteChannelStatusIndicator,
+    SattelliteStatusIndicator,
+)
+from NavSpark_console.dashboard import *
+
+IN_FIX = SattelliteChannelStatusIndicator.normal_fix_mode
+HEALTHY = (
+    SattelliteStatusIndicator.ephemeris_received
+    | SattelliteStatusIndicator.healthy_sattellite
+)
+
+
+def channel_statuses(channels):
+    return SattelliteChannelStatuses(
+        sub_messages=[
+            SattelliteChannelStatus(
+                svid=s,
+                cn0=c,
+                elevation=e,
+                azimuth=a,
+                sv_status_indicator=HEALTHY,
+                channel_status_indicator=IN_FIX,
+            )
+            for s, c, e, a in channels
+        ]
+    )
+
+
+CHANNELS = [(5, 45, 60, 90), (12, 38, 10, 270), (70, 40, 45, 180)]
+
+
+class TestSatellites(unittest.TestCase):
+    def test_merge(self):
+        satellites = Satellites()
+        self.assertTrue(satellites.update(channel_statuses(CHANNELS)))
+        self.assertTrue(
+            satellites.update(
+                GNSSSatelliteStatuses(
+                    sub_messages=[
+                        GNSSSatelliteStatus(
+                            gnss_type=GNSSType.GPS, svid=5, signal_type=2, cn0=41
+                        ),
+                        GNSSSatelliteStatus(
+                            gnss_type=GNSSType.GPS, svid=5, signal_type=0, cn0=45
+                        ),
+                        GNSSSatelliteStatus(
+                            gnss_type=GNSSType.GALILEO, svid=3, signal_type=0, cn0=33
+                        ),
+                    ]
+                )
+            )
+        )
+        rows = satellites.rows
+        self.assertEqual(
+            sorted(rows),
+            [
+                (GNSSType.GPS, 5),
+                (GNSSType.GPS, 12),
+                (GNSSType.GLONASS, 6),
+                (GNSSType.GALILEO, 3),
+            ],
+        )
+        self.assertEqual(rows[GNSSType.GPS, 5].signals, (("1C", 45), ("2L", 41)))
+        self.assertEqual(
+            rows[GNSSType.GPS, 5].format(),
+            "G05  GPS        45  60   90  -EH ----N-  1C:45 2L:41",
+        )
+        # no elevation or azimuth without a channel status
+        galileo = rows[GNSSType.GALILEO, 3]
+        self.assertEqual((galileo.cn0, galileo.elevation), (33, None))
+
+        # the same epoch again changes nothing
+        version = satellites.version
+        self.assertFalse(satellites.update(channel_statuses(CHANNELS)))
+        self.assertEqual(satellites.version, version)
+
+
+class TestPanels(unittest.TestCase):
+    def setUp(self):
+        self.satellites = Satellites()
+        self.table = SatelliteTable(self.satellites)
+        self.sky = SkyPlot(self.satellites)
+        self.satellites.update(channel_statuses(CHANNELS))
+
+    def test_table(self):
+        control = self.table.control
+        content = control.create_content(80, 20)
+        self.assertEqual(content.line_count, 4)
+        self.assertEqual(content.get_line(0)[0][1], TABLE_HEADER)
+        self.assertEqual(control.formatted, 3)
+
+        # only the satellite whose CN0 moved is formatted again
+        channels = list(CHANNELS)
+        channels[1] = (12, 39, 10, 270)
+        self.satellites.update(channel_statuses(channels))
+        content = control.create_content(80, 20)
+        self.assertEqual(control.formatted, 4)
+        self.assertIn(" 39 ", content.get_line(2)[0][1])
+
+        # and a lost one drops out
+        self.satellites.update(channel_statuses(channels[:1]))
+        self.assertEqual(control.create_content(80, 20).line_count, 2)
+        self.assertEqual(control.formatted, 4)
+
+    def test_table_scroll(self):
+        control = self.table.control
+        # room for the header and two of the three satellites
+        content = control.create_content(80, 3)
+        self.assertEqual(content.line_count, 3)
+        self.assertEqual(content.get_line(0)[1][1], "  1-2 of 3")
+        rows = [content.get_line(i)[0][1] for i in (1, 2)]
+
+        control.scroll(5)
+        content = control.create_content(80, 3)
+        self.assertEqual(control.top, 1)
+        self.assertEqual(content.get_line(0)[0][1], TABLE_HEADER)
+        self.assertEqual(content.get_line(1)[0][1], rows[1])
+        # nothing was formatted again to scroll
+        self.assertEqual(control.formatted, 3)
+
+        # the header has no position when everything fits
+        content = control.create_content(80, 20)
+        self.assertEqual(control.top, 0)
+        self.assertEqual(len(content.get_line(0)), 1)
+
+    def test_sky_plot(self):
+        control = self.sky.control
+        content = control.create_content(43, 21)
+        self.assertEqual(content.line_count, 21)
+        self.assertEqual(control.formatted, 21)
+
+        def text(i):
+            return "".join(t for _, t in content.get_line(i))
+
+        self.assertEqual(text(0)[20], "N")
+        self.assertEqual(text(10)[2:5], "G12")
+        # 60 degrees up in the east
+        self.assertEqual(text(10)[27:30], "G05")
+        self.assertEqual(text(10)[20], "+")
+        # 45 degrees up in the south
+        self.assertEqual(text(15)[20:23], "R06")
+
+        # only the lines G05 moved between are drawn again
+        channels = list(CHANNELS)
+        channels[0] = (5, 45, 30, 0)
+        self.satellites.update(channel_statuses(channels))
+        content = control.create_content(43, 21)
+        self.assertEqual(control.formatted, 23)
+        self.assertNotIn("G05", text(10))
+        self.assertEqual(text(3)[20:23], "G05")
@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+
+from NavSpark_console.protocol import GPSEphemeris, GPSSubframe
+from NavSpark_console.ephemeris import *
+
+EPHEMERIS_SV2 = (
+    b"\xB1\x00\x02\x00\x77\x88\x04\x61\x10\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x00\xDB\xDF\x59\xA6\x00\x00\x1E\x0A\x47\x7C\x00\x77\x88\x88\xDF\xFD\x2E"
+    b"\x35\xA9\xCD\xB0\xF0\x9F\xFD\xA7\x04\x8E\xCC\xA8\x10\x2C\xA1\x0E\x22\x31\x59"
+    b"\xA6\x74\x00\x77\x89\x0C\xFF\xA3\x59\x86\xC7\x77\xFF\xF8\x26\x97\xE3\xB9\x1C"
+    b"\x60\x59\xC3\x07\x44\xFF\xA6\x37\xDF\xF0\xB0"
+)
+
+
+class TestDecodeGPSEphemeris(unittest.TestCase):
+    def test_scaling(self):
+        msg = GPSEphemeris.unpack(EPHEMERIS_SV2)
+        eph = decode_gps_ephemeris(
+            msg.subframe1_fields, msg.subframe2_fields, msg.subframe3_fields
+        )
+
+        self.assertAlmostEqual(eph["root_a"], 0xA10E2231 * 2.0**-19)
+        self.assertAlmostEqual(eph["e"], 0x048ECCA8 * 2.0**-33)
+        self.assertEqual(eph["t_oe"], 0x59A6 * 16)
+        self.assertAlmostEqual(eph["C_rs"], (0xFD2E - 0x10000) / 32.0)
+        self.assertAlmostEqual(eph["M_0"], (0xCDB0F09F - 2**32) * 2.0**-31 * GPS_PI)
+        self.assertEqual(eph["iode"], 0xDF)
+
+
+class TestKepler(unittest.TestCase):
+    def test_solve_kepler(self):
+        M = np.linspace(-np.pi, np.pi, 50)
+        e = np.full_like(M, 0.02)
+        E = solve_kepler(M, e)
+        np.testing.assert_allclose(E - e * np.sin(E), M, atol=1e-12)
+
+
+class TestGPSEphemerisCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = GPSEphemerisCache()
+        msg = GPSEphemeris.unpack(EPHEMERIS_SV2)
+        self.cache.update(msg)
+
+        # a second SV with a shifted mean anomaly
+        eph = dict(self.cache.ephemerides[2])
+        eph["M_0"] += 1.0
+        self.cache.add(7, eph)
+        self.t_oe = eph["t_oe"]
+
+    def test_orbit_radius(self):
+        states = self.cache.satellite_states(np.full(2, self.t_oe + 100.0))
+        np.testing.assert_array_equal(states.svid, [2, 7])
+
+        radius = np.linalg.norm(states.position, axis=-1)
+        a = self.cache.ephemerides[2]["root_a"] ** 2
+        self.assertTrue(np.all(np.abs(radius - a) < a * 0.02))
+        self.assertTrue(np.all(np.abs(states.clock_bias) < 1e-3))
+
+    def test_velocity_matches_position(self):
+        t = self.t_oe + 1000.0
+        dt = 0.5
+        before = self.cache.satellite_states(t - dt)
+        now = self.cache.satellite_states(t)
+        after = self.cache.satellite_states(t + dt)
+
+        finite_difference = (after.position - before.position) / (2 * dt)
+        np.testing.assert_allclose(now.velocity, finite_difference, atol=1e-3)
+
+        drift = (after.clock_bias - before.clock_bias) / (2 * dt)
+        np.testing.assert_allclose(now.clock_drift, drift, atol=1e-12)
+
+    def test_batch_matches_single_epochs(self):
+        times = self.t_oe + np.arange(5.0)[:, np.newaxis] * 30.0
+        batch = self.cache.satellite_states(times)
+        self.assertEqual(batch.position.shape, (5, 2, 3))
+
+        for i, t in enumerate(times[:, 0]):
+            single = self.cache.satellite_states(t)
+            np.testing.assert_allclose(batch.position[i], single.position)
+
+    def test_select_svids(self):
+        states = self.cache.satellite_states(self.t_oe, svids=[7])
+        np.testing.assert_array_equal(states.svid, [7])
+
+        with self.assertRaises(KeyError):
+            self.cache.satellite_states(self.t_oe, svids=[3])
+
+    def test_subframes(self):
+        cache = GPSEphemerisCache()
+        msg = GPSEphemeris.unpack(EPHEMERIS_SV2)
+        for sfid in (1, 2, 3):
+            data = getattr(msg, f"eph_data_subframe{sfid}")
+            cache.update(
+                GPSSubframe(svid=2, sfid=sfid, words=b"\x8B\x00\x00" + data[1:])
+            )
+
+        self.assertEqual(cache.ephemerides[2], self.cache.ephemerides[2])
@@ -0,0 +1,109 @@
+import unittest
+
+import numpy as np
+
+from NavSpark_console.protocol import (
+    GNSSType,
+    SattelliteChannelStatus,
+    SattelliteChannelStatuses,
+    SattelliteChannelStatusIndicator,
+)
+from NavSpark_console.geometry import *
+
+
+class TestDops(unittest.TestCase):
+    def test_ideal_geometry(self):
+        # one satellite overhead and three spread evenly on the horizon
+        H = geometry_matrix(
+            np.radians([90.0, 0.0, 0.0, 0.0]), np.radians([0.0, 0.0, 120.0, 240.0])
+        )
+        gdop, pdop, hdop, vdop, tdop = dops(H, np.ones(4, dtype=bool))
+        # x/y variance 2/3 each, the vertical and clock share the zenith satellite
+        self.assertAlmostEqual(float(hdop[0]), np.sqrt(4 / 3))
+        self.assertAlmostEqual(float(pdop[0] ** 2 - hdop[0] ** 2), float(vdop[0] ** 2))
+
+    def test_too_few(self):
+        H = geometry_matrix(np.radians([30.0, 50.0, 70.0]), np.radians([0, 90, 180]))
+        gdop, *_ = dops(H, np.ones(3, dtype=bool))
+        self.assertTrue(np.isnan(gdop[0]))
+
+    def test_coincident(self):
+        # four satellites reported in the same place, only two lines of sight
+        H = geometry_matrix(
+            np.radians([0.0, 0.0, 0.0, 0.0, 40.0]), np.radians([0, 0, 0, 0, 90])
+        )
+        gdop, *_ = dops(H, [[True] * 5, [True, False, True, True, True]])
+        self.assertTrue(np.isnan(gdop).all())
+
+
+class TestSatelliteGeometry(unittest.TestCase):
+    def setUp(self):
+        self.geometry = SatelliteGeometry()
+        self.geometry.set_satellites(
+            [1, 5, 12, 19, 24, 70, 75, 203, 210],
+            [75, 40, 15, 30, 8, 55, 25, 60, 12],
+            [10, 80, 150, 210, 300, 45, 260, 120, 330],
+        )
+
+    def test_what_if(self):
+        everything = self.geometry.dop()
+        high = self.geometry.above(20)
+        self.assertEqual(everything.count, 9)
+        self.assertEqual(high.count, 6)
+        self.assertGreater(high.pdop, everything.pdop)
+
+        gdop, *_ = self.geometry.elevation_sweep([0, 20])
+        np.testing.assert_allclose(gdop, [everything.gdop, high.gdop])
+
+    def test_constellation(self):
+        gps = self.geometry.constellation(GNSSType.GPS)
+        self.assertEqual(gps.count, 5)
+        both = self.geometry.constellation(GNSSType.GPS, GNSSType.BEIDOU)
+        self.assertEqual(both.count, 7)
+        self.assertTrue(np.isnan(self.geometry.constellation(GNSSType.GLONASS).pdop))
+
+    def test_degenerate(self):
+        self.geometry.set_satellites(
+            [1, 2, 3, 4, 5], [0, 0, 0, 0, 40], [0, 0, 0, 0, 90]
+        )
+        self.assertTrue(np.isnan(self.geometry.dop().gdop))
+        gdop, *_ = self.geometry.elevation_sweep([0, 10])
+        self.assertTrue(np.isnan(gdop).all())
+
+    def test_cache(self):
+        H = self.geometry.H
+        first = self.geometry.above(20)
+        self.geometry.set_satellites(
+            self.geometry.svid, self.geometry.elevation, self.geometry.azimuth
+        )
+        self.assertIs(self.geometry.H, H)
+        self.assertIs(self.geometry.above(20), first)
+
+        elevation = self.geometry.elevation.copy()
+        elevation[0] += 1
+        self.geometry.set_satellites(
+            self.geometry.svid, elevation, self.geometry.azimuth
+        )
+        self.assertIsNot(self.geometry.H, H)
+
+    def test_message(self):
+        in_fix = SattelliteChannelStatusIndicator.normal_fix_mode
+        geometry = SatelliteGeometry()
+        geometry.update(
+            SattelliteChannelStatuses(
+                sub_messages=[
+                    SattelliteChannelStatus(
+                        svid=s, elevation=e, azimuth=a, channel_status_indicator=f
+                    )
+                    for s, e, a, f in [
+                        (1, 75, 10, in_fix),
+                        (5, 40, 80, in_fix),
+                        (12, 15, 150, in_fix),
+                        (19, 30, 210, in_fix),
+                        (24, 8, 300, 0),
+                    ]
+                ]
+            )
+        )
+        self.assertEqual(geometry.in_fix_dop().count, 4)
+        self.assertEqual(geometry.dop().count, 5)
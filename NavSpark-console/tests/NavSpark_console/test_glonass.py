@@ -0,0 +1,74 @@
+import unittest
+
+import numpy as np
+
+from NavSpark_console.protocol import GLONASSEphemeris, GLONASSString
+from NavSpark_console.glonass import *
+
+EPHEMERIS_SLOT2 = (
+    b"\x90\x02\xFC\x01\x02\xD2\x81\xF4\x75\x05\x16\x51\x9A\x02\x12\xE0\xAD\x0F\x37"
+    b"\x01\x7A\xD2\x06\x03\x80\x26\x19\xA1\x22\xA2\x84\xEB\xD6\x04\x83\x4C\xA8\xC0"
+    b"\x00\x02\xA1\x6D\x89"
+)
+
+
+class TestDecodeGLONASSStrings(unittest.TestCase):
+    def test_sign_magnitude(self):
+        self.assertEqual(sign_magnitude(0b10101, 5), -5)
+        self.assertEqual(sign_magnitude(0b00101, 5), 5)
+
+    def test_decode(self):
+        msg = GLONASSEphemeris.unpack(EPHEMERIS_SLOT2)
+        eph = decode_glonass_strings(msg.string_fields)
+
+        self.assertEqual(eph["t_b"], 23 * 15 * 60)
+        self.assertEqual(eph["t_k"], 5 * 3600 + 41 * 60)
+        self.assertAlmostEqual(eph["position"][0], -18239898 * 2.0**-11 * 1e3)
+        self.assertAlmostEqual(eph["tau_n"], -54058 * 2.0**-30)
+        self.assertEqual(eph["M"], 1)
+
+        radius = np.linalg.norm(eph["position"])
+        self.assertAlmostEqual(radius / 1e3, 25500, delta=100)
+
+
+class TestGLONASSOrbitPropagator(unittest.TestCase):
+    def setUp(self):
+        self.propagator = GLONASSOrbitPropagator()
+        self.propagator.update(GLONASSEphemeris.unpack(EPHEMERIS_SLOT2))
+        self.t_b = self.propagator.ephemerides[2]["t_b"]
+
+    def test_incremental_matches_direct(self):
+        for t in np.arange(0.0, 600.0, 7.5):
+            incremental = self.propagator.satellite_states(self.t_b + t)
+
+        direct = GLONASSOrbitPropagator()
+        direct.update(GLONASSEphemeris.unpack(EPHEMERIS_SLOT2))
+        expected = direct.satellite_states(self.t_b + t)
+
+        np.testing.assert_allclose(incremental.position, expected.position, atol=1e-3)
+        np.testing.assert_allclose(incremental.velocity, expected.velocity, atol=1e-6)
+
+    def test_cache_restarts_from_tb(self):
+        self.propagator.satellite_states(self.t_b + 900.0)
+        back = self.propagator.satellite_states(self.t_b)
+        np.testing.assert_allclose(
+            back.position[0], self.propagator.ephemerides[2]["position"]
+        )
+
+    def test_clock(self):
+        states = self.propagator.satellite_states(self.t_b + 100.0)
+        eph = self.propagator.ephemerides[2]
+        self.assertAlmostEqual(
+            states.clock_bias[0], -eph["tau_n"] + eph["gamma_n"] * 100.0
+        )
+
+    def test_strings(self):
+        propagator = GLONASSOrbitPropagator()
+        msg = GLONASSEphemeris.unpack(EPHEMERIS_SLOT2)
+        for data in (msg.eph_data0, msg.eph_data1, msg.eph_data2, msg.eph_data3):
+            propagator.update(
+                GLONASSString(svid=2, string_number=data[0], words=data[1:])
+            )
+
+        eph = dict(self.propagator.ephemerides[2], k=None)
+        self.assertEqual(propagator.ephemerides[2], eph)
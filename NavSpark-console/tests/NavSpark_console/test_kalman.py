@@ -0,0 +1,113 @@
+import unittest
+
+import numpy as np
+
+from NavSpark_console.protocol import NavigationState, ReceiverNavigationStatus
+from NavSpark_console.coordinates import geodetic_to_ecef
+from NavSpark_console.kalman import *
+
+
+def status(t, position, velocity, state=NavigationState.FIX_3D, hdop=1.0, vdop=1.5):
+    return ReceiverNavigationStatus(
+        iod=0,
+        navigation_state=state,
+        week_number=2200,
+        time_of_week=t,
+        ecef_x=position[0],
+        ecef_y=position[1],
+        ecef_z=position[2],
+        ecef_x_vel=velocity[0],
+        ecef_y_vel=velocity[1],
+        ecef_z_vel=velocity[2],
+        clock_bias=0.0,
+        clock_drift=0.0,
+        gdop=2.0,
+        pdop=np.hypot(hdop, vdop),
+        hdop=hdop,
+        vdop=vdop,
+        tdop=1.0,
+    )
+
+
+class TestNavigationFilter(unittest.TestCase):
+    def setUp(self):
+        self.start = np.array(
+            geodetic_to_ecef(np.radians(39.0), np.radians(-77.0), 120.0)
+        )
+        self.velocity = np.array([3.0, -2.0, 1.0])
+
+    def test_smoothing(self):
+        rng = np.random.default_rng(1)
+        kf = NavigationFilter()
+        raw_errors, filtered_errors = [], []
+        raw_velocity, filtered_velocity = [], []
+
+        for i in range(400):
+            t = 1000.0 + i * 0.1
+            truth = self.start + self.velocity * (t - 1000.0)
+            noisy = truth + rng.normal(0, 3.0, 3)
+            noisy_velocity = self.velocity + rng.normal(0, 0.1, 3)
+            state = kf.update(status(t, noisy, noisy_velocity))
+            if i > 50:
+                raw_errors.append(np.linalg.norm(noisy - truth))
+                filtered_errors.append(np.linalg.norm(state.position - truth))
+                raw_velocity.append(np.linalg.norm(noisy_velocity - self.velocity))
+                filtered_velocity.append(np.linalg.norm(state.velocity - self.velocity))
+
+        self.assertLess(np.mean(filtered_errors), np.mean(raw_errors) / 3)
+        self.assertLess(np.mean(filtered_velocity), np.mean(raw_velocity))
+
+    def test_latest_is_a_snapshot(self):
+        kf = NavigationFilter()
+        self.assertIsNone(kf.latest)
+
+        first = kf.update(status(1000.0, self.start, self.velocity))
+        self.assertIs(kf.latest, first)
+        np.testing.assert_allclose(first.position, self.start)
+        np.testing.assert_allclose(
+            first.position_at(first.time + 1.0), self.start + self.velocity
+        )
+
+        second = kf.update(status(1000.1, self.start, self.velocity))
+        self.assertIsNot(second, first)
+        np.testing.assert_allclose(first.position, self.start)
+
+    def test_no_fix_is_ignored(self):
+        kf = NavigationFilter()
+        first = kf.update(status(1000.0, self.start, self.velocity))
+        self.assertIsNone(
+            kf.update(
+                status(1000.1, np.zeros(3), np.zeros(3), state=NavigationState.NO_FIX)
+            )
+        )
+        self.assertIs(kf.latest, first)
+
+    def test_weighting(self):
+        def step(state, hdop):
+            kf = NavigationFilter()
+            kf.update(status(1000.0, self.start, self.velocity))
+            return kf.update(
+                status(
+                    1000.1,
+                    self.start + 10.0,
+                    self.velocity,
+                    state=state,
+                    hdop=hdop,
+                )
+            )
+
+        good = step(NavigationState.FIX_3D, 1.0)
+        poor_dop = step(NavigationState.FIX_3D, 5.0)
+        predicted = step(NavigationState.FIX_PREDICTION, 1.0)
+
+        predicted_position = self.start + self.velocity * 0.1
+        pull = lambda s: np.linalg.norm(s.position - predicted_position)
+        self.assertGreater(pull(good), pull(poor_dop))
+        self.assertGreater(pull(good), pull(predicted))
+
+    def test_gap_restarts(self):
+        kf = NavigationFilter()
+        kf.update(status(1000.0, self.start, self.velocity))
+        jumped = self.start + 500.0
+        state = kf.update(status(1000.0 + MAX_GAP + 1, jumped, self.velocity))
+        np.testing.assert_allclose(state.position, jumped)
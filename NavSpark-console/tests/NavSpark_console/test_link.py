@@ -0,0 +1,221 @@
+import asyncio
+import os
+import termios
+import unittest
+
+import attr
+
+from NavSpark_console.connection import SerialConnection
+from NavSpark_console.protocol import (
+    BinaryRTCMDataOutput,
+    BinaryUpdateRate,
+    ConfigureBinaryMeasurmentDataOutput,
+    EnableSetting,
+    NavSparkRawProtocol,
+    SubframeEnabledFlag,
+    packet,
+)
+from NavSpark_console.link import *
+
+PACKET = b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+
+SPEEDS = {
+    115200: termios.B115200,
+    460800: termios.B460800,
+    921600: termios.B921600,
+}
+
+
+def measurement_output(rate, **kwargs):
+    return ConfigureBinaryMeasurmentDataOutput(
+        output_rate=rate,
+        measure_time=EnableSetting.enable,
+        save_channel_status=EnableSetting.enable,
+        extended_raw_measurement_enabled=EnableSetting.enable,
+        **kwargs,
+    )
+
+
+class TestLoad(unittest.TestCase):
+    def test_measurement(self):
+        output = measurement_output(BinaryUpdateRate.r1Hz)
+        # the time, 40 channels and 80 signals
+        self.assertEqual(measurement_load(output), 17 + 410 + 2501)
+        output = attr.evolve(output, output_rate=BinaryUpdateRate.r20Hz)
+        self.assertEqual(measurement_load(output), 20 * (17 + 410 + 2501))
+
+    def test_msm(self):
+        # header, masks, 10 satellites and 20 cells
+        bits = 73 + 96 + 20 + 10 * 36 + 20 * 80
+        self.assertEqual(msm_bytes(7, 10, 2), -(-bits // 8) + 6)
+        self.assertLess(msm_bytes(4, 10, 2), msm_bytes(7, 10, 2))
+
+    def test_rtcm(self):
+        output = BinaryRTCMDataOutput(
+            rtcm_output=EnableSetting.enable,
+            output_rate=BinaryUpdateRate.r1Hz,
+            gps_msm7=EnableSetting.enable,
+            glonass_msm7=EnableSetting.enable,
+        )
+        self.assertEqual(rtcm_load(output), 2 * msm_bytes(7, 10, 2))
+        self.assertEqual(rtcm_load(BinaryRTCMDataOutput()), 0.0)
+
+        # the sky is shared between both kinds of output
+        self.assertEqual(
+            link_load(rtcm_output=output, satellites=80), 2 * msm_bytes(7, 20, 2)
+        )
+        # the GPS MSM7 as sent, the GLONASS one still estimated
+        self.assertEqual(
+            rtcm_load(output, measured={1077: 100}), 100 + msm_bytes(7, 10, 2)
+        )
+
+    def test_required_baud(self):
+        # 1 Hz fits at 115200, 10 and 20 Hz need the fast rates
+        self.assertLess(
+            link_load(measurement_output(BinaryUpdateRate.r1Hz)) * BITS_PER_BYTE,
+            115200 * MAX_UTILIZATION,
+        )
+        self.assertEqual(
+            required_baud(link_load(measurement_output(BinaryUpdateRate.r10Hz))),
+            460800,
+        )
+        self.assertEqual(
+            required_baud(link_load(measurement_output(BinaryUpdateRate.r20Hz))),
+            921600,
+        )
+
+
+class TestCapacity(unittest.TestCase):
+    def test_warnings(self):
+        output = measurement_output(BinaryUpdateRate.r20Hz)
+        self.assertEqual(capacity_warnings(921600, output), [])
+        self.assertEqual(
+            capacity_warnings(115200, output),
+            [
+                "enabled output needs about 58560 B/s, 115200 baud carries 8064 B/s",
+                "2 Hz fits",
+            ],
+        )
+
+    def test_fit(self):
+        output = measurement_output(
+            BinaryUpdateRate.r10Hz, subframe_enabled=SubframeEnabledFlag.gps
+        )
+        self.assertIs(fit_output(921600, output), output)
+        fitted = fit_output(115200, output)
+        self.assertEqual(fitted.output_rate, BinaryUpdateRate.r2Hz)
+        self.assertEqual(fitted.subframe_enabled, 0)
+        # nothing left to give up
+        self.assertIsNone(fit_output(9600, output))
+
+    def test_measured(self):
+        output = measurement_output(BinaryUpdateRate.r20Hz)
+        # a dozen satellites rather than the 40 estimated for
+        measured = {0xDC: 17, 0xDE: 3 + 12 * 10 + 7, 0xE5: 14 + 24 * 31 + 7}
+        self.assertEqual(
+            measurement_load(output, measured=measured), 20 * sum(measured.values())
+        )
+        self.assertEqual(
+            capacity_warnings(115200, output, measured=measured),
+            [
+                "enabled output needs about 18240 B/s, 115200 baud carries 8064 B/s",
+                "8 Hz fits",
+            ],
+        )
+
+
+@attr.s(auto_attribs=True)
+class FakeConnection:
+    protocol: NavSparkRawProtocol = attr.ib(factory=NavSparkRawProtocol)
+    settings: dict = attr.ib(factory=lambda: {"baudrate": 115200})
+    transport: object = None
+
+
+class TestLinkMonitor(unittest.IsolatedAsyncioTestCase):
+    async def test_sample(self):
+        connection = FakeConnection()
+        protocol = connection.protocol
+        statuses = []
+        monitor = LinkMonitor(connection, on_status=statuses.append)
+        self.assertIsNone(monitor.sample(10.0))
+
+        protocol.data_received(PACKET * 100)
+        status = monitor.sample(11.0)
+        self.assertEqual(status.bytes_per_second, 1700)
+        self.assertEqual(status.frame_rates, {0xDC: 1700})
+        self.assertEqual(protocol.frame_sizes, {0xDC: len(PACKET)})
+        self.assertAlmostEqual(status.utilization, 17000 / 115200)
+        self.assertIsNone(status.read_lag)
+        self.assertEqual(status.warnings, ())
+
+        # faster than the line could carry, and nothing taking messages off
+        for t in range(12, 15):
+            protocol.data_received(PACKET * 1000)
+            status = monitor.sample(float(t), loop_lag=0.5)
+        self.assertEqual(
+            status.warnings,
+            (
+                "link at 148% of 115200 baud",
+                "event loop running 0.50 s late",
+                "message queue growing, 3100 waiting",
+            ),
+        )
+        self.assertEqual(len(statuses), 4)
+
+
+class TestChangeBaud(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.master, self.slave = os.openpty()
+        self.baud = 115200
+        # False for a receiver that ACKs the change but never makes it
+        self.switches = True
+        self.commands = []
+        asyncio.get_running_loop().add_reader(self.master, self.read)
+
+        self.connection = SerialConnection(os.ttyname(self.slave), {"baudrate": 115200})
+        self.connection.start()
+        await asyncio.wait_for(self.connection.wait_connected(), 1)
+
+    async def asyncTearDown(self):
+        asyncio.get_running_loop().remove_reader(self.master)
+        await self.connection.close()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def read(self):
+        """A receiver that only hears the host when both are at the same rate"""
+        data = os.read(self.master, 1024)
+        if termios.tcgetattr(self.master)[4] != SPEEDS[self.baud]:
+            return
+
+        while data.startswith(b"\xA0\xA1"):
+            length = int.from_bytes(data[2:4], "big")
+            payload, data = data[4 : 4 + length], data[7 + length :]
+            self.commands.append(payload)
+            os.write(self.master, packet(bytes((0x83, payload[0]))))
+            if payload[0] == 0x05 and self.switches:
+                self.baud = BaudRate(payload[2]).rate
+
+    async def test_upgrade(self):
+        baud = await negotiate_baud(
+            self.connection, measurement_output(BinaryUpdateRate.r20Hz)
+        )
+        self.assertEqual(baud, 921600)
+        self.assertEqual(self.baud, 921600)
+        self.assertEqual(self.connection.settings["baudrate"], 921600)
+        self.assertEqual(self.commands, [b"\x05\x00\x08\x00", b"\x10"])
+
+    async def test_not_needed(self):
+        baud = await negotiate_baud(
+            self.connection, measurement_output(BinaryUpdateRate.r1Hz)
+        )
+        self.assertEqual(baud, 115200)
+        self.assertEqual(self.commands, [])
+
+    async def test_rollback(self):
+        self.switches = False
+        self.assertFalse(await change_baud(self.connection, 460800, timeout=0.05))
+        self.assertEqual(self.connection.settings["baudrate"], 115200)
+        self.assertEqual(termios.tcgetattr(self.master)[4], termios.B115200)
+        # the change, then the query answered once back at the old rate
+        self.assertEqual(self.commands, [b"\x05\x00\x07\x00", b"\x10"])
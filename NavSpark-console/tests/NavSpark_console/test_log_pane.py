@@ -0,0 +1,84 @@
+import unittest
+
+from NavSpark_console.log_pane import *
+
+
+class TestLineRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = LineRing(4)
+        self.ring.extend(
+            [
+                "GPSEphemeris(sv=2)",
+                "ReceiverNavigationStatus(fix=3)",
+                "GPSEphemeris(sv=7)",
+                "MeasurementTimeInformation(iod=1)",
+                "ReceiverNavigationStatus(fix=2)",
+                "GLONASSEphemeris(slot=4)",
+            ]
+        )
+
+    def test_bounded(self):
+        self.assertEqual(len(self.ring), 4)
+        self.assertEqual((self.ring.first, self.ring.total), (2, 6))
+        self.assertEqual(self.ring[2], "GPSEphemeris(sv=7)")
+        with self.assertRaises(IndexError):
+            self.ring[1]
+        # the evicted lines are gone from the index too
+        self.assertEqual(list(self.ring._index["sv"]), [2])
+        self.assertEqual(list(self.ring._index["receivernavigationstatus"]), [4])
+
+    def test_word_search(self):
+        # found through the index, part of a word and ignoring case
+        self.assertEqual(self.ring.search("ephemeris", 0), 2)
+        self.assertEqual(self.ring.search("EPHEMERIS", 3), 5)
+        self.assertEqual(self.ring.search("ephemeris", 5, backwards=True), 2)
+        self.assertIsNone(self.ring.search("ephemeris", 6))
+        self.assertIsNone(self.ring.search("almanac", 0))
+
+    def test_scan(self):
+        # values aren't indexed
+        self.assertEqual(self.ring.search("fix=2", 0), 4)
+        self.assertEqual(self.ring.search("(", 4, backwards=True), 3)
+        self.assertIsNone(self.ring.search("sv=2", 0))
+
+
+class TestLogPane(unittest.TestCase):
+    def test_batched(self):
+        pane = LogPane(capacity=100)
+        for i in range(1000):
+            pane.append(i)
+        # nothing is formatted until the pane is drawn, and then only what fits
+        self.assertEqual(pane.ring.total, 0)
+
+        content = pane.control.create_content(80, 10)
+        self.assertEqual(content.line_count, 100)
+        self.assertEqual(content.cursor_position.y, 99)
+        self.assertEqual(
+            content.get_line(99), [("class:log.line-number", "     100 "), ("", "999")]
+        )
+
+    def test_search(self):
+        pane = LogPane(capacity=100)
+        for i in range(20):
+            pane.append(f"message {i}")
+        pane.search_text = "message 1"
+
+        self.assertEqual(pane.find_next(), 1)
+        self.assertEqual(pane.find_next(), 10)
+        self.assertEqual(pane.find_next(backwards=True), 1)
+
+        content = pane.control.create_content(80, 10)
+        self.assertEqual(content.cursor_position.y, 1)
+        self.assertEqual(
+            content.get_line(1),
+            [
+                ("class:log.line-number", "       2 "),
+                ("class:log.selected", ""),
+                ("class:log.search-match", "message 1"),
+                ("class:log.selected", ""),
+            ],
+        )
+
+        # back to following new lines
+        pane.control.select(19)
+        self.assertIsNone(pane.control.line)
@@ -0,0 +1,71 @@
+import datetime
+import unittest
+
+from NavSpark_console.nmea import *
+
+
+class TestParseSentence(unittest.TestCase):
+    def test_gga(self):
+        msg = parse_sentence(
+            b"GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,"
+        )
+        self.assertEqual(msg.talker, "GP")
+        self.assertEqual(msg.time, 12 * 3600 + 35 * 60 + 19)
+        self.assertAlmostEqual(msg.latitude, 48 + 7.038 / 60)
+        self.assertAlmostEqual(msg.longitude, 11 + 31.0 / 60)
+        self.assertEqual((msg.quality, msg.satellites), (1, 8))
+        self.assertEqual(
+            (msg.hdop, msg.altitude, msg.geoid_separation), (0.9, 545.4, 46.9)
+        )
+        # left empty or off the end
+        self.assertIsNone(msg.age)
+        self.assertIsNone(msg.station_id)
+
+    def test_rmc(self):
+        msg = parse_sentence(
+            b"GNRMC,123519.50,A,4807.038,S,01131.000,W,022.4,084.4,230394,003.1,W"
+        )
+        self.assertTrue(msg.valid)
+        self.assertAlmostEqual(msg.time, 45319.5)
+        self.assertLess(msg.latitude, 0)
+        self.assertLess(msg.longitude, 0)
+        self.assertEqual(msg.date, datetime.date(2094, 3, 23))
+        self.assertEqual(msg.magnetic_variation, -3.1)
+        self.assertIsNone(msg.mode)
+
+    def test_gsa(self):
+        msg = parse_sentence(b"GPGSA,A,3,04,05,,09,12,,,24,,,,,2.5,1.3,2.1")
+        self.assertEqual(msg.fix_type, 3)
+        self.assertEqual(msg.svids, (4, 5, 9, 12, 24))
+        self.assertEqual((msg.pdop, msg.hdop, msg.vdop), (2.5, 1.3, 2.1))
+
+    def test_gsv(self):
+        msg = parse_sentence(b"GPGSV,2,2,07,01,40,083,46,02,17,308,,12,07,344,39")
+        self.assertEqual((msg.message_number, msg.satellites_in_view), (2, 7))
+        self.assertEqual(len(msg.satellites), 3)
+        self.assertEqual(msg.satellites[0], GSVSatellite(1, 40, 83, 46))
+        # not tracked, no SNR
+        self.assertIsNone(msg.satellites[1].snr)
+
+    def test_gsv_signal_id(self):
+        # NMEA 4.10 ends with the signal ID
+        msg = parse_sentence(b"GPGSV,2,2,07,01,40,083,46,02,17,308,,12,07,344,,1")
+        self.assertEqual([s.svid for s in msg.satellites], [1, 2, 12])
+        msg = parse_sentence(b"GLGSV,1,1,01,70,55,045,38,1")
+        self.assertEqual(msg.satellites, (GSVSatellite(70, 55, 45, 38),))
+        # before 4.10, the last satellite with no angles or SNR
+        msg = parse_sentence(b"GPGSV,3,3,10,31,45,120,40,32,,,")
+        self.assertEqual([s.svid for s in msg.satellites], [31, 32])
+
+    def test_vtg(self):
+        msg = parse_sentence(b"GPVTG,054.7,T,034.4,M,005.5,N,010.2,K,A")
+        self.assertEqual((msg.course, msg.magnetic_course), (54.7, 34.4))
+        self.assertEqual((msg.speed_knots, msg.speed_kmh), (5.5, 10.2))
+        self.assertEqual(msg.mode, "A")
+
+    def test_unknown(self):
+        msg = parse_sentence(b"GPZDA,201530.00,04,07,2002,00,00")
+        self.assertEqual(
+            msg,
+            NMEASentence("GP", "ZDA", ("201530.00", "04", "07", "2002", "00", "00")),
+        )
@@ -0,0 +1,130 @@
+import asyncio
+import unittest
+
+from NavSpark_console.protocol import (
+    BINARY_FRAME,
+    NMEA_FRAME,
+    RTCM_FRAME,
+    NavSparkRawProtocol,
+    packet,
+)
+from NavSpark_console.offload import *
+
+PACKET = b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+VTG = b"$GPVTG,054.7,T,034.4,M,005.5,N,010.2,K*48\r\n"
+RTCM = b"\xD3\x00\x03\x3F\xB0\x00\x5B\xAF\xBA"
+
+
+def stream(n):
+    """n packets, each with a different iod, and a sentence and frame between"""
+    data = b""
+    for iod in range(n):
+        payload = PACKET[4:14]
+        payload = payload[:1] + bytes((iod,)) + payload[2:]
+        data += packet(payload) + VTG + RTCM
+    return data
+
+
+class TestFrameRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = FrameRing(100)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_reserve(self):
+        ring = self.ring
+        self.assertEqual(ring.reserve(40), 0)
+        self.assertEqual(ring.reserve(40), 40)
+        # 20 left at the end and nothing free at the start
+        self.assertIsNone(ring.reserve(30))
+        ring.release()
+        # wraps around rather than splitting the batch
+        self.assertEqual(ring.reserve(30), 0)
+        self.assertEqual(ring.reserve(10), 30)
+        self.assertIsNone(ring.reserve(1))
+        ring.release()
+        ring.release()
+        self.assertEqual(ring.reserve(60), 40)
+        ring.release()
+        ring.release()
+        self.assertEqual(ring.reserve(100), 0)
+        with self.assertRaises(ValueError):
+            ring.reserve(101)
+
+
+class TestPackFrames(unittest.TestCase):
+    def test_round_trip(self):
+        buffer = bytearray(200)
+        frames = [
+            (BINARY_FRAME, 1, PACKET[4:14], 10),
+            (NMEA_FRAME, 0, VTG[1:-5], 20),
+            (RTCM_FRAME, 1, RTCM[3:-3], 30),
+            # too short to unpack
+            (BINARY_FRAME, 0, PACKET[4:8], 40),
+        ]
+        end = pack_frames(buffer, 5, frames)
+        self.assertEqual(end, 5 + 4 * FRAME_HEADER.size + 10 + 37 + 3 + 4)
+
+        messages = decode_frames(memoryview(buffer)[5:end], ("base", "rover"))
+        self.assertEqual(messages[0].iod, 0x3D)
+        self.assertEqual(messages[1].speed_kmh, 10.2)
+        self.assertEqual(messages[2].message_number, 1019)
+        self.assertIsNone(messages[3])
+        self.assertEqual([m.source for m in messages[:3]], ["rover", "base", "rover"])
+        self.assertEqual([m.arrival_ns for m in messages[:3]], [10, 20, 30])
+
+
+class TestFrameDecoder(unittest.IsolatedAsyncioTestCase):
+    async def decoded(self, protocols, count):
+        results = [[] for _ in protocols]
+        for messages, protocol in zip(results, protocols):
+            while len(messages) < count:
+                messages.append(await protocol.message_queue.get())
+        return results
+
+    def inline(self, data, source):
+        protocol = NavSparkRawProtocol(source=source)
+        protocol.data_received(data)
+        return [protocol.message_queue.get_nowait() for _ in range(3 * 50)]
+
+    async def test_decoder(self):
+        # a small ring and batches, so frames wait for room in it
+        decoder = FrameDecoder(workers=2, ring_size=2048, max_batch=512)
+        decoder.start()
+        try:
+            protocols = [
+                NavSparkRawProtocol(source=s, decoder=decoder) for s in ("a", "b")
+            ]
+            data = stream(50)
+            for start in range(0, len(data), 300):
+                for protocol in protocols:
+                    protocol.data_received(data[start : start + 300])
+                await asyncio.sleep(0)
+
+            results = await asyncio.wait_for(self.decoded(protocols, 3 * 50), 10)
+            for messages, source in zip(results, "ab"):
+                self.assertEqual(messages, self.inline(data, source))
+                self.assertEqual({m.source for m in messages}, {source})
+            self.assertEqual(decoder.frames, 2 * 3 * 50)
+            self.assertGreater(decoder.batches, 2)
+            self.assertEqual(decoder.backlog, 0)
+        finally:
+            await decoder.close()
+
+    async def test_worker_lost(self):
+        decoder = FrameDecoder(workers=1)
+        decoder.start()
+        try:
+            protocol = NavSparkRawProtocol(source="a", decoder=decoder)
+            worker = decoder._pool[0]
+            worker.process.kill()
+            await asyncio.get_running_loop().run_in_executor(None, worker.process.join)
+
+            # decoded in the event loop once there's no worker left
+            protocol.data_received(stream(5))
+            (messages,) = await asyncio.wait_for(self.decoded([protocol], 15), 5)
+            self.assertEqual([m.iod for m in messages[::3]], list(range(5)))
+            self.assertEqual(decoder._pool, [])
+        finally:
+            await decoder.close()
@@ -0,0 +1,112 @@
+import unittest
+
+import numpy as np
+
+from NavSpark_console.protocol import GPSEphemeris, GNSSType
+from NavSpark_console.coordinates import geodetic_to_ecef
+from NavSpark_console.positioning import *
+
+EPHEMERIS_SV2 = (
+    b"\xB1\x00\x02\x00\x77\x88\x04\x61\x10\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x00\xDB\xDF\x59\xA6\x00\x00\x1E\x0A\x47\x7C\x00\x77\x88\x88\xDF\xFD\x2E"
+    b"\x35\xA9\xCD\xB0\xF0\x9F\xFD\xA7\x04\x8E\xCC\xA8\x10\x2C\xA1\x0E\x22\x31\x59"
+    b"\xA6\x74\x00\x77\x89\x0C\xFF\xA3\x59\x86\xC7\x77\xFF\xF8\x26\x97\xE3\xB9\x1C"
+    b"\x60\x59\xC3\x07\x44\xFF\xA6\x37\xDF\xF0\xB0"
+)
+
+
+def constellation_solver():
+    """24 satellites in six planes built from one real ephemeris"""
+    solver = PointPositionSolver()
+    solver.gps.update(GPSEphemeris.unpack(EPHEMERIS_SV2))
+    base = solver.gps.ephemerides.pop(2)
+    for plane in range(6):
+        for slot in range(4):
+            eph = dict(base)
+            eph["Omega_0"] += plane * np.pi / 3
+            eph["M_0"] += slot * np.pi / 2 + plane * np.pi / 12
+            solver.gps.add(1 + plane * 4 + slot, eph)
+    return solver, base["t_oe"]
+
+
+class TestTroposphere(unittest.TestCase):
+    def test_zenith_delay(self):
+        zenith = tropospheric_delay(np.radians(45), 0.0, np.pi / 2)
+        self.assertAlmostEqual(float(zenith), 2.4, delta=0.2)
+
+        low = tropospheric_delay(np.radians(45), 0.0, np.radians(10))
+        self.assertGreater(float(low), 5 * float(zenith))
+
+
+class TestRawMeasurementSystem(unittest.TestCase):
+    def test_numbering(self):
+        gnss_type, prn = raw_measurement_system([5, 70, 135, 211])
+        np.testing.assert_array_equal(
+            gnss_type,
+            [GNSSType.GPS, GNSSType.GLONASS, GNSSType.SBAS, GNSSType.BEIDOU],
+        )
+        np.testing.assert_array_equal(prn, [5, 6, 135, 11])
+
+
+class TestPointPositionSolver(unittest.TestCase):
+    def setUp(self):
+        self.solver, self.t_oe = constellation_solver()
+        self.truth = np.array(
+            geodetic_to_ecef(np.radians(39.0), np.radians(-77.0), 120.0)
+        )
+        self.tow = self.t_oe + 300.0
+
+        svid = np.array(sorted(self.solver.gps.ephemerides))
+        gnss_type = np.zeros(len(svid), dtype=np.uint8)
+        _, elevation = simulate_pseudoranges(
+            self.solver, self.tow, gnss_type, svid, self.truth
+        )
+        self.svid = svid[elevation > np.radians(5)]
+        self.gnss_type = np.zeros(len(self.svid), dtype=np.uint8)
+
+    def test_cold_start(self):
+        pseudorange, _ = simulate_pseudoranges(
+            self.solver, self.tow, self.gnss_type, self.svid, self.truth, 1e-4
+        )
+        solution = self.solver.solve(self.tow, self.gnss_type, self.svid, pseudorange)
+
+        self.assertTrue(solution.converged)
+        np.testing.assert_allclose(solution.position, self.truth, atol=1e-3)
+        self.assertAlmostEqual(solution.clock_bias[GNSSType.GPS], 1e-4, delta=1e-11)
+
+    def test_warm_start(self):
+        pseudorange, _ = simulate_pseudoranges(
+            self.solver, self.tow, self.gnss_type, self.svid, self.truth
+        )
+        cold = self.solver.solve(self.tow, self.gnss_type, self.svid, pseudorange)
+
+        pseudorange, _ = simulate_pseudoranges(
+            self.solver, self.tow + 0.05, self.gnss_type, self.svid, self.truth
+        )
+        warm = self.solver.solve(
+            self.tow + 0.05, self.gnss_type, self.svid, pseudorange
+        )
+        self.assertLess(warm.iterations, cold.iterations)
+        np.testing.assert_allclose(warm.position, self.truth, atol=1e-3)
+
+    def test_missing_ephemeris(self):
+        svid = np.append(self.svid, 30)
+        gnss_type = np.zeros(len(svid), dtype=np.uint8)
+        pseudorange, _ = simulate_pseudoranges(
+            self.solver, self.tow, self.gnss_type, self.svid, self.truth
+        )
+        solution = self.solver.solve(
+            self.tow, gnss_type, svid, np.append(pseudorange, 2.2e7)
+        )
+        self.assertNotIn(30, solution.svid)
+        np.testing.assert_allclose(solution.position, self.truth, atol=1e-3)
+
+    def test_too_few_satellites(self):
+        pseudorange, _ = simulate_pseudoranges(
+            self.solver, self.tow, self.gnss_type, self.svid, self.truth
+        )
+        self.assertIsNone(
+            self.solver.solve(
+                self.tow, self.gnss_type[:3], self.svid[:3], pseudorange[:3]
+            )
+        )
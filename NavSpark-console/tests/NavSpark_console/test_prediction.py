@@ -0,0 +1,49 @@
+import unittest
+
+from NavSpark_console.protocol import NavigationState, ReceiverNavigationStatus
+from NavSpark_console.prediction import *
+
+
+def status(arrival_ns, state=NavigationState.FIX_3D):
+    return ReceiverNavigationStatus(
+        navigation_state=state,
+        ecef_x=1000.0,
+        ecef_y=2000.0,
+        ecef_z=3000.0,
+        ecef_x_vel=1.0,
+        ecef_y_vel=-2.0,
+        ecef_z_vel=0.5,
+        arrival_ns=arrival_ns,
+    )
+
+
+class TestPositionPredictor(unittest.TestCase):
+    def test_extrapolation(self):
+        predictor = PositionPredictor()
+        self.assertIsNone(predictor.position_at(0))
+
+        predictor.update(status(10_000_000_000))
+        self.assertEqual(
+            predictor.position_at(10_000_000_000), (1000.0, 2000.0, 3000.0)
+        )
+
+        x, y, z = predictor.position_at(10_005_000_000)
+        self.assertAlmostEqual(x, 1000.005)
+        self.assertAlmostEqual(y, 1999.99)
+        self.assertAlmostEqual(z, 3000.0025)
+
+    def test_latency(self):
+        predictor = PositionPredictor(latency_ns=20_000_000)
+        predictor.update(status(10_000_000_000))
+        x, _, _ = predictor.position_at(10_000_000_000)
+        self.assertAlmostEqual(x, 1000.02)
+
+    def test_stale_and_no_fix(self):
+        predictor = PositionPredictor()
+        predictor.update(status(10_000_000_000))
+        predictor.update(status(10_100_000_000, NavigationState.NO_FIX))
+        self.assertEqual(predictor.anchor.arrival_ns, 10_000_000_000)
+
+        self.assertIsNone(
+            predictor.position_at(10_000_000_000 + MAX_EXTRAPOLATION_NS + 1)
+        )
@@ -1,6 +1,7 @@
 import unittest
 import struct
 import asyncio
+import time
 
 import attrs
 
@@ -64,6 +65,151 @@ class TestNavSparkRawProtocol(unittest.IsolatedAsyncioTestCase):
             ),
         )
 
+    async def test_several_packets_per_read(self):
+        proto = NavSparkRawProtocol()
+        proto.connection_made(None)
+
+        # line noise, then two whole packets in one read
+        proto.data_received(
+            b"\x00\xA0\x55"
+            b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+            b"\xA0\xA1\x00\x0A\xDC\x3E\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x19\x0D\x0A"
+        )
+
+        first = proto.message_queue.get_nowait()
+        second = proto.message_queue.get_nowait()
+        self.assertEqual((first.iod, second.iod), (0x3D, 0x3E))
+        self.assertEqual(len(proto.buffer), 0)
+
+    async def test_arrival_time(self):
+        proto = NavSparkRawProtocol()
+        proto.connection_made(None)
+
+        before = time.monotonic_ns()
+        proto.data_received(
+            b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+        )
+        msg = proto.message_queue.get_nowait()
+        self.assertGreaterEqual(msg.arrival_ns, before)
+        self.assertLessEqual(msg.arrival_ns, time.monotonic_ns())
+
+        # the arrival time is not part of the message
+        self.assertEqual(
+            msg,
+            MeasurementTimeInformation(
+                iod=0x3D,
+                receiver_wn=0x06ED,
+                receiver_tow=0x0B0CBC40,
+                measurement_period=0x03E8,
+            ),
+        )
+
+    async def test_rtcm_frames(self):
+        proto = NavSparkRawProtocol()
+        proto.connection_made(None)
+
+        # a stray preamble, then RTCM3 frames either side of a binary packet
+        proto.data_received(
+            b"\xD3\x55"
+            b"\xD3\x00\x03\x3F\xB0\x00\x5B\xAF\xBA"
+            b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+            b"\xD3\x00\x03\x3F\xB0"
+        )
+        proto.data_received(b"\x00\x5B\xAF\xBA")
+
+        first, second, third = (proto.message_queue.get_nowait() for _ in range(3))
+        self.assertEqual(first.message_number, 1019)
+        self.assertEqual(second.iod, 0x3D)
+        self.assertEqual(third.message_number, 1019)
+        self.assertEqual(len(proto.buffer), 0)
+        self.assertEqual(proto.frame_bytes, {"RTCM": 18, 0xDC: 17})
+
+    async def test_bogus_rtcm_header(self):
+        proto = NavSparkRawProtocol()
+        proto.connection_made(None)
+
+        # a stray preamble claiming a long frame doesn't hold back what follows
+        proto.data_received(
+            b"\xD3\x00\x40"
+            b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+        )
+
+        self.assertEqual(proto.message_queue.get_nowait().iod, 0x3D)
+        self.assertEqual(len(proto.buffer), 0)
+        self.assertEqual(proto.frame_bytes, {0xDC: 17})
+
+    async def test_send_command(self):
+        written = []
+        proto = NavSparkRawProtocol()
+        proto.connection_made(attrs.make_class("Transport", [])())
+        proto.transport.write = written.append
+
+        command = asyncio.create_task(
+            proto.send_command(ConfigureSerialPort(baud_rate=BaudRate.b460800))
+        )
+        await asyncio.sleep(0)
+        self.assertEqual(written, [b"\xA0\xA1\x00\x04\x05\x00\x07\x00\x02\x0D\x0A"])
+
+        # the ACK of some other command doesn't answer it, the NACK does
+        proto.data_received(b"\xA0\xA1\x00\x02\x83\x10\x93\x0D\x0A")
+        await asyncio.sleep(0)
+        self.assertFalse(command.done())
+        proto.data_received(b"\xA0\xA1\x00\x02\x84\x05\x81\x0D\x0A")
+        self.assertFalse(await command)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await proto.send_command(QueryPositionUpdateRate(), timeout=0.01)
+
+    async def test_nmea_sentences(self):
+        proto = NavSparkRawProtocol()
+        proto.connection_made(None)
+
+        # switching modes, sentences either side of a binary packet, a bad
+        # checksum and a $ in the noise
+        proto.data_received(
+            b"$GP\x00"
+            b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n"
+            b"$GPVTG,054.7,T,034.4,M,005.5,N,010.2,K*49\r\n"
+            b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+            b"$GPGSA,A,3,04,05,,09,12,,,24,,,,,2.5,1.3,2.1*39\r"
+        )
+        proto.data_received(b"\n")
+
+        first, second, third = (proto.message_queue.get_nowait() for _ in range(3))
+        self.assertEqual(first.satellites, 8)
+        self.assertEqual(second.iod, 0x3D)
+        self.assertEqual(third.svids, (4, 5, 9, 12, 24))
+        self.assertIsNotNone(third.arrival_ns)
+        self.assertTrue(proto.message_queue.empty())
+
+    async def test_source(self):
+        proto = NavSparkRawProtocol(source="rover")
+        proto.connection_made(None)
+
+        proto.data_received(
+            b"$GPVTG,054.7,T,034.4,M,005.5,N,010.2,K*48\r\n"
+            b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+            b"\xD3\x00\x03\x3F\xB0\x00\x5B\xAF\xBA"
+        )
+        messages = [proto.message_queue.get_nowait() for _ in range(3)]
+        self.assertEqual([m.source for m in messages], ["rover"] * 3)
+        # like the arrival time it is not part of the message
+        self.assertEqual(messages[1], attrs.evolve(messages[1], source="base"))
+
+    async def test_bad_lrc(self):
+        proto = NavSparkRawProtocol()
+        proto.connection_made(None)
+
+        proto.data_received(
+            b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1B\x0D\x0A"
+            b"\xA0\xA1\x00\x0A\xDC\x3E\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x19\x0D\x0A"
+        )
+
+        msg = proto.message_queue.get_nowait()
+        self.assertEqual(msg.iod, 0x3E)
+        with self.assertRaises(asyncio.QueueEmpty):
+            proto.message_queue.get_nowait()
+
 
 class MessageTestCase(unittest.TestCase):
     @staticmethod
@@ -117,6 +263,8 @@ class MessageTestCase(unittest.TestCase):
         actual_dict = attr.asdict(msg)
         actual_dict.pop("sub_messages")
         actual_dict.pop("output_id")
+        actual_dict.pop("arrival_ns")
+        actual_dict.pop("source")
 
         expected_dict = dict(kwargs)
         expected_dict["array_count"] = len(sub_array)
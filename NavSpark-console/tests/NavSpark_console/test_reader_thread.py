@@ -0,0 +1,144 @@
+import asyncio
+import os
+import threading
+import time
+import unittest
+
+from NavSpark_console.connection import SerialConnection
+from NavSpark_console.protocol import NavSparkRawProtocol, QueryPositionUpdateRate
+from NavSpark_console.reader_thread import *
+
+PACKET = b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+ACK = b"\xA0\xA1\x00\x02\x83\x10\x93\x0D\x0A"
+
+
+class Collector(asyncio.Protocol):
+    def __init__(self):
+        self.data = bytearray()
+        self.calls = 0
+        self.lost = asyncio.Event()
+
+    def data_received(self, data):
+        self.data.extend(data)
+        self.calls += 1
+
+    def connection_lost(self, exc):
+        self.exc = exc
+        self.lost.set()
+
+
+class Failing:
+    def write(self, data):
+        raise ValueError("write to closed file")
+
+
+class TestReaderThreadTransport(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+
+    def tearDown(self):
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def write_slowly(self, data, pieces):
+        """Write data a piece at a time while the event loop is stuck"""
+
+        def write():
+            step = -(-len(data) // pieces)
+            for start in range(0, len(data), step):
+                os.write(self.master, data[start : start + step])
+                time.sleep(0.002)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer.join()
+        # for the reader to catch up, still without the loop running
+        time.sleep(0.1)
+
+    async def test_batches(self):
+        loop = asyncio.get_running_loop()
+        protocol = NavSparkRawProtocol(source="rover")
+        transport, _ = await create_reader_thread_connection(
+            loop, lambda: protocol, self.port, baudrate=115200
+        )
+        await asyncio.sleep(0.01)
+
+        self.write_slowly(PACKET * 50, 25)
+        messages = [
+            await asyncio.wait_for(protocol.message_queue.get(), 1) for _ in range(50)
+        ]
+        self.assertEqual({m.iod for m in messages}, {0x3D})
+        self.assertEqual({m.source for m in messages}, {"rover"})
+        self.assertEqual(protocol.frame_bytes, {0xDC: 50 * len(PACKET)})
+        # many reads, but the loop was woken once
+        self.assertGreater(transport.reads, 1)
+        self.assertEqual(transport.batches, 1)
+
+        transport.close()
+        await asyncio.sleep(0.05)
+        self.assertIsNone(protocol.transport)
+
+    async def test_bytes(self):
+        loop = asyncio.get_running_loop()
+        transport, collector = await create_reader_thread_connection(
+            loop, Collector, self.port, baudrate=115200
+        )
+        await asyncio.sleep(0.01)
+
+        self.write_slowly(bytes(range(256)) * 4, 16)
+        await asyncio.sleep(0.01)
+        self.assertEqual(collector.data, bytes(range(256)) * 4)
+        self.assertEqual(collector.calls, 1)
+
+        # the port going away ends the thread
+        os.close(self.master)
+        await asyncio.wait_for(collector.lost.wait(), 1)
+        self.assertIsInstance(collector.exc, OSError)
+        self.assertFalse(transport.serial.is_open)
+
+    async def test_frame_error(self):
+        lost = asyncio.Event()
+        protocol = NavSparkRawProtocol(recorder=Failing())
+        protocol.on_connection_lost = lambda exc: lost.set()
+        transport, _ = await create_reader_thread_connection(
+            asyncio.get_running_loop(), lambda: protocol, self.port, baudrate=115200
+        )
+        await asyncio.sleep(0.01)
+
+        # whatever goes wrong in the thread reaches the protocol
+        os.write(self.master, PACKET)
+        await asyncio.wait_for(lost.wait(), 1)
+        self.assertFalse(transport.serial.is_open)
+        self.assertIsNone(protocol.transport)
+
+
+class TestReaderThreadConnection(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.master, self.slave = os.openpty()
+        asyncio.get_running_loop().add_reader(self.master, self.answer)
+        self.connection = SerialConnection(
+            os.ttyname(self.slave), {"baudrate": 115200}, reader_thread=True
+        )
+        self.connection.start()
+        await asyncio.wait_for(self.connection.wait_connected(), 1)
+
+    async def asyncTearDown(self):
+        asyncio.get_running_loop().remove_reader(self.master)
+        await self.connection.close()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def answer(self):
+        if os.read(self.master, 1024).startswith(b"\xA0\xA1"):
+            os.write(self.master, PACKET + ACK)
+
+    async def test_command(self):
+        protocol = self.connection.protocol
+        self.assertIsInstance(self.connection.transport, ReaderThreadTransport)
+        self.assertTrue(await protocol.send_command(QueryPositionUpdateRate()))
+        msg = await asyncio.wait_for(protocol.message_queue.get(), 1)
+        self.assertEqual(msg.iod, 0x3D)
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from io import BytesIO
+
+import attr
+
+from NavSpark_console.capture import replay
+from NavSpark_console.link import LinkStatus
+from NavSpark_console.protocol import (
+    BinaryUpdateRate,
+    ConfigureBinaryMeasurmentDataOutput,
+    EnableSetting,
+)
+from NavSpark_console.receivers import *
+
+PACKET = b"\xA0\xA1\x00\x0A\xDC\x3D\x06\xED\x0B\x0C\xBC\x40\x03\xE8\x1A\x0D\x0A"
+
+
+class TestTagged(unittest.TestCase):
+    def test_tagged(self):
+        (msg,) = replay(BytesIO(PACKET))
+        self.assertEqual(tagged(msg), str(msg))
+        self.assertEqual(tagged(attr.evolve(msg, source="rover")), f"rover: {msg}")
+        self.assertEqual(tagged("no receiver found"), "no receiver found")
+
+
+class TestReceivers(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # a pty per receiver
+        self.ptys = [os.openpty() for _ in range(3)]
+        self.logged = []
+        self.receivers = Receivers()
+        for name, (master, slave) in zip(("base", "rover", "test"), self.ptys):
+            self.receivers.add(
+                Receiver(
+                    name,
+                    os.ttyname(slave),
+                    {"baudrate": 115200},
+                    log=self.logged.append,
+                )
+            )
+        for receiver in self.receivers:
+            await asyncio.wait_for(receiver.connection.wait_connected(), 1)
+
+    async def asyncTearDown(self):
+        await self.receivers.close()
+        for master, slave in self.ptys:
+            os.close(master)
+            os.close(slave)
+
+    async def wait_logged(self, count):
+        while len(self.logged) < count:
+            await asyncio.sleep(0.01)
+
+    async def test_sources(self):
+        for n, (master, slave) in enumerate(self.ptys):
+            os.write(master, PACKET * (n + 1))
+        await asyncio.wait_for(self.wait_logged(6), 1)
+
+        self.assertEqual(
+            sorted(m.source for m in self.logged),
+            ["base", "rover", "rover", "test", "test", "test"],
+        )
+        # nothing shared between them
+        self.assertEqual(
+            [r.protocol.bytes_received for r in self.receivers],
+            [len(PACKET), 2 * len(PACKET), 3 * len(PACKET)],
+        )
+        self.assertEqual(
+            len({id(r.satellites) for r in self.receivers}), len(self.receivers)
+        )
+
+    async def test_record(self):
+        rover = self.receivers["rover"]
+        with tempfile.TemporaryDirectory() as directory:
+            path = rover.record(os.path.join(directory, "rover.raw"))
+            os.write(self.ptys[1][0], PACKET)
+            os.write(self.ptys[0][0], PACKET)
+            await asyncio.wait_for(self.wait_logged(2), 1)
+            rover.stop_recording()
+            self.assertIsNone(rover.recorder)
+
+            with open(path, "rb") as fp:
+                (msg,) = replay(fp, source="rover")
+        self.assertEqual(msg, self.logged[0])
+
+    async def test_capacity_warnings(self):
+        rover = self.receivers["rover"]
+        status = LinkStatus(115200, 0.0, 0.0, None, 0.0, 0, 0, {}, ())
+        rover._link_status(status)
+        self.assertEqual(rover.warnings, ())
+
+        # the receiver answering the query for its output settings
+        rover.protocol.message_queue.put_nowait(
+            ConfigureBinaryMeasurmentDataOutput(
+                output_rate=BinaryUpdateRate.r20Hz,
+                extended_raw_measurement_enabled=EnableSetting.enable,
+            )
+        )
+        await asyncio.wait_for(self.wait_logged(1), 1)
+        rover._link_status(status)
+        self.assertEqual(len(rover.warnings), 2)
+        self.assertEqual(self.logged[-1], "rover link: 2 Hz fits")
+
+        # the same warnings again aren't logged again
+        rover._link_status(status)
+        self.assertEqual(len(self.logged), 3)
+
+    async def test_switch(self):
+        receivers = self.receivers
+        self.assertEqual(receivers.active, "test")
+        self.assertEqual(receivers.switch().name, "base")
+        self.assertEqual(receivers.switch(-1).name, "test")
+        self.assertEqual(receivers.name_for("/dev/ttyUSB0"), "ttyUSB0")
+        self.assertEqual(receivers.name_for("/dev/base"), "base-2")
+
+        await receivers.remove("test")
+        self.assertEqual(receivers.active, "base")
+        self.assertEqual(len(receivers), 2)
+        with self.assertRaises(ValueError):
+            receivers.add(Receiver("rover", "/dev/null"))
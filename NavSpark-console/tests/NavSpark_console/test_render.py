@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+
+from prompt_toolkit.utils import Event
+
+from NavSpark_console.log_pane import LogPane
+from NavSpark_console.render import *
+
+
+class FakeApp:
+    def __init__(self):
+        self.before_render = Event(self)
+        self.after_render = Event(self)
+        self.invalidated = 0
+
+    def invalidate(self):
+        self.invalidated += 1
+
+    def render(self, scheduler, seconds):
+        self.before_render.fire()
+        scheduler.clock.now += seconds
+        self.after_render.fire()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRedrawScheduler(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.app = FakeApp()
+        self.scheduler = RedrawScheduler(fps=100, clock=FakeClock())
+        self.scheduler.attach(self.app)
+
+    async def asyncTearDown(self):
+        self.scheduler.stop()
+
+    async def test_coalesced(self):
+        pane = LogPane(scheduler=self.scheduler)
+        for i in range(1000):
+            pane.append(i)
+        await asyncio.sleep(0)
+        self.assertEqual(self.app.invalidated, 1)
+        self.assertEqual(self.scheduler.dirty, {pane})
+
+        self.app.render(self.scheduler, 0.001)
+        self.assertEqual(self.scheduler.dirty, set())
+
+        # nothing changed, nothing to draw
+        await asyncio.sleep(0.02)
+        self.assertEqual(self.app.invalidated, 1)
+
+        self.scheduler.clock.now += 0.01
+        pane.append(1000)
+        await asyncio.sleep(0)
+        self.assertEqual(self.app.invalidated, 2)
+
+    async def test_adapts(self):
+        self.assertAlmostEqual(self.scheduler.interval, 0.01)
+        self.app.render(self.scheduler, 0.005)
+        self.assertAlmostEqual(self.scheduler.render_time, 0.005)
+        # 5 ms a frame is only allowed to take a quarter of the loop
+        self.assertAlmostEqual(self.scheduler.interval, 0.02)
+
+        for i in range(100):
+            self.app.render(self.scheduler, 10.0)
+        self.assertAlmostEqual(self.scheduler.interval, 1.0 / MIN_FPS)
+
+    async def test_waits_for_interval(self):
+        self.scheduler.mark_dirty("a")
+        await asyncio.sleep(0)
+        self.app.render(self.scheduler, 0.0)
+
+        self.scheduler.mark_dirty("b")
+        await asyncio.sleep(0)
+        # the frame isn't over until the clock says so
+        self.assertEqual(self.app.invalidated, 1)
+        self.scheduler.clock.now += 0.01
+        await asyncio.sleep(0.02)
+        self.assertEqual(self.app.invalidated, 2)
+
+
+class TestLogPaneContent(unittest.TestCase):
+    def test_cached(self):
+        pane = LogPane()
+        pane.append("one")
+        content = pane.control.create_content(80, 10)
+        self.assertIs(pane.control.create_content(80, 10), content)
+
+        pane.append("two")
+        content = pane.control.create_content(80, 10)
+        self.assertEqual(content.line_count, 2)
+        pane.control.select(0)
+        self.assertIsNot(pane.control.create_content(80, 10), content)
@@ -0,0 +1,132 @@
+import io
+import unittest
+
+from NavSpark_console.protocol import (
+    ExtendedRawMeasurement,
+    ExtendedRawMeasurements,
+    ExtendedRawChannelIndicator,
+    GNSSType,
+    GPSEphemeris,
+)
+from NavSpark_console.rinex import *
+
+EPHEMERIS_SV2 = (
+    b"\xB1\x00\x02\x00\x77\x88\x04\x61\x10\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x00\xDB\xDF\x59\xA6\x00\x00\x1E\x0A\x47\x7C\x00\x77\x88\x88\xDF\xFD\x2E"
+    b"\x35\xA9\xCD\xB0\xF0\x9F\xFD\xA7\x04\x8E\xCC\xA8\x10\x2C\xA1\x0E\x22\x31\x59"
+    b"\xA6\x74\x00\x77\x89\x0C\xFF\xA3\x59\x86\xC7\x77\xFF\xF8\x26\x97\xE3\xB9\x1C"
+    b"\x60\x59\xC3\x07\x44\xFF\xA6\x37\xDF\xF0\xB0"
+)
+
+ALL = (
+    ExtendedRawChannelIndicator.pseudorange_available
+    | ExtendedRawChannelIndicator.doppler_frequency
+    | ExtendedRawChannelIndicator.carrier_phase_available
+)
+
+
+def measurements(tow, phase=-110000000.25):
+    return ExtendedRawMeasurements(
+        receiver_wn=2200,
+        tow=tow,
+        sub_messages=[
+            ExtendedRawMeasurement(
+                gnss_type=GNSSType.GPS,
+                svid=5,
+                signal_type=0,
+                cn0=45,
+                pseudorange=21000000.123,
+                accumulated_carrier_cycle=phase,
+                doppler_frequency=-1200.5,
+                channel_indicator=ALL,
+            ),
+            ExtendedRawMeasurement(
+                gnss_type=GNSSType.BEIDOU,
+                svid=12,
+                signal_type=0,
+                cn0=38,
+                pseudorange=37000000.5,
+                channel_indicator=ExtendedRawChannelIndicator.pseudorange_available,
+            ),
+        ],
+    )
+
+
+class TestRinexObservationWriter(unittest.TestCase):
+    def test_epochs(self):
+        fp = io.StringIO()
+        writer = RinexObservationWriter(fp)
+        writer.update(measurements(345600000))
+        # carrying on from the Doppler
+        writer.update(measurements(345600100, -110000000.25 + 120.05))
+
+        header, body = fp.getvalue().split("END OF HEADER\n")
+        # every header line has its label after column 60
+        for line in (header + "END OF HEADER").splitlines():
+            self.assertTrue(line[60:].strip(), line)
+        self.assertIn("OBSERVATION DATA", header)
+        self.assertIn("G   16 C1C L1C D1C S1C C1X", header)
+        self.assertIn("  2022     3    10     0     0    0.0000000     GPS", header)
+
+        lines = body.splitlines()
+        self.assertEqual(lines[0], "> 2022 03 10 00 00  0.0000000  0  2")
+        # the first epoch starts a new arc, so the phase has its LLI set
+        self.assertEqual(
+            lines[1],
+            "G05  21000000.123 7-110000000.25017     -1200.500          45.000",
+        )
+        self.assertEqual(
+            lines[2],
+            "C12  37000000.500 6" + " " * 32 + "        38.000",
+        )
+        self.assertEqual(lines[3], "> 2022 03 10 00 00  0.1000000  0  2")
+        self.assertEqual(lines[4][33:34], " ")
+
+    def test_glonass_header(self):
+        msg = measurements(345600000)
+        msg.sub_messages.append(
+            ExtendedRawMeasurement(
+                gnss_type=GNSSType.GLONASS,
+                svid=3,
+                signal_type=0,
+                frequency_id=12,
+                cn0=40,
+                pseudorange=20000000.0,
+                channel_indicator=ExtendedRawChannelIndicator.pseudorange_available,
+            )
+        )
+        fp = io.StringIO()
+        RinexObservationWriter(fp).update(msg)
+
+        header = fp.getvalue().split("END OF HEADER\n")[0]
+        self.assertIn(header_line("  1 R03  5 ", "GLONASS SLOT / FRQ #"), header)
+        self.assertIn("G L1C  0.00000", header)
+        self.assertIn(" C1C    0.000 C1P    0.000", header)
+
+    def test_satellite_id(self):
+        self.assertEqual(satellite_id(GNSSType.SBAS, 133), "S33")
+        self.assertEqual(satellite_id(GNSSType.QZSS, 194), "J02")
+        self.assertEqual(satellite_id(GNSSType.GLONASS, 7), "R07")
+
+
+class TestRinexNavigationWriter(unittest.TestCase):
+    def test_gps_record(self):
+        fp = io.StringIO()
+        writer = RinexNavigationWriter(fp)
+        writer.update(GPSEphemeris.unpack(EPHEMERIS_SV2))
+        # nothing until the full week is known
+        self.assertEqual(fp.getvalue(), "")
+
+        writer.update(measurements(345600000))
+        header, body = fp.getvalue().split("END OF HEADER\n")
+        self.assertIn("N: GNSS NAV DATA", header)
+
+        lines = body.splitlines()
+        self.assertEqual(len(lines), 8)
+        self.assertTrue(lines[0].startswith("G02 "))
+        self.assertEqual(len(lines[1]), 4 + 4 * 19)
+
+        # the same ephemeris isn't written twice
+        writer.update(GPSEphemeris.unpack(EPHEMERIS_SV2))
+        writer.update(measurements(345600100))
+        self.assertEqual(writer.records, 1)
@@ -0,0 +1,102 @@
+import unittest
+
+import bitstruct
+import numpy as np
+
+from NavSpark_console.rtcm import *
+
+
+def msm7_payload():
+    # GPS satellites 5 and 12 on 1C and 2L, 12 has no 2L
+    return bitstruct.pack(
+        "u12u12u30b1u3p7u2u2b1u3u64u32u4"
+        "u8u8u4u4u10u10s14s14"
+        "s20s20s20s24s24s24u10u10u10u1u1u1u10u10u10s15s15s15",
+        1077, 1, 345600000, False, 0, 0, 0, False, 0,
+        (1 << 59) | (1 << 52), (1 << 30) | (1 << 16), 0b1110,
+        70, 75, 0, 0, 512, 100, -300, 150,
+        1000, -2000, -(1 << 19),
+        5000, -6000, 7000,
+        500, 500, 3,
+        0, 1, 0,
+        45 * 16, 38 * 16 + 8, 40 * 16,
+        1234, -1, -(1 << 14),
+    )  # fmt: skip
+
+
+class TestCRC24Q(unittest.TestCase):
+    def test_check_value(self):
+        self.assertEqual(crc24q(b"123456789"), 0xCDE703)
+
+    def test_frame(self):
+        framed = frame(b"\x3E\xD0\x00")
+        self.assertEqual(framed[:3], b"\xD3\x00\x03")
+        # the CRC over a whole frame is zero
+        self.assertEqual(crc24q(framed), 0)
+
+
+class TestStationPosition(unittest.TestCase):
+    def test_1006(self):
+        payload = bitstruct.pack(
+            "u12u12u6b1b1b1b1s38b1p1s38u2s38u16",
+            1006, 2003, 0, True, True, False, False,
+            -26740123456, True, 46850234567, 0, 22380345678, 15000,
+        )  # fmt: skip
+        msg = unpack_rtcm(payload)
+        self.assertIsInstance(msg, StationPosition)
+        self.assertEqual(msg.station_id, 2003)
+        self.assertTrue(msg.gps)
+        self.assertFalse(msg.galileo)
+        self.assertAlmostEqual(msg.x, -2674012.3456)
+        self.assertAlmostEqual(msg.y, 4685023.4567)
+        self.assertAlmostEqual(msg.z, 2238034.5678)
+        self.assertAlmostEqual(msg.antenna_height, 1.5)
+
+    def test_unknown(self):
+        msg = unpack_rtcm(b"\x3F\xB0\x00")
+        self.assertEqual(msg, RTCMMessage(1019, b"\x3F\xB0\x00"))
+
+
+class TestMSMObservations(unittest.TestCase):
+    def test_msm7(self):
+        msg = unpack_rtcm(msm7_payload())
+        self.assertIsInstance(msg, MSMObservations)
+        self.assertEqual((msg.system, msg.msm), ("G", 7))
+        self.assertEqual(msg.epoch_time, 345600000)
+        np.testing.assert_array_equal(msg.satellites, [5, 12])
+        np.testing.assert_array_equal(msg.cell_satellite, [5, 5, 12])
+        self.assertEqual(msg.signal_codes(), ["1C", "2L", "1C"])
+
+        rough = 70 + 512 / 1024
+        np.testing.assert_allclose(
+            msg.pseudorange[:2],
+            [
+                (rough + 1000 * 2.0**-29) * LIGHT_MILLISECOND,
+                (rough - 2000 * 2.0**-29) * LIGHT_MILLISECOND,
+            ],
+        )
+        self.assertTrue(np.isnan(msg.pseudorange[2]))
+        self.assertAlmostEqual(
+            msg.phase_range[2], (75 + 100 / 1024 + 7000 * 2.0**-31) * LIGHT_MILLISECOND
+        )
+        np.testing.assert_allclose(msg.phase_range_rate[:2], [-299.8766, -300.0001])
+        self.assertTrue(np.isnan(msg.phase_range_rate[2]))
+        np.testing.assert_array_equal(msg.half_cycle, [False, True, False])
+        np.testing.assert_allclose(msg.cn0, [45, 38.5, 40])
+
+    def test_msm4(self):
+        payload = bitstruct.pack(
+            "u12u12u30b1u3p7u2u2b1u3u64u32u1u8u10s15s22u4u1u6",
+            1124, 7, 1000, False, 0, 0, 0, False, 0,
+            1 << 50, 1 << 30, 1,
+            80, 0, 100, -200, 9, 0, 41,
+        )  # fmt: skip
+        msg = unpack_rtcm(payload)
+        self.assertEqual((msg.system, msg.msm), ("C", 4))
+        np.testing.assert_array_equal(msg.satellites, [14])
+        self.assertEqual(msg.signal_codes(), ["2I"])
+        self.assertAlmostEqual(
+            msg.pseudorange[0], (80 + 100 * 2.0**-24) * LIGHT_MILLISECOND
+        )
+        self.assertIsNone(msg.phase_range_rate)
+        self.assertEqual(msg.cn0[0], 41)
@@ -0,0 +1,163 @@
+import unittest
+
+import attr
+import numpy as np
+
+from NavSpark_console.protocol import (
+    BasePositionMode,
+    ConfigureBasePositionOutput,
+    ExtendedRawChannelIndicator,
+    ExtendedRawMeasurement,
+    ExtendedRawMeasurements,
+    GNSSType,
+)
+from NavSpark_console.rtcm import StationPosition, crc24q, unpack_rtcm
+from NavSpark_console.coordinates import geodetic_to_ecef
+from NavSpark_console.rtcm_encoder import *
+
+ALL = (
+    ExtendedRawChannelIndicator.pseudorange_available
+    | ExtendedRawChannelIndicator.doppler_frequency
+    | ExtendedRawChannelIndicator.carrier_phase_available
+)
+
+SIGNALS = [
+    # gnss_type, svid, signal_type, frequency_id, pseudorange, phase
+    (GNSSType.GPS, 5, 0, 0, 21000000.123, -110000000.25),
+    (GNSSType.GPS, 5, 2, 0, 21000001.5, -85000000.5),
+    (GNSSType.GPS, 12, 0, 0, 23000000.0, 1000.75),
+    (GNSSType.GLONASS, 3, 0, 12, 20000000.0, 12345.5),
+    (GNSSType.BEIDOU, 14, 0, 0, 37000000.5, -7.25),
+    (GNSSType.SBAS, 133, 0, 0, 38000000.0, 0.0),
+]
+
+
+def measurements(tow, dt=0.0):
+    return ExtendedRawMeasurements(
+        receiver_wn=2200,
+        tow=tow,
+        sub_messages=[
+            ExtendedRawMeasurement(
+                gnss_type=g,
+                svid=s,
+                signal_type=t,
+                frequency_id=f,
+                cn0=45,
+                pseudorange=pr + 100.0 * dt,
+                accumulated_carrier_cycle=phase + 500.0 * dt,
+                doppler_frequency=-500.0,
+                channel_indicator=ALL,
+            )
+            for g, s, t, f, pr, phase in SIGNALS
+        ],
+    )
+
+
+class TestLockTime(unittest.TestCase):
+    def test_msm4(self):
+        np.testing.assert_array_equal(
+            msm4_lock_time([0, 31, 32, 64, 100, 524288, 10**9]),
+            [0, 0, 1, 2, 2, 15, 15],
+        )
+
+    def test_msm7(self):
+        # the first value of every band and the last of the table
+        np.testing.assert_array_equal(
+            msm7_lock_time([0, 63, 64, 127, 128, 67108864, 10**9]),
+            [0, 63, 64, 95, 96, 704, 704],
+        )
+
+
+class TestMSMEncoder(unittest.TestCase):
+    def test_round_trip(self):
+        encoder = MSMEncoder(station_id=12)
+        frames = encoder.update(measurements(345600000))
+        self.assertEqual(len(frames), 4)
+        for f in frames:
+            self.assertEqual(crc24q(f), 0)
+
+        decoded = [unpack_rtcm(f[3:-3]) for f in frames]
+        self.assertEqual([m.system for m in decoded], ["G", "S", "R", "C"])
+        self.assertEqual([m.multiple_message for m in decoded], [1, 1, 1, 0])
+        self.assertTrue(all(m.station_id == 12 for m in decoded))
+
+        gps, sbas, glonass, beidou = decoded
+        self.assertEqual(gps.epoch_time, 345600000)
+        np.testing.assert_array_equal(gps.cell_satellite, [5, 5, 12])
+        self.assertEqual(gps.signal_codes(), ["1C", "2L", "1C"])
+        np.testing.assert_allclose(
+            gps.pseudorange, [21000000.123, 21000001.5, 23000000.0], atol=1e-3
+        )
+        # the phase is moved next to the pseudorange by whole cycles
+        self.assertLess(abs(gps.phase_range[0] - gps.pseudorange[0]), 0.2)
+        cycles = (gps.phase_range[0] / 0.19029367279836487) + 110000000.25
+        self.assertAlmostEqual(cycles, round(cycles), places=3)
+        np.testing.assert_allclose(gps.cn0, 45)
+
+        np.testing.assert_array_equal(glonass.extended_info, [12])
+        np.testing.assert_array_equal(sbas.satellites, [14])
+        # BDT is 14 seconds behind
+        self.assertEqual(beidou.epoch_time, 345600000 - 14000)
+        np.testing.assert_allclose(beidou.pseudorange, [37000000.5], atol=1e-3)
+
+    def test_arcs(self):
+        encoder = MSMEncoder()
+        encoder.update(measurements(345600000))
+        first = unpack_rtcm(encoder.update(measurements(345601000, 1.0))[0][3:-3])
+        # 16 ms steps between 512 and 1024 ms
+        self.assertEqual(first.lock_time_indicator[0], (1000 + 2048) // 16)
+
+        # the same offset is kept while the arc carries on
+        phase = encoder.offset.copy()
+        encoder.update(measurements(345602000, 2.0))
+        np.testing.assert_array_equal(encoder.offset, phase)
+
+        slipped = measurements(345603000, 3.0)
+        sub = slipped.sub_messages[0]
+        slipped.sub_messages[0] = attr.evolve(
+            sub,
+            accumulated_carrier_cycle=sub.accumulated_carrier_cycle + 7,
+            channel_indicator=ALL | ExtendedRawChannelIndicator.cycle_slip_possible,
+        )
+        gps = unpack_rtcm(encoder.update(slipped)[0][3:-3])
+        self.assertEqual(gps.lock_time_indicator[0], 0)
+        self.assertGreater(gps.lock_time_indicator[1], 0)
+
+    def test_msm4(self):
+        encoder = MSMEncoder(msm=4)
+        gps = unpack_rtcm(encoder.update(measurements(345600000))[0][3:-3])
+        self.assertEqual(gps.message_number, 1074)
+        np.testing.assert_allclose(
+            gps.pseudorange, [21000000.123, 21000001.5, 23000000.0], atol=0.02
+        )
+
+    def test_station(self):
+        encoder = MSMEncoder(station_id=3, antenna_height=1.25)
+        base = ConfigureBasePositionOutput(
+            base_position_mode=BasePositionMode.static_mode,
+            runtime_base_position_mode=BasePositionMode.static_mode,
+            latitude=45.0,
+            longitude=-75.0,
+            ellipsoidal_height=100.0,
+        )
+        (station,) = encoder.update(base)
+        msg = unpack_rtcm(station[3:-3])
+        self.assertIsInstance(msg, StationPosition)
+        self.assertEqual((msg.message_number, msg.station_id), (1006, 3))
+        x, y, z = geodetic_to_ecef(np.radians(45.0), np.radians(-75.0), 100.0)
+        self.assertAlmostEqual(msg.x, float(x), places=4)
+        self.assertAlmostEqual(msg.z, float(z), places=4)
+        self.assertAlmostEqual(msg.antenna_height, 1.25)
+
+        # sent with the first epoch and then every station_interval seconds
+        self.assertEqual(len(encoder.update(measurements(345600000))), 5)
+        self.assertEqual(len(encoder.update(measurements(345605000))), 4)
+        self.assertEqual(len(encoder.update(measurements(345610000))), 5)
+
+        # not while surveying
+        encoder.update(
+            ConfigureBasePositionOutput(
+                runtime_base_position_mode=BasePositionMode.survey_mode
+            )
+        )
+        self.assertIsNone(encoder.station)
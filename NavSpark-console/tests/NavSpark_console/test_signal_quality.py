@@ -0,0 +1,128 @@
+import unittest
+
+import numpy as np
+
+from NavSpark_console.protocol import (
+    ExtendedRawMeasurement,
+    ExtendedRawMeasurements,
+    SattelliteChannelStatus,
+    SattelliteChannelStatuses,
+    GNSSType,
+)
+from NavSpark_console.signal_quality import *
+
+
+class TestSignalQualityStats(unittest.TestCase):
+    def test_rolling_window(self):
+        stats = SignalQualityStats(window=4)
+        for cn0 in [30, 40, 42, 44, 46, 48]:
+            stats.add_epoch(
+                [GNSSType.GPS, GNSSType.BEIDOU],
+                [3, 3],
+                [0, 0],
+                np.array([[cn0, 1, 2, 3], [20, 1, 2, 3]], dtype=float),
+            )
+
+        result = stats.statistics()
+        np.testing.assert_array_equal(result.gnss_type, [GNSSType.GPS, GNSSType.BEIDOU])
+        np.testing.assert_array_equal(result.count, [4, 4])
+        # only the last four epochs count
+        np.testing.assert_allclose(result.mean[:, 0], [45.0, 20.0])
+        np.testing.assert_allclose(result.variance[:, 0], [5.0, 0.0])
+        np.testing.assert_allclose(result.minimum[:, 0], [42.0, 20.0])
+        np.testing.assert_allclose(result.maximum[:, 0], [48.0, 20.0])
+
+    def test_messages(self):
+        stats = SignalQualityStats()
+        stats.update(
+            SattelliteChannelStatuses(
+                iod=1,
+                sub_messages=[
+                    SattelliteChannelStatus(svid=7, cn0=39),
+                    SattelliteChannelStatus(svid=205, cn0=38),
+                ],
+            )
+        )
+        stats.update(
+            ExtendedRawMeasurements(
+                iod=1,
+                sub_messages=[
+                    ExtendedRawMeasurement(
+                        gnss_type=GNSSType.GPS,
+                        svid=7,
+                        signal_type=0,
+                        cn0=41,
+                        pseudorange_standard_dev=5,
+                    ),
+                    ExtendedRawMeasurement(
+                        gnss_type=GNSSType.GPS, svid=7, signal_type=2, cn0=35
+                    ),
+                ],
+            )
+        )
+
+        result = stats.statistics()
+        keys = list(zip(result.gnss_type, result.svid, result.signal_type))
+        self.assertEqual(keys, [(0, 7, 0), (0, 7, 2), (GNSSType.BEIDOU, 5, 0)])
+        # the extended measurement rather than channel status for GPS 7
+        np.testing.assert_array_equal(result.count, [1, 1, 1])
+        np.testing.assert_allclose(result.mean[:, 0], [41.0, 35.0, 38.0])
+        # channel status has no quality values
+        self.assertEqual(result.mean[0, 1], 5.0)
+        self.assertTrue(np.isnan(result.mean[2, 1]))
+
+    def test_one_sample_per_epoch(self):
+        stats = SignalQualityStats(window=4)
+        for iod, cn0 in enumerate([40, 42, 44, 46]):
+            stats.update(
+                SattelliteChannelStatuses(
+                    iod=iod, sub_messages=[SattelliteChannelStatus(svid=7, cn0=20)]
+                )
+            )
+            stats.update(
+                ExtendedRawMeasurements(
+                    iod=iod,
+                    sub_messages=[
+                        ExtendedRawMeasurement(
+                            gnss_type=GNSSType.GPS, svid=7, signal_type=0, cn0=cn0
+                        )
+                    ],
+                )
+            )
+
+        result = stats.statistics()
+        np.testing.assert_array_equal(result.count, [4])
+        np.testing.assert_allclose(result.mean[:, 0], [43.0])
+        self.assertEqual(stats.index.epoch, 4)
+
+        # extended raw measurements turned off, channel status carries on once
+        # the next epoch shows there's nothing more to come
+        for iod in (4, 5, 6):
+            stats.update(
+                SattelliteChannelStatuses(
+                    iod=iod, sub_messages=[SattelliteChannelStatus(svid=7, cn0=30)]
+                )
+            )
+        result = stats.statistics()
+        np.testing.assert_allclose(result.mean[:, 0], [(44 + 46 + 30 + 30) / 4])
+        self.assertEqual(stats.index.epoch, 6)
+        self.assertEqual(stats.pending.iod, 6)
+
+    def test_oldest_signal_is_dropped(self):
+        stats = SignalQualityStats(max_signals=2)
+        for svid in [1, 2, 1, 3]:
+            stats.add_epoch([0], [svid], [0], np.full((1, len(METRICS)), 40.0))
+
+        result = stats.statistics()
+        self.assertEqual(sorted(result.svid), [1, 3])
+
+
+class TestSignalIndex(unittest.TestCase):
+    def test_epoch_overflows(self):
+        index = SignalIndex(max_signals=2)
+        index.lookup([1, 1], [1, 2], [0, 0])
+        # both new signals need a row, they can't be given the same one
+        rows, new = index.lookup([1, 1], [3, 4], [0, 0])
+        self.assertEqual(sorted(rows), [0, 1])
+        self.assertEqual(sorted(new), [0, 1])
+        self.assertEqual(len(index), 2)
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+from NavSpark_console.coordinates import LocalFrame
+from NavSpark_console.track import *
+
+
+class TestLTTB(unittest.TestCase):
+    def test_keeps_peaks(self):
+        x = np.arange(1000.0)
+        y = np.zeros(1000)
+        y[321] = 50.0
+        y[700] = -20.0
+
+        keep = lttb(x, y, 20)
+        self.assertEqual(len(keep), 20)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertIn(321, keep)
+        self.assertIn(700, keep)
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_short_input(self):
+        np.testing.assert_array_equal(lttb(np.arange(5.0), np.ones(5), 10), range(5))
+
+
+class TestTrackHistory(unittest.TestCase):
+    def setUp(self):
+        self.frame = LocalFrame.from_geodetic(
+            np.radians(39.0), np.radians(-77.0), 120.0
+        )
+
+    def fill(self, track, n, east_rate=0.0, noise=0.0, start=1000.0):
+        rng = np.random.default_rng(7)
+        for i in range(n):
+            t = start + i * 0.1
+            e = east_rate * (t - start) + rng.normal(0, noise)
+            n_ = rng.normal(0, noise)
+            track.append(
+                t,
+                self.frame.enu_to_ecef(e, n_, 0.0),
+                (0.0, 0.0, 0.0),
+                (1.5, 0.9, 1.2),
+                3,
+            )
+
+    def test_ring(self):
+        track = TrackHistory(capacity=100)
+        nbytes = track.nbytes
+        self.fill(track, 250)
+
+        self.assertEqual(len(track), 100)
+        self.assertEqual(track.nbytes, nbytes)
+        idx = track.indices()
+        np.testing.assert_allclose(track.time[idx], 1000.0 + np.arange(150, 250) * 0.1)
+
+        idx = track.indices(seconds=1.05)
+        self.assertEqual(len(idx), 11)
+        self.assertAlmostEqual(track.time[idx[-1]], 1024.9)
+
+    def test_statistics(self):
+        track = TrackHistory(capacity=2000)
+        self.fill(track, 2000, noise=1.0)
+
+        np.testing.assert_allclose(
+            self.frame.ecef_to_enu(*track.mean()), (0, 0, 0), atol=0.1
+        )
+        # the CEP of a 2D normal is 1.1774 sigma
+        self.assertAlmostEqual(track.cep(), 1.1774, delta=0.1)
+        self.assertGreater(track.cep(percentile=95.0), 2 * track.cep())
+
+    def test_drift(self):
+        track = TrackHistory(capacity=500)
+        self.fill(track, 500, east_rate=0.02)
+        np.testing.assert_allclose(track.drift(), (0.02, 0, 0), atol=1e-6)
+
+    def test_downsample(self):
+        track = TrackHistory(capacity=1000)
+        self.fill(track, 1500, east_rate=0.5, noise=0.1)
+        idx = track.downsample(50, frame=self.frame)
+        self.assertEqual(len(idx), 50)
+        self.assertTrue(np.all(np.diff(track.time[idx]) > 0))
+
+    def test_empty(self):
+        track = TrackHistory(capacity=10)
+        self.assertIsNone(track.mean())
+        self.assertIsNone(track.cep())
+        self.assertIsNone(track.drift())